@@ -8,6 +8,7 @@ from flask_jwt_extended import verify_jwt_in_request, get_current_user
 from backend.user.service import department_service
 from backend.role.service import role_service
 from backend.role.domain.role import AccessLevel
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from backend.user.message import ADMIN_DEFAULT_USERNAME
 
 
@@ -40,22 +41,24 @@ def auth_required():
                 if user.username == ADMIN_DEFAULT_USERNAME:
                     return fn(*args, **kwargs)
 
-                # 处理基于角色的权限
+                # 处理基于角色的权限，角色数据范围走认证缓存
                 role_numbers = user.role_numbers
-                role = role_service.repo.find(role_number=role_numbers)
+                scope = auth_cache.get_role_scope(
+                    role_numbers, lambda: role_service.repo.find(role_number=role_numbers)
+                )
 
-                if role and role.areas:
-                    g.areas = role.areas
+                if scope and scope['areas']:
+                    g.areas = scope['areas']
 
                     # 根据访问级别设置部门权限
-                    if role.access_level == AccessLevel.TARGET_DEPT.value:
-                        g.allowed_department_ids = role.allowed_department_ids
-                    elif role.access_level == AccessLevel.OWN_DEPT.value:
+                    if scope['access_level'] == AccessLevel.TARGET_DEPT.value:
+                        g.allowed_department_ids = scope['allowed_department_ids']
+                    elif scope['access_level'] == AccessLevel.OWN_DEPT.value:
                         g.allowed_department_ids = [user.department_id]
                     # elif role.access_level == AccessLevel.OWN_SUB_DEPT.value:
                     #     departments = department_service.get_sub_departments(user.department_id)
                     #     g.allowed_department_ids = [department.id for department in departments]
-                    elif role.access_level == AccessLevel.ONESELF.value:
+                    elif scope['access_level'] == AccessLevel.ONESELF.value:
                         g.creator = user.username
                 else:
                     # 没有指定区域的情况下，使用随机 UUID 作为限制
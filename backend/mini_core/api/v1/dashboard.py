@@ -14,3 +14,13 @@ class DashboardOverviewAPI(MethodView):
     def get(self):
         """获取仪表盘总览数据"""
         return dashboard_service.get_dashboard_data()
+
+
+@blp.route('/cache_stats')
+class DashboardCacheStatsAPI(MethodView):
+    """统计快照缓存命中情况API"""
+    decorators = [auth_required()]
+
+    def get(self):
+        """获取快照缓存的命中/未命中计数"""
+        return dashboard_service.get_cache_stats()
@@ -78,7 +78,10 @@ class NearbyShopStoreAPI(MethodView):
         return shop_store_service.get_nearby(
             args["latitude"],
             args["longitude"],
-            args.get("distance", 5.0)
+            args.get("distance", 5.0),
+            page=args.get("page", 1),
+            size=args.get("size"),
+            open_now=args.get("open_now", False)
         )
 
 
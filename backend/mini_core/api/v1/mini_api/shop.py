@@ -2,11 +2,12 @@ from flask.views import MethodView
 from backend.mini_core.schema.shop import (
     ProductCategoryQueryArgSchema, ReProductCategorySchema, ReProductCategoryListSchema,
     ShopProductQueryArgSchema, ReShopProductSchema, ReShopProductListSchema,
+    ProductSearchArgSchema, ProductSuggestArgSchema, ReProductSuggestSchema,
 
 )
 
 from backend.mini_core.service import (
-    shop_product_service, shop_product_category_service
+    shop_product_service, shop_product_category_service, search_service
 )
 from kit.util.blueprint import APIBlueprint
 
@@ -81,6 +82,23 @@ class ShopProductRecommendedAPI(MethodView):
         return shop_product_service.get_recommended()
 
 
+@blp.route('/shop-product/search')
+class ShopProductSearchAPI(MethodView):
+    """商品搜索API"""
 
+    @blp.arguments(ProductSearchArgSchema, location='query')
+    @blp.response(ReShopProductListSchema)
+    def get(self, args: dict):
+        """按关键词搜索上架商品，按相关度排序"""
+        return search_service.search_products(args)
 
 
+@blp.route('/shop-product/suggest')
+class ShopProductSuggestAPI(MethodView):
+    """商品名称补全API"""
+
+    @blp.arguments(ProductSuggestArgSchema, location='query')
+    @blp.response(ReProductSuggestSchema)
+    def get(self, args: dict):
+        """按名称前缀补全商品名称"""
+        return search_service.suggest_products(args)
@@ -14,6 +14,7 @@ WXShopUserUpdateSchema,
 
 )
 from backend.mini_core.service import shop_user_service
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 
 from kit.util.blueprint import APIBlueprint
 from backend.user.service import user_service
@@ -27,9 +28,11 @@ def user_loader_callback(jwt_header: dict, jwt_data: dict) -> User:
     openid = jwt_data.get("openid")
     platform = jwt_data.get("platform")
     if openid :
-        return shop_user_service.find(openid=openid)
+        return auth_cache.get_user(auth_cache.SHOP_USER, openid, ShopUser,
+                                   lambda: shop_user_service.find(openid=openid))
     else:
-        return user_service.get(jwt_data['sub'])
+        return auth_cache.get_user(auth_cache.ADMIN_USER, jwt_data['sub'], User,
+                                   lambda: user_service.get(jwt_data['sub']))
 
 
 @jwt.expired_token_loader
@@ -1,6 +1,9 @@
 import logging
+import os
 import random
+import threading
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from flask.views import MethodView
 from PIL import Image, ImageDraw, ImageFont
@@ -9,7 +12,7 @@ from datetime import datetime
 from pathlib import Path
 import uuid
 from kit.util.blueprint import APIBlueprint
-from werkzeug.utils import secure_filename
+from kit.util.local_cache import LocalCache
 from flask import  current_app
 from backend.mini_core.schema.psd_processor import (
     PSDProcessRequestSchema, PSDProcessResponseSchema
@@ -32,7 +35,12 @@ class TextAttributes:
     layer_size: Tuple[int, int]
 
 class FontManager:
-    """字体管理类"""
+    """
+    字体管理类
+
+    首次使用时扫描一次字体目录（当前目录、FONT_DIRS 配置和系统字体目录），建立文件名到路径的索引，
+    之后按索引解析字体名称，不再逐个尝试加载；已加载的字体按 (路径, 字号) 缓存
+    """
     FALLBACK_FONTS = [
         '洪亮毛笔隶书简体.ttf',
         'simkai.ttf',      # 楷体
@@ -45,48 +53,89 @@ class FontManager:
         'STZHONGS.TTF',    # 华文中宋
         'STFANGSO.TTF',    # 华文仿宋
     ]
-
-    @staticmethod
-    def load_font(font_name: str, font_size: int) -> ImageFont.FreeTypeFont:
-        """加载字体，如果指定字体不可用则尝试备用字体"""
-        try:
-            # 处理字体名称并尝试不同的文件扩展名
-            font_bases = [
-                str(font_name).replace("'", "").lower(),
-                str(font_name).replace("'", ""),
-                str(font_name).replace("'", "").replace("-", ""),
-                str(font_name).replace("'", "").replace("-Regular", ""),
-            ]
-
-            # 尝试不同的文件扩展名
-            extensions = ['.ttf', '.ttc', '.TTF', '.TTC', '.otf']
-
-            # 尝试所有可能的字体文件名组合
-            for base in font_bases:
-                for ext in extensions:
-                    try:
-                        font_file = base + ext
-                        return ImageFont.truetype(font_file, font_size)
-                    except Exception:
-                        continue
-            cc=str(font_name).replace("'", "").lower()
-
-            # 如果原始字体加载失败，尝试备用字体
-            logger.warning(f"无法加载主字体 {font_name}，尝试备用{cc}字体")
-            for fallback_font in FontManager.FALLBACK_FONTS:
-                try:
-                    return ImageFont.truetype(fallback_font, font_size)
-                except Exception as e:
-                    logger.warning(f"无法加载备用字体 {fallback_font}: {e}")
-
-            # 如果所有备用字体都失败，使用默认字体
-            logger.warning("所有字体加载失败，使用默认字体")
+    EXTENSIONS = ('.ttf', '.ttc', '.otf')
+
+    _index: Optional[Dict[str, str]] = None
+    # 字体名称 -> 字体文件路径，找不到时为 None
+    _resolved: Dict[str, Optional[str]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def load_font(cls, font_name: str, font_size: int) -> ImageFont.FreeTypeFont:
+        """加载字体，如果指定字体不可用则使用备用字体，都不可用时使用默认字体"""
+        path = cls.resolve(font_name)
+        if path is None:
             return ImageFont.load_default()
-
+        try:
+            return cls._truetype(path, font_size)
         except Exception as e:
-            logger.error(f"字体加载过程中发生错误: {e}")
+            logger.error(f"字体加载过程中发生错误: {path}, {e}")
             return ImageFont.load_default()
 
+    @classmethod
+    def resolve(cls, font_name: str) -> Optional[str]:
+        """按字体名称查找字体文件，依次尝试名称变体和备用字体"""
+        if font_name in cls._resolved:
+            return cls._resolved[font_name]
+        index = cls._font_index()
+        name = str(font_name).replace("'", "")
+        font_bases = [name.lower(), name, name.replace("-", ""), name.replace("-Regular", "")]
+        candidates = [(base + ext).lower() for base in font_bases for ext in cls.EXTENSIONS]
+        path = next((index[c] for c in candidates if c in index), None)
+        if path is None:
+            path = next((index[f.lower()] for f in cls.FALLBACK_FONTS if f.lower() in index), None)
+            if path:
+                logger.warning(f"无法找到字体 {font_name}，使用备用字体 {path}")
+            else:
+                logger.warning(f"无法找到字体 {font_name} 及备用字体，使用默认字体")
+        cls._resolved[font_name] = path
+        return path
+
+    @classmethod
+    def font_dirs(cls) -> List[Tuple[Path, bool]]:
+        """字体目录及是否递归扫描，靠前的目录优先"""
+        dirs = [(Path.cwd(), False)]
+        dirs += [(Path(d), True) for d in current_app.config.get('FONT_DIRS', [])]
+        if os.environ.get('WINDIR'):
+            dirs.append((Path(os.environ['WINDIR']) / 'Fonts', True))
+        data_dirs = os.environ.get('XDG_DATA_DIRS') or '/usr/local/share:/usr/share'
+        dirs += [(Path(d) / 'fonts', True) for d in data_dirs.split(':') if d]
+        dirs += [(Path.home() / '.local/share/fonts', True), (Path.home() / '.fonts', True),
+                 (Path('/Library/Fonts'), True), (Path('/System/Library/Fonts'), True),
+                 (Path.home() / 'Library/Fonts', True)]
+        return dirs
+
+    @classmethod
+    def reload(cls) -> None:
+        """清空索引和已加载的字体，新增字体文件后调用"""
+        with cls._lock:
+            cls._index = None
+            cls._resolved.clear()
+            cls._truetype.cache_clear()
+
+    @classmethod
+    def _font_index(cls) -> Dict[str, str]:
+        if cls._index is not None:
+            return cls._index
+        with cls._lock:
+            if cls._index is None:
+                index: Dict[str, str] = {}
+                for directory, recursive in cls.font_dirs():
+                    if not directory.is_dir():
+                        continue
+                    paths = directory.rglob('*') if recursive else directory.iterdir()
+                    for path in paths:
+                        if path.suffix.lower() in cls.EXTENSIONS and path.is_file():
+                            index.setdefault(path.name.lower(), str(path))
+                logger.info(f"字体目录扫描完成: {len(index)} 个字体文件")
+                cls._index = index
+        return cls._index
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _truetype(path: str, font_size: int) -> ImageFont.FreeTypeFont:
+        return ImageFont.truetype(path, font_size)
+
 def convert_psd_text_to_imagedraw(layer):
 
     """
@@ -207,72 +256,107 @@ def parse_font_size(rundata):
 
     return 20  # 默认字体大小
 
-def create_text_image_with_psd_attributes(psd, layer, new_text,i,file_name_color):
+@dataclass
+class PSDTemplate:
+    """解析后的 PSD 模板：去掉文字分组后的背景和各文字图层属性"""
+    mtime: int
+    background: Image.Image
+    text_layers: List[Optional[TextAttributes]]
+
+
+# 文字在图层内的纵向偏移，与模板设计稿对齐
+TEXT_OFFSET_Y = -35
+# 按模板路径缓存解析结果，文件修改时间变化后重新解析
+_template_cache = LocalCache(8)
+_template_lock = threading.Lock()
+# 文字蒙版缓存，只读使用，不能修改缓存中的图片
+_text_tile_cache = LocalCache(512)
+
+
+def load_template(psd_path: str) -> PSDTemplate:
+    """获取 PSD 模板，优先使用缓存"""
+    path = str(Path(psd_path).resolve())
+    mtime = os.stat(path).st_mtime_ns
+    template = _template_cache.get(path)
+    if template is not None and template.mtime == mtime:
+        return template
+    with _template_lock:
+        template = _template_cache.get(path)
+        if template is None or template.mtime != mtime:
+            template = parse_template(path, mtime)
+            _template_cache.set(path, template, current_app.config.get('PSD_TEMPLATE_CACHE_TTL', 3600))
+    return template
+
+
+def parse_template(path: str, mtime: int) -> PSDTemplate:
     """
-    使用PSD文本图层的属性创建新的文本图像
+    解析 PSD 模板
 
-    Args:
-        psd: PSD文件对象
-        layer: 文本图层对象
-        new_text: 新的文本内容
+    顶层分组中的文字图层按顺序记录属性，背景为隐藏全部顶层分组后的合成图
     """
-    try:
-        # 转换PSD属性
-        text_attrs = convert_psd_text_to_imagedraw(layer)
-        if not text_attrs:
-            print("无法获取文本属性")
-            return
-
-        print("转换后的属性:")
-        print(f"原文本: {text_attrs['text']}")
-        print(f"新文本：{new_text}")
-        print(f"字体: {text_attrs['font_name']}")
-        print(f"字体大小: {text_attrs['font_size']}")
-        print(f"颜色: {text_attrs['color']}")
-        print(f"位置: {text_attrs['position']}")
-        # 创建图像
-        img = Image.new('RGBA', layer.size,(0,0,0,0))
-        draw = ImageDraw.Draw(img)
-        font = FontManager.load_font(text_attrs['font_name'], text_attrs['font_size'])
-        # 计算文本位置（居中）
-        text_bbox = draw.textbbox((0, 0), new_text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-        x = (layer.size[0] - text_width) // 2
-        y = (layer.size[1] - text_height) // 2
-        # 打印字体名称,用于调试字体加载问题
-        # 绘制文本
-        draw.text((x,-35), new_text, font=font, fill=text_attrs['color'])
-        # draw.text((x,y), new_text, font=font, fill=(255,0,0,100))
-        bg=Image.new('RGBA',psd.size,(0,0,0,0))
-        img.save(f"tmp{i}.png")
-        file1 = Image.open(f"tmp{i}.png")
-        bg.paste(file1,(text_attrs['position'][0],text_attrs['position'][1]))
-        bg.save(f"bg{i}.png")
-        file_name_color[i]['file_name']=f"bg{i}.png"
-        file_name_color[i]['color']=text_attrs['color']
-    except Exception as e:
-        print(f"创建文本图像时出错: {str(e)}")
-        return None
-def save_file(file) -> str:
-    """保存上传的文件并返回生成的文件名"""
-    # 生成唯一文件名
-    original_filename = secure_filename(file.filename)
-    extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+    psd = PSDImage.open(path)
+    groups = set()
+    text_layers: List[Optional[TextAttributes]] = []
+    for layer in psd:
+        if not layer.is_group():
+            continue
+        for sublayer in layer:
+            if sublayer.kind == 'type':
+                attrs = convert_psd_text_to_imagedraw(sublayer)
+                text_layers.append(TextAttributes(**attrs) if attrs else None)
+        groups.add(id(layer))
+
+    background = psd.composite(
+        force=True, layer_filter=lambda layer: layer.is_visible() and id(layer) not in groups
+    ).convert('RGBA')
+    logger.info(f"PSD 模板解析完成: {path}, 文字图层 {len(text_layers)} 个")
+    return PSDTemplate(mtime=mtime, background=background, text_layers=text_layers)
+
+
+def render_text_mask(attrs: TextAttributes, text: str) -> Image.Image:
+    """按文字图层属性绘制新文本，返回图层大小的透明度蒙版，相同字体、字号、图层大小、透明度和文本的结果复用"""
+    key = (FontManager.resolve(attrs.font_name) or attrs.font_name, attrs.font_size, attrs.layer_size,
+           attrs.color[3], text)
+    mask = _text_tile_cache.get(key)
+    if mask is not None:
+        return mask
+    mask = Image.new('L', attrs.layer_size, 0)
+    draw = ImageDraw.Draw(mask)
+    font = FontManager.load_font(attrs.font_name, attrs.font_size)
+    # 水平居中
+    text_bbox = draw.textbbox((0, 0), text, font=font)
+    x = (attrs.layer_size[0] - (text_bbox[2] - text_bbox[0])) // 2
+    draw.text((x, TEXT_OFFSET_Y), text, font=font, fill=attrs.color[3])
+    _text_tile_cache.set(key, mask, current_app.config.get('PSD_TEXT_TILE_CACHE_TTL', 3600))
+    return mask
+
+
+def render_template(template: PSDTemplate, new_text: str) -> Image.Image:
+    """在模板背景上按顺序用新文本的每个字替换文字图层，文本不足时其余图层留空"""
+    image = template.background.copy()
+    for index, attrs in enumerate(template.text_layers):
+        if attrs is None or index >= len(new_text):
+            continue
+        image.paste(attrs.color, attrs.position, render_text_mask(attrs, new_text[index]))
+    return image
+
+
+def save_image(image: Image.Image, output_format: str, quality: int) -> str:
+    """把图片直接编码写入上传目录并返回相对路径"""
     timestamp = datetime.now().strftime('%Y%m%d')
-    unique_filename = f"{timestamp}_{uuid.uuid4().hex}.{extension}" if extension else f"{timestamp}_{uuid.uuid4().hex}"
-    # 确保上传目录存在
-    Image_Path = current_app.config.get('IMAGE_PATH')
-    upload_dir = Path(Image_Path)
-    date_dir = upload_dir / timestamp
-    if not date_dir.exists():
-        date_dir.mkdir(parents=True, exist_ok=True)
-
-    # 保存文件
+    extension = 'jpg' if output_format == 'jpeg' else output_format
+    unique_filename = f"{timestamp}_{uuid.uuid4().hex}.{extension}"
+    date_dir = Path(current_app.config.get('IMAGE_PATH')) / timestamp
+    date_dir.mkdir(parents=True, exist_ok=True)
+
     file_path = date_dir / unique_filename
-    file.save(file_path)
-    save_file_path= f"{str(Path(timestamp))}/{unique_filename}"
-    return save_file_path
+    if extension == 'jpg':
+        image.convert('RGB').save(file_path, 'JPEG', quality=quality)
+    elif extension == 'webp':
+        image.save(file_path, 'WEBP', quality=quality)
+    else:
+        image.save(file_path, 'PNG')
+    return f"{timestamp}/{unique_filename}"
 
 
 def get_file_url(filename: str) -> str:
@@ -310,69 +394,9 @@ class PSDProcessAPI(MethodView):
                 "data": None
             }
 
-        psd = PSDImage.open(psd_path)
-        i:int=0
-        layers_to_remove:list = []
-        #定义数组存储文件名和颜色 - 修改为字典列表以便修改
-        file_name_color:list = [
-            {'file_name': 'bg0.png', 'color': (255, 0, 0, 0)},
-            {'file_name': 'bg1.png', 'color': (0, 255, 0, 0)},
-            {'file_name': 'bg2.png', 'color': (0, 0, 255, 0)},
-            {'file_name': 'bg3.png', 'color': (255, 255, 255, 0)},
-            {'file_name': 'bg4.png', 'color': (255, 0, 0, 0)},
-            {'file_name': 'bg5.png', 'color': (0, 255, 0, 0)},
-            {'file_name': 'bg6.png', 'color': (0, 0, 255, 0)},
-            {'file_name': 'bg7.png', 'color': (255, 255, 255, 0)}
-        ]
-
-        for index,layer in enumerate(psd):
-            # if layer.kind == "type":
-            #     create_text_image_with_psd_attributes(psd,layer, new_text[i],i,file_name_color)
-            #     layers_to_remove.append(layer)
-            #     i=i+1
-            # else:
-            #     print(layer.kind,layer.name,index)
-            if layer.is_group():
-                # 递归遍历子图层
-                for sublayer in layer:
-                    if sublayer.kind == 'type':
-                        text = sublayer.engine_dict['Editor']['Text'].value
-                        fontset = sublayer.resource_dict['FontSet']
-                        runlength = sublayer.engine_dict['StyleRun']['RunLengthArray']
-                        rundata = sublayer.engine_dict['StyleRun']['RunArray']
-                        # 获取颜色信息
-                        color_info = parse_color_info(rundata)
-                        # 获取字体大小
-                        font_size = parse_font_size(rundata)
-                        # # 获取文本位置和变换信息
-                        transform = sublayer.transform
-                        # position = (sublayer.left, sublayer.top)
-                        # new_layer=create_text_pixel_layer(psd,font_info, "酒", layer.size, position)
-                        # text1="酱酱酱酱酱酱酱酱"
-                        create_text_image_with_psd_attributes(psd,sublayer, new_text[i],i,file_name_color)
-
-                        i=i+1
-                    else:
-                        print(layer.kind,layer.name,index)
-                layers_to_remove.append(layer)
-            # print("layer.kind",layer.kind)
-        else:
-            print("layer.kind---",layer.kind)
-#删除即将覆盖的
-        for layer1 in layers_to_remove:
-            print("layer.kind", layer1.kind)
-            layer1.clear()
-        psd.composite().save("background.png")
-        bj1=Image.open("background.png")
-        for item in file_name_color:
-            image_obj = Image.open(item['file_name'])
-            x = Image.new('RGBA', bj1.size, item['color'])
-            out0 = Image.composite(x, bj1, image_obj)
-            bj1=out0
-        save_path="finish.png"
-        bj1.save(save_path)
-        file_bak=Image.open(save_path)
-        filename = save_file(file_bak)
+        template = load_template(psd_path)
+        image = render_template(template, new_text)
+        filename = save_image(image, args.get('output_format', 'png'), args.get('quality', 95))
         file_url = get_file_url(filename)
         return {
             "code": 200,
@@ -0,0 +1,40 @@
+import datetime as dt
+from dataclasses import field
+from decimal import Decimal
+
+from marshmallow_dataclass import dataclass
+
+from kit.domain.entity import Entity
+
+
+@dataclass
+class OrderStatsHourly(Entity):
+    """
+    订单小时汇总领域模型
+
+    按下单时间每小时一行，由定时任务增量维护，仪表盘按天聚合读取
+    """
+    bucket_time: dt.datetime = field(
+        default=None,
+        metadata=dict(
+            description='统计小时(整点)',
+        ),
+    )
+    order_count: int = field(
+        default=0,
+        metadata=dict(
+            description='下单数',
+        ),
+    )
+    paid_order_count: int = field(
+        default=0,
+        metadata=dict(
+            description='已支付订单数',
+        ),
+    )
+    paid_amount: Decimal = field(
+        default=Decimal('0'),
+        metadata=dict(
+            description='已支付订单实收金额',
+        ),
+    )
@@ -12,6 +12,7 @@ from .store.store_sqla import ShopStoreSQLARepository
 from .order.order_sqla import ShopOrderSQLARepository
 from .order.order_detail_sql import OrderDetailSQLARepository
 from .order.order_log_sql import OrderLogSQLARepository
+from .order.order_stats_sqla import OrderStatsHourlySQLARepository
 from .order.shop_order_setting_sqla import ShopOrderSettingSQLARepository
 from .order.shop_return_reason_sqla import ShopReturnReasonSQLARepository
 from .order.order_return_sql import OrderReturnSQLARepository, OrderReturnDetailSQLARepository, \
@@ -53,6 +54,7 @@ shop_specification_attribute_sqla_repo = ShopSpecificationAttributeSQLARepositor
 shop_order_sqla_repo = ShopOrderSQLARepository(db.session)
 shop_order_detail_sqla_repo = OrderDetailSQLARepository(db.session)
 order_log_sqla_repo = OrderLogSQLARepository(db.session)
+order_stats_hourly_sqla_repo = OrderStatsHourlySQLARepository(db.session)
 shop_order_setting_sqla_repo = ShopOrderSettingSQLARepository(db.session)
 shop_return_reason_sqla_repo = ShopReturnReasonSQLARepository(db.session)
 # 订单退货
@@ -1,13 +1,14 @@
-from typing import Type, Tuple,List,Dict
+from typing import Type, Tuple,List,Dict,Optional
 from sqlalchemy.orm import aliased
-from sqlalchemy import Column, String, Table, Integer, DECIMAL, Text,DateTime,Float
-from sqlalchemy import and_, or_, desc, asc, func
+from sqlalchemy import Column, String, Table, Integer, DECIMAL, Text,DateTime,Float,Index
+from sqlalchemy import and_, or_, desc, asc, func, select
 from sqlalchemy import func
 
 from backend.extensions import mapper_registry
 from backend.mini_core.domain.distribution import (Distribution, DistributionConfig,
                                                    DistributionGrade, DistributionGradeUpdate,
                                                    DistributionIncome, DistributionLog)
+from kit.exceptions import ServiceBadRequest
 from kit.repository.sqla import SQLARepository
 from kit.util.sqla import id_column
 
@@ -140,6 +141,17 @@ distribution_log_table = Table(
     Column('delete_time', DateTime, comment='删除时间'),
 )
 
+# 分销层级闭包表，每个节点与其所有祖先（含自身，depth=0）各一行
+distribution_closure_table = Table(
+    'la_distribution_closure',
+    mapper_registry.metadata,
+    Column('ancestor', String(50), primary_key=True, comment='祖先用户ID'),
+    Column('descendant', String(50), primary_key=True, comment='后代用户ID'),
+    Column('depth', Integer, nullable=False, comment='层级距离'),
+    Index('ix_la_distribution_closure_ancestor_depth', 'ancestor', 'depth'),
+    Index('ix_la_distribution_closure_descendant_depth', 'descendant', 'depth'),
+)
+
 # 映射关系
 mapper_registry.map_imperatively(Distribution, distribution_table)
 mapper_registry.map_imperatively(DistributionConfig, distribution_config_table)
@@ -150,6 +162,9 @@ mapper_registry.map_imperatively(DistributionLog, distribution_log_table)
 
 
 class DistributionSQLARepository(SQLARepository):
+    # 分销树查询的最大层级，防止无限递归
+    MAX_TREE_DEPTH = 10
+
     @property
     def model(self) -> Type[Distribution]:
         return Distribution
@@ -166,176 +181,78 @@ class DistributionSQLARepository(SQLARepository):
             args: 包含查询参数的字典
                 - user_id: 父级用户ID
                 - ser_name: 搜索的用户名称（可选）
+                - max_depth: 查询的最大层级（可选，不超过 MAX_TREE_DEPTH）
 
         Returns:
             包含用户信息和分销信息的字典列表
         """
         user_id = args["user_id"]
         ser_name = args.get("ser_name")
+        max_depth = min(args.get("max_depth") or self.MAX_TREE_DEPTH, self.MAX_TREE_DEPTH)
 
+        # 通过闭包表一次范围查询取出整棵子树，层级即闭包表中的 depth
+        member_sql = """
+            SELECT
+                d.id as distribution_id,
+                d.sn,
+                d.real_name,
+                d.mobile as distribution_mobile,
+                d.identity,
+                d.reason,
+                d.user_id,
+                d.user_father_id,
+                d.grade_id,
+                d.remark as distribution_remark,
+                d.status as distribution_status,
+                d.audit_time,
+                d.create_time as distribution_create_time,
+                d.update_time as distribution_update_time,
+                u.id as shop_user_id,
+                u.username,
+                u.nickname,
+                u.phone as user_phone,
+                u.avatar,
+                u.status as user_status,
+                u.create_time as user_create_time,
+                u.last_login_time,
+                c.depth as level
+            FROM la_distribution_closure c
+            JOIN la_distribution d ON d.user_id = c.descendant
+            LEFT JOIN t_shop_user u ON d.user_id = u.user_id
+            WHERE c.ancestor = :user_id
+              AND c.depth BETWEEN 1 AND :max_depth
+        """
         if not ser_name:
             # 如果没有搜索条件，返回完整的树结构
-            sql = """
-                WITH RECURSIVE UserHierarchy AS (
-                    -- 查找直接子级用户
-                    SELECT
-                        d.id as distribution_id,
-                        d.sn,
-                        d.real_name,
-                        d.mobile as distribution_mobile,
-                        d.identity,
-                        d.reason,
-                        d.user_id,
-                        d.user_father_id,
-                        d.grade_id,
-                        d.remark as distribution_remark,
-                        d.status as distribution_status,
-                        d.audit_time,
-                        d.create_time as distribution_create_time,
-                        d.update_time as distribution_update_time,
-                        u.id as shop_user_id,
-                        u.username,
-                        u.nickname,
-                        u.phone as user_phone,
-                        u.avatar,
-                        u.status as user_status,
-                        u.create_time as user_create_time,
-                        u.last_login_time,
-                        1 as level
-                    FROM la_distribution d
-                    LEFT JOIN t_shop_user u ON d.user_id = u.user_id
-                    WHERE d.user_father_id = :user_id
-
-                    UNION ALL
-
-                    -- 递归查找子级的子级
-                    SELECT
-                        d.id as distribution_id,
-                        d.sn,
-                        d.real_name,
-                        d.mobile as distribution_mobile,
-                        d.identity,
-                        d.reason,
-                        d.user_id,
-                        d.user_father_id,
-                        d.grade_id,
-                        d.remark as distribution_remark,
-                        d.status as distribution_status,
-                        d.audit_time,
-                        d.create_time as distribution_create_time,
-                        d.update_time as distribution_update_time,
-                        u.id as shop_user_id,
-                        u.username,
-                        u.nickname,
-                        u.phone as user_phone,
-                        u.avatar,
-                        u.status as user_status,
-                        u.create_time as user_create_time,
-                        u.last_login_time,
-                        parent.level + 1 as level
-                    FROM la_distribution d
-                    LEFT JOIN t_shop_user u ON d.user_id = u.user_id
-                    JOIN UserHierarchy parent ON d.user_father_id = parent.user_id
-                    WHERE parent.level < 10  -- 防止无限递归，限制层级深度
-                )
-                SELECT DISTINCT *
-                FROM UserHierarchy
-                ORDER BY level, user_father_id, distribution_id;
-            """
-            result = self.session.execute(sql, {'user_id': user_id}).fetchall()
+            sql = member_sql + " ORDER BY level, user_father_id, distribution_id"
+            result = self.session.execute(sql, {'user_id': user_id, 'max_depth': max_depth}).fetchall()
         else:
-            # 搜索匹配节点并获取其父节点路径
-            sql = """
-                WITH RECURSIVE UserHierarchy AS (
-                    -- 获取所有子节点
-                    SELECT
-                        d.id as distribution_id,
-                        d.sn,
-                        d.real_name,
-                        d.mobile as distribution_mobile,
-                        d.identity,
-                        d.reason,
-                        d.user_id,
-                        d.user_father_id,
-                        d.grade_id,
-                        d.remark as distribution_remark,
-                        d.status as distribution_status,
-                        d.audit_time,
-                        d.create_time as distribution_create_time,
-                        d.update_time as distribution_update_time,
-                        u.id as shop_user_id,
-                        u.username,
-                        u.nickname,
-                        u.phone as user_phone,
-                        u.avatar,
-                        u.status as user_status,
-                        u.create_time as user_create_time,
-                        u.last_login_time,
-                        1 as level
-                    FROM la_distribution d
-                    LEFT JOIN t_shop_user u ON d.user_id = u.user_id
-                    WHERE d.user_father_id = :user_id
-
-                    UNION ALL
-
-                    SELECT
-                        d.id as distribution_id,
-                        d.sn,
-                        d.real_name,
-                        d.mobile as distribution_mobile,
-                        d.identity,
-                        d.reason,
-                        d.user_id,
-                        d.user_father_id,
-                        d.grade_id,
-                        d.remark as distribution_remark,
-                        d.status as distribution_status,
-                        d.audit_time,
-                        d.create_time as distribution_create_time,
-                        d.update_time as distribution_update_time,
-                        u.id as shop_user_id,
-                        u.username,
-                        u.nickname,
-                        u.phone as user_phone,
-                        u.avatar,
-                        u.status as user_status,
-                        u.create_time as user_create_time,
-                        u.last_login_time,
-                        parent.level + 1 as level
-                    FROM la_distribution d
-                    LEFT JOIN t_shop_user u ON d.user_id = u.user_id
-                    JOIN UserHierarchy parent ON d.user_father_id = parent.user_id
-                    WHERE parent.level < 10
-                ),
-                -- 找出匹配名称的节点（在真实姓名或昵称中搜索）
+            # 搜索匹配节点，并通过闭包表取出匹配节点到根节点路径上的所有上级
+            sql = f"""
+                WITH Members AS ({member_sql}),
                 MatchedNodes AS (
-                    SELECT *
-                    FROM UserHierarchy
+                    SELECT user_id
+                    FROM Members
                     WHERE real_name LIKE :ser_name
                        OR nickname LIKE :ser_name
                        OR username LIKE :ser_name
-                ),
-                -- 找出匹配节点的所有父级ID（路径）
-                ParentPaths AS (
-                    SELECT user_father_id
-                    FROM MatchedNodes
-                    UNION
-                    SELECT node.user_father_id
-                    FROM la_distribution node
-                    JOIN ParentPaths pp ON node.user_id = pp.user_father_id
-                    WHERE node.user_father_id IS NOT NULL
                 )
-                -- 返回匹配节点及其父级路径上的所有节点
                 SELECT DISTINCT h.*
-                FROM UserHierarchy h
+                FROM Members h
                 WHERE h.real_name LIKE :ser_name
                    OR h.nickname LIKE :ser_name
                    OR h.username LIKE :ser_name
-                   OR h.user_id IN (SELECT user_father_id FROM ParentPaths)
-                ORDER BY h.level, h.user_father_id, h.distribution_id;
+                   OR h.user_id IN (
+                       SELECT p.ancestor
+                       FROM la_distribution_closure p
+                       JOIN MatchedNodes m ON p.descendant = m.user_id
+                       WHERE p.depth >= 1
+                   )
+                ORDER BY h.level, h.user_father_id, h.distribution_id
             """
             result = self.session.execute(sql, {
                 'user_id': user_id,
+                'max_depth': max_depth,
                 'ser_name': f"%{ser_name}%"
             }).fetchall()
 
@@ -373,6 +290,162 @@ class DistributionSQLARepository(SQLARepository):
 
         return formatted_result
 
+    def is_descendant(self, ancestor_id: str, user_id: str) -> bool:
+        """判断 user_id 是否在 ancestor_id 的下级中"""
+        return self.session.query(distribution_closure_table.c.depth).filter(
+            distribution_closure_table.c.ancestor == str(ancestor_id),
+            distribution_closure_table.c.descendant == str(user_id),
+            distribution_closure_table.c.depth >= 1,
+        ).first() is not None
+
+    def get_ancestors(self, user_id: str, max_depth: int = 1) -> List[Tuple[Distribution, int]]:
+        """
+        获取用户的各级上级，用于多级分佣
+
+        Args:
+            user_id: 用户ID
+            max_depth: 向上查找的层数
+
+        Returns:
+            [(上级分销记录, 层级)]，按层级从近到远排序
+        """
+        closure = distribution_closure_table.c
+        return self.session.query(Distribution, closure.depth).join(
+            distribution_closure_table, Distribution.user_id == closure.ancestor
+        ).filter(
+            closure.descendant == str(user_id),
+            closure.depth.between(1, max_depth),
+        ).order_by(closure.depth).all()
+
+    def list_team(self, user_id: str, max_depth: int = 1, page: int = 1, size: int = 10) \
+            -> Tuple[List[Distribution], int, Dict[int, int]]:
+        """
+        分页获取用户前 max_depth 层的团队成员
+
+        Returns:
+            (成员列表, 成员总数, {层级: 人数})
+        """
+        closure = distribution_closure_table.c
+        conditions = (closure.ancestor == str(user_id), closure.depth.between(1, max_depth))
+        level_counts = dict(
+            self.session.query(closure.depth, func.count()).filter(*conditions).group_by(closure.depth).all()
+        )
+        query = self.session.query(Distribution).join(
+            distribution_closure_table, Distribution.user_id == closure.descendant
+        ).filter(*conditions).order_by(closure.depth, Distribution.id)
+        data = self.and_pagination(query, page, size).all()
+        return data, sum(level_counts.values()), level_counts
+
+    def create(self, entity: Distribution, commit: bool = True, flush: bool = False) -> Distribution:
+        """创建分销记录，并在同一事务中写入闭包表"""
+        entity = super().create(entity, commit=False)
+        if entity.user_id:
+            self._attach_subtree(str(entity.user_id), entity.user_father_id, new_node=True)
+        if commit:
+            self.session.commit()
+        if flush:
+            self.session.flush()
+        return entity
+
+    def update(self, entity_id: int, entity: Distribution, commit: bool = True, ignore_null=True) -> Optional[Distribution]:
+        """更新分销记录，上级变化时在同一事务中移动闭包表中的整棵子树"""
+        # 调用方可能已直接修改了 session 中的同一对象（如邀请码绑定），禁止自动 flush，
+        # 只查询列值以读取数据库中修改前的上级，不受 session 中对象状态影响
+        with self.session.no_autoflush:
+            stored = self.session.query(Distribution.user_father_id).filter(
+                Distribution.id == entity_id).with_for_update().first()
+        if stored is None:
+            return None
+        old_father_id = stored.user_father_id
+
+        result = super().update(entity_id, entity, commit=False, ignore_null=ignore_null)
+        if str(result.user_father_id or '') != str(old_father_id or ''):
+            self.move_subtree(str(result.user_id), result.user_father_id)
+        if commit:
+            self.session.commit()
+        return result
+
+    def delete(self, entity_id: int, commit: bool = True):
+        """删除分销记录，其下级与原上级在闭包表中的关系一并断开"""
+        entity = self.get_by_id(entity_id)
+        if entity and entity.user_id:
+            self._detach_subtree(str(entity.user_id))
+            closure = distribution_closure_table.c
+            self.session.execute(distribution_closure_table.delete().where(
+                or_(closure.ancestor == str(entity.user_id), closure.descendant == str(entity.user_id))
+            ))
+        super().delete(entity_id, commit=commit)
+
+    def move_subtree(self, user_id: str, new_father_id: Optional[str]) -> None:
+        """
+        将 user_id 及其全部下级挂到 new_father_id 下（不提交事务）
+
+        先删除子树与原上级之间的关系，再插入新上级的所有祖先与子树节点的笛卡尔积
+        """
+        if new_father_id and (str(new_father_id) == user_id or self.is_descendant(user_id, str(new_father_id))):
+            raise ServiceBadRequest("不能将上级设置为自己或自己的下级")
+        self._detach_subtree(user_id)
+        self._attach_subtree(user_id, new_father_id)
+
+    def _detach_subtree(self, user_id: str) -> None:
+        closure = distribution_closure_table.c
+        subtree = select(closure.descendant).where(closure.ancestor == user_id)
+        ancestors = select(closure.ancestor).where(closure.descendant == user_id, closure.depth >= 1)
+        # MySQL 不允许在 DELETE 的子查询中直接引用被删除的表，先取出 ID
+        subtree_ids = [row[0] for row in self.session.execute(subtree)]
+        ancestor_ids = [row[0] for row in self.session.execute(ancestors)]
+        if subtree_ids and ancestor_ids:
+            self.session.execute(distribution_closure_table.delete().where(
+                closure.descendant.in_(subtree_ids), closure.ancestor.in_(ancestor_ids)
+            ))
+
+    def _attach_subtree(self, user_id: str, father_id: Optional[str], new_node: bool = False) -> None:
+        closure = distribution_closure_table.c
+        if new_node:
+            self.session.execute(distribution_closure_table.insert().values(
+                ancestor=user_id, descendant=user_id, depth=0
+            ))
+        if not father_id:
+            return
+        # 新上级的每个祖先（含新上级自身）× 子树中的每个节点
+        parent = distribution_closure_table.alias('parent')
+        child = distribution_closure_table.alias('child')
+        rows = select(
+            parent.c.ancestor, child.c.descendant, parent.c.depth + child.c.depth + 1
+        ).where(parent.c.descendant == str(father_id), child.c.ancestor == user_id)
+        self.session.execute(distribution_closure_table.insert().from_select(
+            ['ancestor', 'descendant', 'depth'], rows
+        ))
+
+    def rebuild_closure(self) -> int:
+        """
+        根据 la_distribution 的 user_father_id 全量重建闭包表
+
+        Returns:
+            int: 写入的关系数
+        """
+        fathers = {
+            str(user_id): str(father_id) if father_id else None
+            for user_id, father_id in self.session.query(Distribution.user_id, Distribution.user_father_id)
+            if user_id
+        }
+        rows = []
+        for user_id in fathers:
+            rows.append(dict(ancestor=user_id, descendant=user_id, depth=0))
+            visited = {user_id}
+            father_id, depth = fathers.get(user_id), 1
+            # 上级不存在或出现环时停止
+            while father_id and father_id in fathers and father_id not in visited:
+                rows.append(dict(ancestor=father_id, descendant=user_id, depth=depth))
+                visited.add(father_id)
+                father_id, depth = fathers.get(father_id), depth + 1
+
+        self.session.execute(distribution_closure_table.delete())
+        for i in range(0, len(rows), 5000):
+            self.session.execute(distribution_closure_table.insert(), rows[i:i + 5000])
+        self.session.commit()
+        return len(rows)
+
     def list_with_parent_info(self, **kwargs) -> Tuple[List[Dict], int]:
         """
         获取分销用户列表，并包含上级用户的名称信息（ORM版本）
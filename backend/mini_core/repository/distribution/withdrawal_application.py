@@ -5,10 +5,10 @@ from sqlalchemy import Column, String, Table, Integer, DECIMAL, Text, DateTime,
 from sqlalchemy.orm import aliased
 from kit.exceptions import ServiceBadRequest
 from sqlalchemy.exc import SQLAlchemyError
-import uuid
 import json
 from backend.extensions import mapper_registry
 from backend.mini_core.domain.distributionWithdrawal import DistributionWithdrawal
+from backend.mini_core.utils.id_generator import id_generator
 from kit.repository.sqla import SQLARepository
 from kit.util.sqla import id_column
 
@@ -306,10 +306,7 @@ class DistributionWithdrawalSQLARepository(SQLARepository):
 
     def _generate_withdrawal_no(self) -> str:
         """生成提现申请单号"""
-        now = dt.datetime.now()
-        timestamp = now.strftime('%Y%m%d%H%M%S')
-        random_str = str(uuid.uuid4().int)[:6]
-        return f"WD{timestamp}{random_str}"
+        return id_generator.next_no('WD')
 
     def _create_withdrawal_log(self, distribution_id: int, amount: Decimal,
                                withdrawal_no: str, action: str) -> None:
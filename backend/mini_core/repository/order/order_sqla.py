@@ -1,12 +1,18 @@
-from typing import Type, Tuple, List, Dict, Any
+from typing import Type, Tuple, List, Dict, Any, Optional
 import datetime as dt
 from kit.exceptions import ServiceBadRequest
-from sqlalchemy import Column, String, Table, Integer, DateTime, Text, Enum, Boolean, Numeric, DECIMAL, BigInteger
+from sqlalchemy import Column, String, Table, Integer, DateTime, Text, Enum, Boolean, Numeric, DECIMAL, BigInteger, Index
 from sqlalchemy import func
+from loguru import logger
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 
 from backend.extensions import mapper_registry
 from backend.mini_core.domain.order.order import ShopOrder
-from kit.repository.sqla import SQLARepository
+from backend.mini_core.utils.redis_utils.snapshot_cache import SnapshotCache
+from backend.mini_core.utils.redis_utils.catalog_cache import catalog_cache
+from backend.mini_core.utils.redis_utils.stock_reservation import StockLockTimeout, StockReservation
+from backend.mini_core.domain.order.order_detail import OrderDetail
+from kit.repository.sqla import SQLARepository, Relation
 from kit.util.sqla import id_column
 
 __all__ = ['ShopOrderSQLARepository']
@@ -63,6 +69,11 @@ shop_order_table = Table(
     Column('create_time', DateTime, default=dt.datetime.now),
     Column('update_time', DateTime, default=dt.datetime.now, onupdate=dt.datetime.now),
     Column('updater', String(64), comment='更新人'),
+    # 仪表盘按下单时间增量统计、本月活跃用户去重
+    Index('ix_shop_order_create_time_user_id', 'create_time', 'user_id'),
+    # 仪表盘待支付、待发货订单计数
+    Index('ix_shop_order_payment_status', 'payment_status'),
+    Index('ix_shop_order_delivery_status', 'delivery_status'),
 )
 
 # 映射
@@ -70,10 +81,21 @@ mapper_registry.map_imperatively(ShopOrder, shop_order_table)
 
 
 class ShopOrderSQLARepository(SQLARepository):
+    # 预占库存等待同步锁超时后的尝试次数
+    RESERVE_ATTEMPTS = 2
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.order_stats_snapshot = SnapshotCache('order_stats', self.compute_order_stats, 'DASHBOARD_CACHE_TTL')
+
     @property
     def model(self) -> Type[ShopOrder]:
         return ShopOrder
     @property
+    def relations(self):
+        return {'details': Relation(OrderDetail, 'order_no', 'order_no')}
+
+    @property
     def query_params(self):
         return ('status')
     @property
@@ -91,7 +113,11 @@ class ShopOrderSQLARepository(SQLARepository):
                 'product_amount', 'actual_amount')
 
     def get_order_stats(self) -> Dict[str, Any]:
-        """获取订单统计信息"""
+        """获取订单统计信息（快照缓存）"""
+        return self.order_stats_snapshot.get()
+
+    def compute_order_stats(self) -> Dict[str, Any]:
+        """实时计算订单统计信息"""
         total = self.query().count()
         pending_payment = self.query().filter(ShopOrder.payment_status == '待支付').count()
         pending_delivery = self.query().filter(ShopOrder.delivery_status == '待发货').count()
@@ -185,6 +211,135 @@ class ShopOrderSQLARepository(SQLARepository):
             self.session.commit()
         return order
 
+    def close_expired_orders(self, order_nos: List[str], commit: bool = True) -> List[str]:
+        """
+        批量关闭超时未支付的订单并回补库存
+
+        只关闭仍处于待支付状态的订单, 一次查询加一次批量 UPDATE,
+        库存按商品汇总后用一条 executemany 语句回补
+
+        Args:
+            order_nos: 订单编号列表
+
+        Returns:
+            List[str]: 实际关闭的订单编号
+        """
+        if not order_nos:
+            return []
+        rows = self.session.query(self.model.id, self.model.order_no).filter(
+            self.model.order_no.in_(order_nos),
+            self.model.status == '待支付',
+            self.model.payment_status == '待支付',
+        ).with_for_update().all()
+        if not rows:
+            if commit:
+                self.session.commit()
+            return []
+
+        now = dt.datetime.now()
+        self.session.query(self.model).filter(
+            self.model.id.in_([row.id for row in rows])
+        ).update(
+            {'status': '已关闭', 'close_time': now, 'update_time': now, 'updater': 'system'},
+            synchronize_session=False
+        )
+        self.restore_stock([row.order_no for row in rows])
+        if commit:
+            self.session.commit()
+        return [row.order_no for row in rows]
+
+    def restore_stock(self, order_nos: List[str]) -> None:
+        """
+        回补关闭、取消订单的库存
+
+        有库存预占的订单在事务提交后释放预占，由库存同步任务写回数据库；
+        其他订单（未启用预占时创建的订单）按订单明细汇总数量直接回补商品库存
+        """
+        from sqlalchemy import bindparam
+        from backend.mini_core.domain.order.order_detail import OrderDetail
+        from backend.mini_core.repository.shop.shop_sqla import shop_product_table
+
+        try:
+            reserved = StockReservation.reserved_orders(order_nos)
+        except Exception as e:
+            logger.warning(f"查询库存预占失败，按数据库回补库存: {str(e)}")
+            reserved = set()
+        if reserved:
+            StockReservation.release_on_commit(self.session, reserved)
+        order_nos = [order_no for order_no in order_nos if order_no not in reserved]
+        if not order_nos:
+            return
+
+        quantities = self.session.query(
+            OrderDetail.product_id, func.sum(OrderDetail.num)
+        ).filter(
+            OrderDetail.order_no.in_(order_nos),
+            OrderDetail.product_id.isnot(None),
+        ).group_by(OrderDetail.product_id).all()
+        if not quantities:
+            return
+
+        stmt = shop_product_table.update().where(
+            shop_product_table.c.id == bindparam('b_product_id')
+        ).values(stock=shop_product_table.c.stock + bindparam('b_quantity'))
+        self.session.execute(stmt, [
+            {'b_product_id': product_id, 'b_quantity': int(quantity)}
+            for product_id, quantity in quantities
+        ])
+        product_ids = [product_id for product_id, _ in quantities]
+        catalog_cache.invalidate_on_commit(self.session, product_ids)
+        StockReservation.invalidate_on_commit(self.session, product_ids)
+
+    def _reserve_stock(self, order_no: str, cart_items: List[Dict[str, Any]]) -> Tuple[bool, Optional[str]]:
+        """
+        在 Redis 中预占库存
+
+        Returns:
+            Tuple: (是否已预占, 无法下单时的提示)；只有建立 Redis 连接失败（尚未发送命令）时返回 (False, None)，
+            由调用方改为更新数据库。
+            命令发出后超时或断开时预占脚本可能已经执行，先检查预占是否存在：存在则视为已预占，
+            不存在则重试；检查也失败时拒绝下单。其他错误（如等待库存同步锁超时）时 Redis 中可能有
+            尚未写回的预占，数据库库存偏大，同样不能改为更新数据库，重试后仍失败则拒绝下单
+        """
+        from backend.mini_core.repository import shop_product_sqla_repo
+        from backend.mini_core.utils.redis_utils.order_queue import RedisOrderQueue
+
+        quantities: Dict[int, int] = {}
+        names = {}
+        for item in cart_items:
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + int(item['number'])
+            names[item['product_id']] = item['product_name']
+        try:
+            StockReservation.connect()
+        except RedisConnectionError as e:
+            logger.warning(f"连接 Redis 失败，改为更新数据库库存: {order_no}, {str(e)}")
+            return False, None
+        for attempt in range(self.RESERVE_ATTEMPTS):
+            try:
+                ok, product_id, available = StockReservation.reserve(
+                    order_no, quantities, RedisOrderQueue.DEFAULT_EXPIRY_SECONDS, shop_product_sqla_repo.get_stocks
+                )
+                break
+            except (RedisConnectionError, RedisTimeoutError) as e:
+                # 预占脚本是原子的，预占存在说明脚本已执行成功
+                logger.warning(f"预占库存请求失败，检查预占结果: {order_no}, 第 {attempt + 1} 次, {str(e)}")
+                try:
+                    if StockReservation.is_reserved(order_no):
+                        return True, None
+                except Exception as check_error:
+                    logger.error(f"检查库存预占失败: {order_no}, {str(check_error)}")
+                    return False, "库存同步中，请稍后重试"
+            except StockLockTimeout as e:
+                logger.warning(f"预占库存等待同步锁超时: {order_no}, 第 {attempt + 1} 次, {str(e)}")
+            except Exception as e:
+                logger.error(f"预占库存失败: {order_no}, {str(e)}")
+                return False, "库存校验失败，请稍后重试"
+        else:
+            return False, "库存同步中，请稍后重试"
+        if not ok:
+            return False, f"商品库存不足: {names[product_id]}，当前库存: {max(available, 0)}"
+        return True, None
+
     def confirm_receipt_with_points(self, order_no: str, order_update_data: Dict,
                                     user_update_data: Dict) -> Dict[str, Any]:
         """确认收货并奖励积分的数据库操作"""
@@ -273,8 +428,8 @@ class ShopOrderSQLARepository(SQLARepository):
         Returns:
             Dict: 包含操作结果的字典
         """
-        from backend.mini_core.domain.order.order_detail import OrderDetail
         from backend.mini_core.domain.order.shop_order_cart import ShopOrderCart
+        from backend.mini_core.repository.order.order_detail_sql import order_detail_table
         from backend.mini_core.domain.shop import ShopProduct
         from sqlalchemy.exc import SQLAlchemyError
         from backend.mini_core.utils.redis_utils.order_queue import RedisOrderQueue
@@ -286,16 +441,22 @@ class ShopOrderSQLARepository(SQLARepository):
         order_no = args["order_no"]
         user_data = args["user_data"]
 
+        reserved = False
+        if StockReservation.enabled():
+            reserved, message = self._reserve_stock(order_no, cart_items)
+            if message:
+                return dict(data=None, code=400, message=message)
+
         # 开始事务
         try:
             # 创建订单
             order = ShopOrder(**order_data_to_save)
             self.session.add(order)
             self.session.flush()  # 确保获取到主键ID
-            # 创建订单详情
-            order_details = []
+            # 创建订单详情，一条多行 INSERT
+            detail_rows = []
             for item in cart_items:
-                detail_data = {
+                detail_rows.append({
                     'order_no': order_no,
                     'order_item_id': f"{order_no}_{item['product_id']}",
                     'sku_id': str(item['product_id']),
@@ -310,30 +471,35 @@ class ShopOrderSQLARepository(SQLARepository):
                     'total_price': item['subtotal'],
                     'is_gift': 0,
                     'refund_status': 0
-                }
-                order_detail = OrderDetail(**detail_data)
-                order_details.append(order_detail)
-                self.session.add(order_detail)
+                })
+            self.session.execute(order_detail_table.insert(), detail_rows)
 
             # 删除购物车项
-            cart_ids = [item['cart_id'] for item in cart_items]
+            cart_ids = [item['cart_id'] for item in cart_items if item['cart_id']]
             if cart_ids:
                 # 优化：批量操作
                 self.session.query(ShopOrderCart).filter(
                     ShopOrderCart.id.in_(cart_ids)
                 ).delete(synchronize_session='fetch')
 
-            # 更新商品库存
-            for item in cart_items:
-                product_id = item['product_id']
-                number = item['number']
-                # 使用update语句直接更新库存，避免竞态条件
-                self.session.query(ShopProduct).filter(
-                    ShopProduct.id == product_id
-                ).update(
-                    {"stock": ShopProduct.stock - number},
-                    synchronize_session='evaluate'
-                )
+            # 未预占库存时直接扣减数据库库存，库存不足则整单回滚
+            if not reserved:
+                for item in cart_items:
+                    product_id = item['product_id']
+                    number = item['number']
+                    updated = self.session.query(ShopProduct).filter(
+                        ShopProduct.id == product_id,
+                        ShopProduct.stock >= number
+                    ).update(
+                        {"stock": ShopProduct.stock - number},
+                        synchronize_session=False
+                    )
+                    if not updated:
+                        self.session.rollback()
+                        return dict(data=None, code=400, message=f"商品库存不足: {item['product_name']}")
+                product_ids = [item['product_id'] for item in cart_items]
+                catalog_cache.invalidate_on_commit(self.session, product_ids)
+                StockReservation.invalidate_on_commit(self.session, product_ids)
             # 提交事务
             RedisOrderQueue.add_pending_order(order_no, order_data_to_save)
 
@@ -351,8 +517,15 @@ class ShopOrderSQLARepository(SQLARepository):
         except SQLAlchemyError as e:
             # 发生异常时回滚事务
             self.session.rollback()
+            if reserved:
+                StockReservation.release(order_no)
             print(e)
             return dict(data=None, code=500, message=f"订单创建失败: {str(e)}")
+        except Exception:
+            self.session.rollback()
+            if reserved:
+                StockReservation.release(order_no)
+            raise
 
     def get_order_msg(self, user_id, args: dict):
         """
@@ -360,7 +533,7 @@ class ShopOrderSQLARepository(SQLARepository):
 
         Args:
             user_id (str): 用户ID，可以查询用户的所有订单
-            args (dict): 包含查询参数的字典
+            args (dict): 包含查询参数的字典，传入 cursor 时使用游标分页
 
         Returns:
             Dict: 包含订单信息和订单详情的字典
@@ -388,41 +561,52 @@ class ShopOrderSQLARepository(SQLARepository):
             return {"code": 400, "message": "必须提供至少一个查询条件"}
         filter_expr = and_(*filter_conditions)
 
-        # 查询订单总数
-        total_count = self.session.query(func.count(self.model.id)).filter(filter_expr).scalar()
-
-        # 如果没有订单，直接返回空结果
-        if total_count == 0:
-            return {"data": [], "code": 200, "total": 0, "page": page, "size": size}
+        cursor_mode = args.get('cursor') is not None
+        if cursor_mode:
+            # 游标分页：按 (create_time, id) 倒序定位，只有需要时才统计总数
+            paginated_orders, total_count = self.keyset_list(
+                cursor=args['cursor'],
+                size=size,
+                ordering=['-create_time', '-id'],
+                extra_conditions=[filter_expr],
+                need_total_count=args.get('need_total_count'),
+            )
+            total_count = total_count if args.get('need_total_count') else None
+        else:
+            # 查询订单总数
+            total_count = self.session.query(func.count(self.model.id)).filter(filter_expr).scalar()
 
-        # 计算分页参数
-        offset = (page - 1) * size
+            # 如果没有订单，直接返回空结果
+            if total_count == 0:
+                return {"data": [], "code": 200, "total": 0, "page": page, "size": size}
 
-        # 查询分页后的订单数据
-        paginated_orders = self.session.query(self.model).filter(filter_expr).order_by(
-            desc(self.model.create_time)).offset(offset).limit(size).all()
+            # 计算分页参数
+            offset = (page - 1) * size
 
-        # 获取这些订单的ID列表
-        order_nos = [order.order_no for order in paginated_orders]
+            # 查询分页后的订单数据
+            paginated_orders = self.session.query(self.model).filter(filter_expr).order_by(
+                desc(self.model.create_time)).offset(offset).limit(size).all()
 
-        # 使用连表查询获取订单和订单详情
-        results = self.session.query(OrderDetail).filter(OrderDetail.order_no.in_(order_nos)).all()
-        order_details={}
-        for result in results:
-            if not result.order_no in order_details:
-                order_details[result.order_no] = [asdict(result)]
-            else:
-                order_details[result.order_no].append(asdict(result))
+        # 一次 IN 查询批量加载这些订单的详情
+        self.prefetch(paginated_orders, ['details'])
         # 组装最终结果
         result_data = []
         for order in paginated_orders:
-            order_details_list = order_details.get(order.order_no, [])
+            order_details_list = [asdict(detail) for detail in order.details]
             # 计算订单总数和总金
             order_data = {
                 "order_info": asdict(order),
                 "order_details": order_details_list,
             }
             result_data.append(order_data)
+        if cursor_mode:
+            return {
+                "data": result_data,
+                "code": 200,
+                "total": total_count,
+                "size": size,
+                "next_cursor": paginated_orders.next_cursor,
+            }
         return {
             "data": result_data,
             "code": 200,
@@ -437,18 +621,129 @@ class ShopOrderSQLARepository(SQLARepository):
         order = self.get_by_id(order_id)
         return order
 
-    def get_and_complete_delivered_orders(self, fourteen_days_ago: dt.datetime):
+    def find_delivered_orders(self, start_time: dt.datetime, end_time: dt.datetime, after_id: int = 0,
+                              limit: int = 500) -> list:
         """
-            查询并自动完成符合条件的已发货订单
+        按 ID 升序分页查询待自动完成的已发货订单
 
-            参数:
-                fourteen_days_ago: 14天前的时间
-            """
-        query = self.session.query(ShopOrder).filter(
+        Args:
+            start_time: 交易时间下限
+            end_time: 交易时间上限
+            after_id: 只查询 ID 大于该值的订单
+            limit: 每页数量
+
+        Returns:
+            list: (id, order_no, user_id, actual_amount) 行
+        """
+        return self.session.query(
+            self.model.id, self.model.order_no, self.model.user_id, self.model.actual_amount
+        ).filter(
+            self.model.id > after_id,
             self.model.delivery_status == '已发货',
-            self.model.transaction_time >= fourteen_days_ago,
-            self.model.transaction_time <= dt.datetime.now(),
+            self.model.transaction_time >= start_time,
+            self.model.transaction_time <= end_time,
             self.model.payment_no.isnot(None),
             self.model.payment_no != ''
-        )
-        return query.all()
+        ).order_by(self.model.id).limit(limit).all()
+
+    def complete_delivered_orders(self, order_ids: List[int],
+                                  operator: str = 'system') -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        批量确认收货并奖励积分，整批在一个事务中完成
+
+        订单状态一条 UPDATE；积分按用户汇总后一条 UPDATE ... CASE；
+        分销收益改为待结算，上级的冻结金额转入待提现，同样按上级汇总后一条 UPDATE
+
+        Args:
+            order_ids: 订单ID
+            operator: 操作人
+
+        Returns:
+            Tuple: (完成的订单, 失败的订单)，完成的订单包含积分变化，用于记录日志
+        """
+        from decimal import Decimal, ROUND_HALF_UP
+        from sqlalchemy import case
+        from backend.mini_core.domain.distribution import Distribution, DistributionIncome
+        from backend.mini_core.domain.t_user import ShopUser
+        from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
+
+        try:
+            orders = self.session.query(
+                self.model.id, self.model.order_no, self.model.user_id, self.model.actual_amount
+            ).filter(
+                self.model.id.in_(order_ids),
+                self.model.delivery_status == '已发货',
+            ).order_by(self.model.id).with_for_update().all()
+            if not orders:
+                self.session.commit()
+                return [], []
+
+            users = {
+                row.user_id: row for row in self.session.query(
+                    ShopUser.user_id, ShopUser.points, ShopUser.openid
+                ).filter(
+                    ShopUser.user_id.in_({str(order.user_id) for order in orders})
+                ).with_for_update().all()
+            }
+            failed = [dict(order_no=order.order_no, reason='用户不存在')
+                      for order in orders if str(order.user_id) not in users]
+            orders = [order for order in orders if str(order.user_id) in users]
+            if not orders:
+                self.session.commit()
+                return [], failed
+
+            # 积分按订单实付金额四舍五入，与逐单写入整数列时一致
+            completed = []
+            rewards: Dict[str, int] = {}
+            for order in orders:
+                user_id = str(order.user_id)
+                reward = int(Decimal(str(order.actual_amount or 0)).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+                old_points = (users[user_id].points or 0) + rewards.get(user_id, 0)
+                completed.append(dict(order_no=order.order_no, actual_amount=order.actual_amount or 0,
+                                      points_reward=reward, old_points=old_points, new_points=old_points + reward))
+                rewards[user_id] = rewards.get(user_id, 0) + reward
+            rewards = {user_id: reward for user_id, reward in rewards.items() if reward}
+
+            now = dt.datetime.now()
+            self.session.query(self.model).filter(
+                self.model.id.in_([order.id for order in orders])
+            ).update({
+                'delivery_status': '已签收', 'status': '已完成', 'confirm_time': now,
+                'update_time': now, 'updater': operator,
+            }, synchronize_session=False)
+
+            if rewards:
+                self.session.query(ShopUser).filter(ShopUser.user_id.in_(rewards)).update(
+                    {'points': func.coalesce(ShopUser.points, 0) + case(rewards, value=ShopUser.user_id, else_=0)},
+                    synchronize_session=False
+                )
+
+            order_nos = [order.order_no for order in orders]
+            incomes = self.session.query(
+                DistributionIncome.user_father_id, func.sum(DistributionIncome.distribution_amount)
+            ).filter(
+                DistributionIncome.order_no.in_(order_nos)
+            ).group_by(DistributionIncome.user_father_id).all()
+            if incomes:
+                self.session.query(DistributionIncome).filter(
+                    DistributionIncome.order_no.in_(order_nos)
+                ).update({'status': 0}, synchronize_session=False)
+                amounts = {father_id: float(amount or 0) for father_id, amount in incomes if father_id}
+                if amounts:
+                    amount = case(amounts, value=Distribution.user_id, else_=0)
+                    self.session.query(Distribution).filter(Distribution.user_id.in_(amounts)).update({
+                        'frozen_amount': func.coalesce(Distribution.frozen_amount, 0) - amount,
+                        'wait_amount': func.coalesce(Distribution.wait_amount, 0) + amount,
+                    }, synchronize_session=False)
+
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        # 批量更新不会触发用户实体事件，手动删除认证缓存中的积分
+        auth_cache.invalidate([
+            auth_cache.user_key(auth_cache.SHOP_USER, users[user_id].openid)
+            for user_id in rewards if users[user_id].openid
+        ])
+        return completed, failed
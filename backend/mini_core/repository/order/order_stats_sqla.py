@@ -0,0 +1,147 @@
+import datetime as dt
+from decimal import Decimal
+from typing import Type, Tuple, List, Dict, Any, Optional
+
+from sqlalchemy import Column, Table, Integer, DateTime, DECIMAL, case, func
+
+from backend.extensions import mapper_registry
+from backend.mini_core.domain.order.order import ShopOrder
+from backend.mini_core.domain.order.order_stats import OrderStatsHourly
+from kit.repository.sqla import SQLARepository
+from kit.util.sqla import id_column
+
+__all__ = ['OrderStatsHourlySQLARepository']
+
+# 订单小时汇总表
+order_stats_hourly_table = Table(
+    'shop_order_stats_hourly',
+    mapper_registry.metadata,
+    id_column(),
+    Column('bucket_time', DateTime, nullable=False, unique=True, comment='统计小时(整点)'),
+    Column('order_count', Integer, nullable=False, default=0, comment='下单数'),
+    Column('paid_order_count', Integer, nullable=False, default=0, comment='已支付订单数'),
+    Column('paid_amount', DECIMAL(14, 2), nullable=False, default=0, comment='已支付订单实收金额'),
+    Column('create_time', DateTime, default=dt.datetime.now),
+    Column('update_time', DateTime, default=dt.datetime.now, onupdate=dt.datetime.now),
+)
+
+# 映射
+mapper_registry.map_imperatively(OrderStatsHourly, order_stats_hourly_table)
+
+HOUR = dt.timedelta(hours=1)
+
+
+def truncate_hour(value: dt.datetime) -> dt.datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class OrderStatsHourlySQLARepository(SQLARepository):
+    @property
+    def model(self) -> Type[OrderStatsHourly]:
+        return OrderStatsHourly
+
+    @property
+    def range_query_params(self) -> Tuple:
+        return ('bucket_time',)
+
+    def aggregate_orders(self, start: dt.datetime, end: Optional[dt.datetime] = None) -> Dict[dt.datetime, Dict[str, Any]]:
+        """
+        直接从订单表按小时聚合 [start, end) 区间的数据，一次扫描使用条件聚合
+
+        Returns:
+            Dict: {整点时间: {'order_count', 'paid_order_count', 'paid_amount'}}
+        """
+        is_paid = ShopOrder.payment_status == '已支付'
+        hour = func.date_format(ShopOrder.create_time, '%Y-%m-%d %H:00:00').label('hour')
+        query = self.session.query(
+            hour,
+            func.count(ShopOrder.id).label('order_count'),
+            func.sum(case((is_paid, 1), else_=0)).label('paid_order_count'),
+            func.sum(case((is_paid, ShopOrder.actual_amount), else_=0)).label('paid_amount'),
+        ).filter(ShopOrder.create_time >= start)
+        if end is not None:
+            query = query.filter(ShopOrder.create_time < end)
+
+        buckets = {}
+        for row in query.group_by(hour).all():
+            bucket_time = row.hour if isinstance(row.hour, dt.datetime) else \
+                dt.datetime.strptime(row.hour, '%Y-%m-%d %H:%M:%S')
+            buckets[bucket_time] = {
+                'order_count': int(row.order_count or 0),
+                'paid_order_count': int(row.paid_order_count or 0),
+                'paid_amount': Decimal(row.paid_amount or 0),
+            }
+        return buckets
+
+    def refresh(self, start: dt.datetime, end: dt.datetime, commit: bool = True) -> int:
+        """
+        重新计算 [start, end) 内每个整点小时的汇总并覆盖写入
+
+        没有订单的小时也写入 0 值行，保证汇总表的小时连续，
+        读取时可以用最新一行的时间作为汇总覆盖的截止点
+
+        Returns:
+            int: 写入的小时数
+        """
+        start, end = truncate_hour(start), truncate_hour(end)
+        if start >= end:
+            return 0
+        buckets = self.aggregate_orders(start, end)
+
+        rows = []
+        bucket_time = start
+        while bucket_time < end:
+            data = buckets.get(bucket_time, {})
+            stats = OrderStatsHourly(
+                bucket_time=bucket_time,
+                order_count=data.get('order_count', 0),
+                paid_order_count=data.get('paid_order_count', 0),
+                paid_amount=data.get('paid_amount', Decimal('0')),
+            )
+            stats.create_time = stats.update_time = dt.datetime.now()
+            rows.append(stats)
+            bucket_time += HOUR
+
+        self.session.query(OrderStatsHourly).filter(
+            OrderStatsHourly.bucket_time >= start,
+            OrderStatsHourly.bucket_time < end
+        ).delete(synchronize_session=False)
+        self.session.bulk_save_objects(rows)
+        if commit:
+            self.session.commit()
+        return len(rows)
+
+    def latest_bucket(self) -> Optional[dt.datetime]:
+        """已汇总的最新整点"""
+        return self.session.query(func.max(OrderStatsHourly.bucket_time)).scalar()
+
+    def earliest_order_time(self) -> Optional[dt.datetime]:
+        return self.session.query(func.min(ShopOrder.create_time)).scalar()
+
+    def daily_totals(self, start: dt.datetime) -> Tuple[Dict[dt.date, Dict[str, Any]], Optional[dt.datetime]]:
+        """
+        从汇总表按天读取 start 之后的数据
+
+        Returns:
+            Tuple: ({日期: 汇总数据}, 汇总覆盖的截止时间，没有数据时为 None)
+        """
+        day = func.date(OrderStatsHourly.bucket_time).label('day')
+        rows = self.session.query(
+            day,
+            func.sum(OrderStatsHourly.order_count).label('order_count'),
+            func.sum(OrderStatsHourly.paid_order_count).label('paid_order_count'),
+            func.sum(OrderStatsHourly.paid_amount).label('paid_amount'),
+            func.max(OrderStatsHourly.bucket_time).label('latest'),
+        ).filter(OrderStatsHourly.bucket_time >= start).group_by(day).all()
+
+        totals = {}
+        covered_until = None
+        for row in rows:
+            totals[row.day] = {
+                'order_count': int(row.order_count or 0),
+                'paid_order_count': int(row.paid_order_count or 0),
+                'paid_amount': Decimal(row.paid_amount or 0),
+            }
+            if covered_until is None or row.latest + HOUR > covered_until:
+                covered_until = row.latest + HOUR
+        return totals, covered_until
@@ -153,6 +153,27 @@ class ShopOrderLogisticsSQLARepository(SQLARepository):
             self.session.commit()
         return logistics
 
+    def bulk_update_logistics_routes(self, mappings: List[Dict[str, Any]], commit: bool = True) -> int:
+        """
+        批量更新物流轨迹信息
+
+        Args:
+            mappings: 每项必须包含 id, 其余键为需要更新的列
+                      (logistics_route, current_status, current_location, receiving_time)
+
+        Returns:
+            int: 更新的记录数
+        """
+        if not mappings:
+            return 0
+        now = dt.datetime.now()
+        for mapping in mappings:
+            mapping.setdefault('update_time', now)
+        self.session.bulk_update_mappings(self.model, mappings)
+        if commit:
+            self.session.commit()
+        return len(mappings)
+
     def mark_as_delivered(self, logistics_id: int, receiving_time: dt.datetime = None) -> ShopOrderLogistics:
         """
         标记物流已送达
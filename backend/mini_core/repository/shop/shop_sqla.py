@@ -1,12 +1,17 @@
 import datetime as dt
-from typing import Type, Tuple
+from typing import Dict, List, Optional, Type, Tuple
 
 from flask_jwt_extended import get_current_user
-from sqlalchemy import Column, String, Table, Integer, DateTime, Text, Enum, Boolean, Numeric, ForeignKey,JSON
+from sqlalchemy import Column, String, Table, Integer, DateTime, Text, Enum, Boolean, Numeric, ForeignKey,JSON, event
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import object_session
 from kit.util.sqla import id_column, JsonText
 from backend.extensions import mapper_registry
 from backend.mini_core.domain.shop import ShopProductCategory, ShopProduct
-from kit.repository.sqla import SQLARepository
+from backend.mini_core.utils.redis_utils.catalog_cache import catalog_cache
+from backend.mini_core.utils.redis_utils.search_changelog import SearchChangeLog
+from backend.mini_core.utils.redis_utils.stock_reservation import StockReservation
+from kit.repository.sqla import Record, SQLARepository
 from kit.util.sqla import id_column
 
 __all__ = ['ShopProductCategorySQLARepository', 'ShopProductSQLARepository']
@@ -98,6 +103,9 @@ class ShopProductCategorySQLARepository(SQLARepository):
 
 
 class ShopProductSQLARepository(SQLARepository):
+    # 列表接口不返回的大字段，只在商品详情中使用
+    LIST_DEFER_FIELDS = ('detail', 'purchase_notice', 'features', 'services', 'attributes', 'spec_combinations')
+
     @property
     def model(self) -> Type[ShopProduct]:
         return ShopProduct
@@ -110,4 +118,87 @@ class ShopProductSQLARepository(SQLARepository):
     # def fuzzy_query_params(self) -> Tuple:
     #     return 'name', 'code',
 
-
+    def list_rows_by_ids(self, ids: List[int]) -> List[Record]:
+        """按 ID 批量查询商品列表字段，供目录缓存回源"""
+        if not ids:
+            return []
+        columns = self._projection_columns(defer_fields=self.LIST_DEFER_FIELDS)
+        query = self.session.query(*columns).filter(ShopProduct.id.in_(ids))
+        return self._load(query, defer_fields=self.LIST_DEFER_FIELDS)
+
+    def search_documents(self, ids: Optional[List[int]] = None) -> list:
+        """搜索索引需要的字段，不传 ids 时返回全部商品"""
+        query = self.session.query(
+            ShopProduct.id, ShopProduct.name, ShopProduct.alias, ShopProduct.keywords, ShopProduct.features,
+            ShopProduct.category_id, ShopProduct.price, ShopProduct.status,
+        )
+        if ids is not None:
+            query = query.filter(ShopProduct.id.in_(ids))
+        return query.all()
+
+    def get_stocks(self, ids: List[int]) -> Dict[int, int]:
+        """按 ID 批量查询库存，使用独立连接读取最新提交的数据，不受当前事务快照影响"""
+        stmt = select(shop_product_table.c.id, shop_product_table.c.stock).where(shop_product_table.c.id.in_(ids))
+        with self.session.get_bind().connect() as conn:
+            return {row.id: row.stock or 0 for row in conn.execute(stmt)}
+
+    def adjust_stock(self, product_id: int, quantity: int) -> Optional[ShopProduct]:
+        """在数据库中原子地增减库存，库存不小于 0"""
+        updated = self.session.query(ShopProduct).filter(ShopProduct.id == product_id).update(
+            {'stock': func.greatest(func.coalesce(ShopProduct.stock, 0) + quantity, 0)},
+            synchronize_session=False
+        )
+        if not updated:
+            self.session.rollback()
+            return None
+        catalog_cache.invalidate_on_commit(self.session, [product_id])
+        StockReservation.invalidate_on_commit(self.session, [product_id])
+        self.session.commit()
+        return self.get_by_id(product_id)
+
+    def apply_stock_deltas(self, deltas: Dict[int, int]) -> None:
+        """把库存预占产生的变化批量写回数据库，一条 executemany 语句"""
+        stmt = shop_product_table.update().where(
+            shop_product_table.c.id == bindparam('b_product_id')
+        ).values(stock=func.coalesce(shop_product_table.c.stock, 0) + bindparam('b_delta'))
+        try:
+            self.session.execute(stmt, [
+                {'b_product_id': product_id, 'b_delta': delta} for product_id, delta in deltas.items()
+            ])
+            catalog_cache.invalidate_on_commit(self.session, deltas)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+# 搜索索引使用的商品字段，其他字段变化不需要更新索引
+PRODUCT_SEARCH_FIELDS = frozenset({'name', 'alias', 'keywords', 'features', 'category_id', 'price', 'status'})
+
+
+@event.listens_for(ShopProduct, 'after_insert')
+@event.listens_for(ShopProduct, 'after_delete')
+def product_invalidate_catalog_lists(mapper, connection, target: ShopProduct):
+    session = object_session(target)
+    catalog_cache.invalidate_on_commit(session, [target.id], lists=True)
+    SearchChangeLog.record_on_commit(session, [f"product:{target.id}"])
+
+
+@event.listens_for(ShopProduct, 'after_update')
+def product_invalidate_catalog_cache(mapper, connection, target: ShopProduct):
+    # 只有库存等字段变化时不影响列表结果，只删除商品行
+    session = object_session(target)
+    changed = catalog_cache.changed_fields(target)
+    catalog_cache.invalidate_on_commit(session, [target.id], lists=bool(changed - catalog_cache.ROW_ONLY_FIELDS))
+    # 直接修改了数据库库存，库存计数需要重新初始化
+    if 'stock' in changed:
+        StockReservation.invalidate_on_commit(session, [target.id])
+    if changed & PRODUCT_SEARCH_FIELDS:
+        SearchChangeLog.record_on_commit(session, [f"product:{target.id}"])
+
+
+@event.listens_for(ShopProductCategory, 'after_insert')
+@event.listens_for(ShopProductCategory, 'after_update')
+@event.listens_for(ShopProductCategory, 'after_delete')
+def category_invalidate_catalog_tree(mapper, connection, target: ShopProductCategory):
+    catalog_cache.invalidate_on_commit(object_session(target), tree=True)
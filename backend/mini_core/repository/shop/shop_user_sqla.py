@@ -1,5 +1,5 @@
 import datetime as dt
-from typing import List, Optional, Tuple, Type
+from typing import Iterator, List, Optional, Tuple, Type
 from sqlalchemy import BigInteger, Column, DateTime, String, Table, Text, Integer, Date, DECIMAL, Boolean, and_, or_, \
     desc
 from sqlalchemy import event
@@ -7,6 +7,7 @@ from sqlalchemy import event
 from backend.extensions import mapper_registry
 from backend.mini_core.domain.t_user import ShopUser, ShopUserAddress
 from backend.mini_core.message.shop_user import ShopUserMessage
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from kit.exceptions import ServiceBadRequest
 from kit.repository.sqla import SQLARepository
 from kit.util.sqla import id_column
@@ -105,6 +106,18 @@ class ShopUserSQLARepository(SQLARepository):
         # 提取invite_code值并返回列表
         return [row.invite_code for row in result if row.invite_code]
 
+    def iter_invite_codes(self, batch_size: int = 5000) -> Iterator[str]:
+        """按 ID 分批遍历全部已分配的邀请码，供邀请码布隆过滤器重建"""
+        last_id = 0
+        while True:
+            rows = self.session.query(ShopUser.id, ShopUser.invite_code).filter(
+                ShopUser.id > last_id, ShopUser.invite_code.isnot(None)
+            ).order_by(ShopUser.id).limit(batch_size).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield from (row.invite_code for row in rows)
+
     def get_by_username(self, username: str) -> Optional[ShopUser]:
         """通过用户名获取用户"""
         return self.session.query(ShopUser).filter(ShopUser.username == username).first()
@@ -208,3 +221,13 @@ def shop_user_before_update(mapper, connection, target: ShopUser):
         ).first()
         if existing:
             raise ServiceBadRequest(ShopUserMessage.OPENID_EXISTED)
+
+
+@event.listens_for(ShopUser, 'after_update')
+@event.listens_for(ShopUser, 'after_delete')
+def shop_user_invalidate_auth_cache(mapper, connection, target: ShopUser):
+    # 认证缓存按 openid 保存，openid 被修改时新旧两个键都要删除
+    auth_cache.invalidate_on_commit(target, [
+        auth_cache.user_key(auth_cache.SHOP_USER, openid)
+        for openid in auth_cache.attribute_values(target, 'openid')
+    ])
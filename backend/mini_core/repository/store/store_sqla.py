@@ -1,10 +1,14 @@
-from typing import Type, Tuple, List, Dict, Any
+from typing import Type, Tuple, List, Dict, Any, Optional
 import datetime as dt
 from dataclasses import asdict
-from sqlalchemy import Column, String, Table, Integer, DateTime, Text, Enum, Boolean, Numeric, func
+from sqlalchemy import Column, String, Table, Integer, DateTime, Text, Enum, Boolean, Numeric, Index, func, event, inspect
+from sqlalchemy.orm import object_session
 
 from backend.extensions import mapper_registry
 from backend.mini_core.domain.store import ShopStore
+from backend.mini_core.utils.geo import bounding_box, haversine
+from backend.mini_core.utils.redis_utils.search_changelog import SearchChangeLog
+from backend.mini_core.utils.redis_utils.store_geo import store_geo_index
 from kit.repository.sqla import SQLARepository
 from kit.util.sqla import id_column
 
@@ -53,6 +57,8 @@ shop_store_table = Table(
     Column('customer_notice', Text, comment='客户须知'),
     Column('create_time', DateTime, default=dt.datetime.now),
     Column('update_time', DateTime, default=dt.datetime.now, onupdate=dt.datetime.now),
+    # 附近商店按经纬度范围预筛选
+    Index('ix_shop_store_latitude_longitude', 'latitude', 'longitude'),
 )
 
 # 映射
@@ -72,41 +78,45 @@ class ShopStoreSQLARepository(SQLARepository):
     def range_query_params(self) -> Tuple:
         return 'service_fee_rate', 'delivery_price', 'min_order_amount'
 
-    def get_nearby_stores(self, latitude: float, longitude: float, distance: float = 5.0) -> List[Dict[str, Any]]:
+    def get_nearby_stores(self, latitude: float, longitude: float,
+                          distance: float = 5.0) -> List[Tuple[int, float, Optional[str]]]:
         """
         获取附近的商店
 
+        先按外接经纬度矩形走 (latitude, longitude) 索引筛选候选，再计算精确距离
+
         Args:
             latitude: 纬度
             longitude: 经度
             distance: 距离范围（公里）
 
         Returns:
-            List[Dict[str, Any]]: 附近商店列表
-        """
-        # 使用地理位置计算距离的SQL
-        # 这里使用了简化的计算方法，实际应用中可能需要更精确的地理位置计算
-        sql = """
-        SELECT *,
-            (6371 * acos(cos(radians(:lat)) * cos(radians(latitude))
-            * cos(radians(longitude) - radians(:lng))
-            + sin(radians(:lat)) * sin(radians(latitude)))) AS distance
-        FROM shop_store
-        WHERE status = '正常'
-        HAVING distance < :distance
-        ORDER BY distance
+            List: 按距离升序的 (商店 ID, 距离, 营业时间)
         """
-
-        result = self.session.execute(
-            sql,
-            {
-                'lat': latitude,
-                'lng': longitude,
-                'distance': distance
-            }
-        ).fetchall()
-
-        return [dict(row) for row in result]
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, distance)
+        query = self.session.query(
+            ShopStore.id, ShopStore.latitude, ShopStore.longitude, ShopStore.opening_hours
+        ).filter(
+            ShopStore.status == '正常',
+            ShopStore.latitude.between(min_lat, max_lat),
+        )
+        # 跨越 ±180 度经线时不按经度筛选
+        if min_lng >= -180 and max_lng <= 180:
+            query = query.filter(ShopStore.longitude.between(min_lng, max_lng))
+
+        stores = []
+        for row in query:
+            store_distance = haversine(latitude, longitude, float(row.latitude), float(row.longitude))
+            if store_distance <= distance:
+                stores.append((row.id, store_distance, row.opening_hours))
+        stores.sort(key=lambda store: store[1])
+        return stores
+
+    def geo_documents(self) -> list:
+        """地理位置索引需要的字段"""
+        return self.session.query(
+            ShopStore.id, ShopStore.latitude, ShopStore.longitude, ShopStore.status, ShopStore.opening_hours
+        ).all()
 
     def get_stores_by_category(self, category_id: int) -> List[ShopStore]:
         """
@@ -139,6 +149,16 @@ class ShopStoreSQLARepository(SQLARepository):
         )
         return query.filter(ShopStore.status == '正常').all()
 
+    def search_documents(self, ids: Optional[List[int]] = None) -> list:
+        """搜索索引需要的字段，不传 ids 时返回全部商店"""
+        query = self.session.query(
+            ShopStore.id, ShopStore.name, ShopStore.address, ShopStore.business_scope, ShopStore.description,
+            ShopStore.features, ShopStore.store_category, ShopStore.status,
+        )
+        if ids is not None:
+            query = query.filter(ShopStore.id.in_(ids))
+        return query.all()
+
     def get_store_stats(self) -> Dict[str, Any]:
         """
         获取商店统计信息
@@ -249,3 +269,38 @@ class ShopStoreSQLARepository(SQLARepository):
             stores_with_category.append(store_dict)
 
         return stores_with_category,total
+
+
+# 搜索索引使用的商店字段
+STORE_SEARCH_FIELDS = frozenset({'name', 'address', 'business_scope', 'description', 'features',
+                                 'store_category', 'status'})
+
+
+@event.listens_for(ShopStore, 'after_insert')
+@event.listens_for(ShopStore, 'after_delete')
+def store_record_search_change(mapper, connection, target: ShopStore):
+    SearchChangeLog.record_on_commit(object_session(target), [f"store:{target.id}"])
+
+
+@event.listens_for(ShopStore, 'after_update')
+def store_record_search_update(mapper, connection, target: ShopStore):
+    changed = {attr.key for attr in inspect(target).attrs if attr.history.has_changes()}
+    if changed & STORE_SEARCH_FIELDS:
+        SearchChangeLog.record_on_commit(object_session(target), [f"store:{target.id}"])
+
+
+@event.listens_for(ShopStore, 'after_insert')
+def store_sync_geo_insert(mapper, connection, target: ShopStore):
+    store_geo_index.sync_on_commit(object_session(target), target)
+
+
+@event.listens_for(ShopStore, 'after_update')
+def store_sync_geo_update(mapper, connection, target: ShopStore):
+    changed = {attr.key for attr in inspect(target).attrs if attr.history.has_changes()}
+    if changed & store_geo_index.FIELDS:
+        store_geo_index.sync_on_commit(object_session(target), target)
+
+
+@event.listens_for(ShopStore, 'after_delete')
+def store_sync_geo_delete(mapper, connection, target: ShopStore):
+    store_geo_index.sync_on_commit(object_session(target), target, deleted=True)
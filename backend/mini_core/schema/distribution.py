@@ -25,6 +25,8 @@ class DistributionQueryArgSchema(EntityIntSchema):
     # user_id = fields.Str(description='用户ID')
     grade_id = fields.Int(description='等级ID')
     status = fields.Int(description='状态', )
+    parent_id = fields.Str(description='展开的成员用户ID')
+    max_level = fields.Int(description='成员树只返回前N层', validate=validate.Range(min=1, max=10))
 
 
 # 分销配置查询参数 Schema
@@ -119,6 +121,7 @@ class DistributionIncomeSummarySchema(EntityIntSchema):
 
 class ReDistributionUserTeamSchema(EntityIntSchema):
     user_father_id = fields.Str(description='用户上级的UUID',required=True)
+    depth = fields.Int(description='团队层数，默认只查直属下级', validate=validate.Range(min=1, max=10))
 
 
 class WXDistributionWxDataSchema(ArgSchema):
@@ -90,3 +90,22 @@ class ReShopProductStockUpdateSchema(EntityIntSchema):
 
 class ProductCategoryBatchDeleteSchema(Schema):
     category_ids = webargs_fields.List(webargs_fields.Int(), required=True, description='要删除的分类ID列表')
+
+
+class ProductSearchArgSchema(Schema):
+    keyword = webargs_fields.Str(required=True, description='搜索关键词')
+    category_id = webargs_fields.Int(description='商品分类ID')
+    price_min = webargs_fields.Float(description='最低价格')
+    price_max = webargs_fields.Float(description='最高价格')
+    page = webargs_fields.Int(missing=1, description='页码')
+    size = webargs_fields.Int(missing=10, validate=validate.Range(min=1, max=100), description='每页个数')
+
+
+class ProductSuggestArgSchema(Schema):
+    keyword = webargs_fields.Str(required=True, description='商品名称前缀')
+    size = webargs_fields.Int(missing=10, validate=validate.Range(min=1, max=50), description='返回个数')
+
+
+class ReProductSuggestSchema(Schema):
+    data = webargs_fields.List(webargs_fields.Str(), description='商品名称')
+    code = webargs_fields.Int(description='状态')
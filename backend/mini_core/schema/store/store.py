@@ -35,7 +35,10 @@ class ShopStoreStatusUpdateArgSchema(Schema):
 class NearbyStoreQueryArgSchema(Schema):
     latitude = webargs_fields.Float(required=True, description='纬度')
     longitude = webargs_fields.Float(required=True, description='经度')
-    distance = webargs_fields.Float(description='距离范围（公里）',)
+    distance = webargs_fields.Float(missing=5.0, description='距离范围（公里）')
+    page = webargs_fields.Int(missing=1, description='页码')
+    size = webargs_fields.Int(description='每页数量，不传时返回全部')
+    open_now = webargs_fields.Bool(missing=False, description='只返回当前营业中的商店')
 
 
 # 服务模式切换参数 Schema
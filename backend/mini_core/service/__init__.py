@@ -11,7 +11,8 @@ from backend.mini_core.repository import (log_sqla_repo, distribution_sqla_repo,
                                           shop_order_return_sqla_repo, shop_order_return_detail_sqla_repo,
                                           shop_order_return_log_sqla_repo,banner_sqla_repo,shop_order_cart_sqla_repo,
                                           shop_order_logistics_sqla_repo,
-                                          shop_order_review_repo,member_level_config_sqla_repo,distribution_withdrawal_sqla_repo)
+                                          shop_order_review_repo,member_level_config_sqla_repo,distribution_withdrawal_sqla_repo,
+                                          order_stats_hourly_sqla_repo)
 from .card_server import CardService
 from .distribution_server import (DistributionService, DistributionConfigService,
                                   DistributionGradeService, DistributionGradeUpdateService,
@@ -33,6 +34,7 @@ from .order.order_review import OrderReviewService
 from .dashboard import DashboardService
 from .member_level_config_service import MemberLevelConfigService
 from .distribution_withdrawal import DistributionWithdrawalService
+from .search import SearchService
 # 个人卡牌
 card_service = CardService(log_sqla_repo)
 # 分销系统
@@ -47,6 +49,8 @@ distribution_withdrawal_service = DistributionWithdrawalService(distribution_wit
 
 shop_product_service = ShopProductService(shop_product_sqla_repo)
 shop_product_category_service = ShopProductCategoryService(shop_product_category_sqla_repo)
+# 商品、商店搜索
+search_service = SearchService(shop_product_sqla_repo, store_sqla_repo)
 
 # 门店管理
 shop_store_service = ShopStoreService(store_sqla_repo)
@@ -83,7 +87,8 @@ order_review_service = OrderReviewService(shop_order_review_repo)
 dashboard_service = DashboardService(order_service=shop_order_service,
     user_service=shop_user_service,
     product_service=shop_product_service,
-    return_service=order_return_service
+    return_service=order_return_service,
+    stats_repo=order_stats_hourly_sqla_repo
 )
 
 # 会员系列
@@ -2,48 +2,83 @@
 
 import datetime as dt
 from decimal import Decimal
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, case
 
 from backend.mini_core.domain.order.order import ShopOrder
 from backend.mini_core.domain.order.order_return import OrderReturn
 from backend.mini_core.domain.shop import ShopProduct
 from backend.mini_core.domain.t_user import ShopUser
+from backend.mini_core.repository.order.order_stats_sqla import OrderStatsHourlySQLARepository, truncate_hour, HOUR
+from backend.mini_core.utils.redis_utils.snapshot_cache import SnapshotCache
 from .order.order import ShopOrderService
 from .shop_user import ShopUserService
 from .shop_server import  ShopProductService
 from .order.order_return import OrderReturnService
 
 
+def _count_if(condition):
+    """条件计数，用于单次扫描统计多个指标"""
+    return func.sum(case((condition, 1), else_=0))
+
+
 class DashboardService:
-    """仪表盘数据服务"""
+    """
+    仪表盘数据服务
+
+    订单的按天指标读取小时汇总表 shop_order_stats_hourly，汇总尚未覆盖的部分
+    （通常只有当前这一小时）直接从订单表补齐；其余指标每张表一次条件聚合查询。
+    计算结果作为快照缓存在 Redis 中，由定时任务在后台刷新
+    """
+
+    # 每次刷新汇总时重算的最近小时数，覆盖下单后才支付、关闭等状态变化
+    REFRESH_LOOKBACK_HOURS = 48
+    # 首次回填时每批处理的小时数
+    BACKFILL_CHUNK_HOURS = 24 * 7
 
     def __init__(self,
                  order_service: ShopOrderService,
                  user_service: ShopUserService,
                  product_service: ShopProductService,
-                 return_service: OrderReturnService):
+                 return_service: OrderReturnService,
+                 stats_repo: OrderStatsHourlySQLARepository):
         self.order_service = order_service
         self.user_service = user_service
         self.product_service = product_service
         self.return_service = return_service
+        self.stats_repo = stats_repo
+        self.snapshot = SnapshotCache('dashboard', self.build_dashboard_data, 'DASHBOARD_CACHE_TTL')
 
     def get_dashboard_data(self) -> Dict[str, Any]:
-        """获取仪表盘所有数据"""
+        """获取仪表盘所有数据（快照缓存）"""
+        return {"data": self.snapshot.get(), "code": 200}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取统计快照缓存的命中情况"""
+        return {"data": SnapshotCache.get_stats(), "code": 200}
+
+    def build_dashboard_data(self) -> Dict[str, Any]:
+        """实时计算仪表盘所有数据"""
 
         # 获取当前时间
         now = dt.datetime.now()
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         yesterday_start = today_start - dt.timedelta(days=1)
+        month_start = today_start.replace(day=1)
+        trend_start = today_start - dt.timedelta(days=6)
+
+        # 汇总表 + 增量，覆盖本月和最近7天
+        daily = self._get_daily_order_stats(min(month_start, trend_start))
+        order_counts = self._get_order_counts(month_start)
 
         # 获取各项统计数据
-        core_metrics = self._get_core_metrics(today_start, yesterday_start)
-        pending_tasks = self._get_pending_tasks()
+        core_metrics = self._get_core_metrics(daily, today_start, yesterday_start)
+        pending_tasks = self._get_pending_tasks(order_counts)
         product_overview = self._get_product_overview()
-        user_overview = self._get_user_overview()
-        order_statistics = self._get_order_statistics(today_start)
-        trend_data = self._get_trend_data()
+        user_overview = self._get_user_overview(order_counts, today_start, month_start)
+        order_statistics = self._get_order_statistics(daily, today_start, month_start)
+        trend_data = self._get_trend_data(daily, trend_start)
         updated_at = now.isoformat()
 
         dashboard_data = {
@@ -56,42 +91,86 @@ class DashboardService:
             "updated_at": updated_at
         }
 
-        return {"data": dashboard_data, "code": 200}
+        return dashboard_data
+
+    def refresh_order_stats(self, lookback_hours: Optional[int] = None) -> int:
+        """
+        增量维护订单小时汇总表，只汇总已经结束的整点小时
+
+        汇总表为空时从最早的订单开始分批回填；之后每次从已汇总的最新小时继续，
+        并重算最近 lookback_hours 小时以反映支付、关闭等状态变化
+
+        Returns:
+            int: 写入的小时数
+        """
+        if lookback_hours is None:
+            lookback_hours = self.REFRESH_LOOKBACK_HOURS
+        end = truncate_hour(dt.datetime.now())
+        latest = self.stats_repo.latest_bucket()
+        if latest is None:
+            earliest = self.stats_repo.earliest_order_time()
+            if earliest is None:
+                return 0
+            start = truncate_hour(earliest)
+        else:
+            start = min(latest + HOUR, end - dt.timedelta(hours=lookback_hours))
+
+        written = 0
+        chunk = dt.timedelta(hours=self.BACKFILL_CHUNK_HOURS)
+        while start < end:
+            chunk_end = min(start + chunk, end)
+            written += self.stats_repo.refresh(start, chunk_end)
+            start = chunk_end
+        return written
+
+    def _get_daily_order_stats(self, start: dt.datetime) -> Dict[dt.date, Dict[str, Any]]:
+        """按天获取 start 之后的下单数、支付单数和销售额"""
+        daily, covered_until = self.stats_repo.daily_totals(start)
+        delta = self.stats_repo.aggregate_orders(max(covered_until or start, start))
+        for bucket_time, data in delta.items():
+            day = daily.setdefault(bucket_time.date(), {
+                'order_count': 0, 'paid_order_count': 0, 'paid_amount': Decimal('0')
+            })
+            for key, value in data.items():
+                day[key] += value
+        return daily
+
+    def _get_order_counts(self, month_start: dt.datetime) -> Dict[str, int]:
+        """
+        统计待支付、待发货订单数和本月活跃用户数
 
-    def _get_core_metrics(self, today_start: dt.datetime, yesterday_start: dt.datetime) -> Dict[str, Any]:
-        """获取核心指标数据"""
-        # 通过service的repo属性获取session
+        三个计数分别走 payment_status、delivery_status 和 (create_time, user_id) 索引，
+        合并成一个 OR 条件时无法使用索引，会全表扫描
+        """
         session = self.order_service.repo.session
+        pending_payment = session.query(func.count()).select_from(ShopOrder).filter(
+            ShopOrder.payment_status == '待支付'
+        ).scalar()
+        pending_shipment = session.query(func.count()).select_from(ShopOrder).filter(
+            ShopOrder.delivery_status == '待发货'
+        ).scalar()
+        active_users = session.query(func.count(func.distinct(ShopOrder.user_id))).filter(
+            ShopOrder.create_time >= month_start
+        ).scalar()
+        return {
+            "pending_payment": int(pending_payment or 0),
+            "pending_shipment": int(pending_shipment or 0),
+            "active_users": int(active_users or 0),
+        }
 
-        # 今日订单总数
-        today_orders = session.query(func.count(ShopOrder.id)).filter(
-            ShopOrder.create_time >= today_start
-        ).scalar() or 0
-
-        # 昨日订单总数
-        yesterday_orders = session.query(func.count(ShopOrder.id)).filter(
-            and_(
-                ShopOrder.create_time >= yesterday_start,
-                ShopOrder.create_time < today_start
-            )
-        ).scalar() or 0
+    def _get_core_metrics(self, daily: Dict[dt.date, Dict[str, Any]], today_start: dt.datetime,
+                          yesterday_start: dt.datetime) -> Dict[str, Any]:
+        """获取核心指标数据"""
+        today = daily.get(today_start.date(), {})
+        yesterday = daily.get(yesterday_start.date(), {})
 
-        # 今日销售额
-        today_sales = session.query(func.sum(ShopOrder.actual_amount)).filter(
-            and_(
-                ShopOrder.create_time >= today_start,
-                ShopOrder.payment_status == '已支付'
-            )
-        ).scalar() or Decimal('0')
+        # 今日/昨日订单总数
+        today_orders = today.get('order_count', 0)
+        yesterday_orders = yesterday.get('order_count', 0)
 
-        # 昨日销售额
-        yesterday_sales = session.query(func.sum(ShopOrder.actual_amount)).filter(
-            and_(
-                ShopOrder.create_time >= yesterday_start,
-                ShopOrder.create_time < today_start,
-                ShopOrder.payment_status == '已支付'
-            )
-        ).scalar() or Decimal('0')
+        # 今日/昨日销售额
+        today_sales = today.get('paid_amount', Decimal('0'))
+        yesterday_sales = yesterday.get('paid_amount', Decimal('0'))
 
         # 计算增长率
         order_growth = self._calculate_growth_rate(today_orders, yesterday_orders)
@@ -106,22 +185,11 @@ class DashboardService:
             "sales_growth_rate": sales_growth
         }
 
-    def _get_pending_tasks(self) -> Dict[str, Any]:
+    def _get_pending_tasks(self, order_counts: Dict[str, int]) -> Dict[str, Any]:
         """获取待处理事务数据"""
-        order_session = self.order_service.repo.session
         return_session = self.return_service.repo.session
         product_session = self.product_service.repo.session
 
-        # 待支付订单
-        pending_payment = order_session.query(func.count(ShopOrder.id)).filter(
-            ShopOrder.payment_status == '待支付'
-        ).scalar() or 0
-
-        # 待发货订单
-        pending_shipment = order_session.query(func.count(ShopOrder.id)).filter(
-            ShopOrder.delivery_status == '待发货'
-        ).scalar() or 0
-
         # 待处理退货
         pending_returns = return_session.query(func.count(OrderReturn.id)).filter(
             OrderReturn.status == 0  # 待审核
@@ -137,158 +205,89 @@ class DashboardService:
         ).scalar() or 0
 
         return {
-            "pending_payment": pending_payment,
-            "pending_shipment": pending_shipment,
+            "pending_payment": order_counts["pending_payment"],
+            "pending_shipment": order_counts["pending_shipment"],
             "pending_returns": pending_returns,
             "low_stock_products": low_stock_products
         }
 
     def _get_product_overview(self) -> Dict[str, Any]:
-        """获取商品总览数据"""
+        """获取商品总览数据，一次扫描商品表"""
         session = self.product_service.repo.session
-
-        # 商品总数
-        total_products = session.query(func.count(ShopProduct.id)).scalar() or 0
-
-        # 上架商品
-        online_products = session.query(func.count(ShopProduct.id)).filter(
-            ShopProduct.status == '上架'
-        ).scalar() or 0
-
-        # 下架商品
-        offline_products = session.query(func.count(ShopProduct.id)).filter(
-            ShopProduct.status == '下架'
-        ).scalar() or 0
-
-        # 售罄商品
-        out_of_stock = session.query(func.count(ShopProduct.id)).filter(
-            ShopProduct.stock == 0
-        ).scalar() or 0
-
-        # 库存预警商品
-        stock_warning = session.query(func.count(ShopProduct.id)).filter(
-            and_(
-                ShopProduct.stock <= ShopProduct.stock_alert,
-                ShopProduct.stock_alert.isnot(None),
-                ShopProduct.stock > 0
-            )
-        ).scalar() or 0
+        below_alert = and_(ShopProduct.stock_alert.isnot(None), ShopProduct.stock <= ShopProduct.stock_alert)
+
+        stats = session.query(
+            func.count(ShopProduct.id).label('total'),
+            _count_if(ShopProduct.status == '上架').label('online'),
+            _count_if(ShopProduct.status == '下架').label('offline'),
+            _count_if(ShopProduct.stock == 0).label('out_of_stock'),
+            _count_if(and_(below_alert, ShopProduct.stock > 0)).label('stock_warning'),
+        ).first()
 
         return {
-            "total": total_products,
-            "online": online_products,
-            "offline": offline_products,
-            "out_of_stock": out_of_stock,
-            "stock_warning": stock_warning
+            "total": int(stats.total or 0),
+            "online": int(stats.online or 0),
+            "offline": int(stats.offline or 0),
+            "out_of_stock": int(stats.out_of_stock or 0),
+            "stock_warning": int(stats.stock_warning or 0)
         }
 
-    def _get_user_overview(self) -> Dict[str, Any]:
-        """获取用户总览数据"""
-        user_session = self.user_service.repo.session
-        order_session = self.order_service.repo.session
-        now = dt.datetime.now()
-
-        # 用户总数
-        total_users = user_session.query(func.count(ShopUser.id)).scalar() or 0
-
-        # 今日新增用户
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_new_users = user_session.query(func.count(ShopUser.id)).filter(
-            ShopUser.register_time >= today_start
-        ).scalar() or 0
-
-        # 本月新增用户
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_new_users = user_session.query(func.count(ShopUser.id)).filter(
-            ShopUser.register_time >= month_start
-        ).scalar() or 0
+    def _get_user_overview(self, order_counts: Dict[str, int], today_start: dt.datetime,
+                           month_start: dt.datetime) -> Dict[str, Any]:
+        """获取用户总览数据，一次扫描用户表"""
+        session = self.user_service.repo.session
 
-        # 活跃用户（本月有订单的用户）
-        active_users = order_session.query(func.count(func.distinct(ShopOrder.user_id))).filter(
-            ShopOrder.create_time >= month_start
-        ).scalar() or 0
+        stats = session.query(
+            func.count(ShopUser.id).label('total'),
+            _count_if(ShopUser.register_time >= today_start).label('today_new'),
+            _count_if(ShopUser.register_time >= month_start).label('month_new'),
+        ).first()
 
         return {
-            "total": total_users,
-            "today_new": today_new_users,
-            "month_new": month_new_users,
-            "active": active_users
+            "total": int(stats.total or 0),
+            "today_new": int(stats.today_new or 0),
+            "month_new": int(stats.month_new or 0),
+            # 活跃用户（本月有订单的用户）
+            "active": order_counts["active_users"]
         }
 
-    def _get_order_statistics(self, today_start: dt.datetime) -> Dict[str, Any]:
+    def _get_order_statistics(self, daily: Dict[dt.date, Dict[str, Any]], today_start: dt.datetime,
+                              month_start: dt.datetime) -> Dict[str, Any]:
         """获取订单统计数据"""
-        session = self.order_service.repo.session
+        today = daily.get(today_start.date(), {})
+        today_amount = today.get('paid_amount', Decimal('0'))
+        today_count = today.get('paid_order_count', 0)
 
-        # 今日订单金额统计
-        today_amount_stats = session.query(
-            func.sum(ShopOrder.actual_amount).label('total_amount'),
-            func.avg(ShopOrder.actual_amount).label('avg_amount'),
-            func.count(ShopOrder.id).label('order_count')
-        ).filter(
-            and_(
-                ShopOrder.create_time >= today_start,
-                ShopOrder.payment_status == '已支付'
-            )
-        ).first()
-
-        # 本月订单金额统计
-        month_start = today_start.replace(day=1)
-        month_amount_stats = session.query(
-            func.sum(ShopOrder.actual_amount).label('total_amount'),
-            func.count(ShopOrder.id).label('order_count')
-        ).filter(
-            and_(
-                ShopOrder.create_time >= month_start,
-                ShopOrder.payment_status == '已支付'
-            )
-        ).first()
+        month_days = [data for day, data in daily.items() if day >= month_start.date()]
+        month_amount = sum((data['paid_amount'] for data in month_days), Decimal('0'))
+        month_count = sum(data['paid_order_count'] for data in month_days)
 
         return {
             "today": {
-                "total_amount": float(today_amount_stats.total_amount or 0),
-                "avg_amount": float(today_amount_stats.avg_amount or 0),
-                "order_count": today_amount_stats.order_count or 0
+                "total_amount": float(today_amount),
+                "avg_amount": float(today_amount / today_count) if today_count else 0.0,
+                "order_count": today_count
             },
             "month": {
-                "total_amount": float(month_amount_stats.total_amount or 0),
-                "order_count": month_amount_stats.order_count or 0
+                "total_amount": float(month_amount),
+                "order_count": month_count
             }
         }
 
-    def _get_trend_data(self) -> Dict[str, Any]:
+    def _get_trend_data(self, daily: Dict[dt.date, Dict[str, Any]], start_date: dt.datetime) -> Dict[str, Any]:
         """获取趋势数据（最近7天）"""
-        session = self.order_service.repo.session
-
-        # 获取最近7天的数据
-        end_date = dt.datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-        start_date = end_date - dt.timedelta(days=6)
-        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-
-        # 按天统计订单和销售额
-        daily_stats = session.query(
-            func.date(ShopOrder.create_time).label('date'),
-            func.count(ShopOrder.id).label('order_count'),
-            func.sum(ShopOrder.actual_amount).label('sales_amount')
-        ).filter(
-            and_(
-                ShopOrder.create_time >= start_date,
-                ShopOrder.create_time <= end_date,
-                ShopOrder.payment_status == '已支付'
-            )
-        ).group_by(func.date(ShopOrder.create_time)).all()
-
         # 构建7天的完整数据
         trend_data = []
         for i in range(7):
             current_date = (start_date + dt.timedelta(days=i)).date()
 
             # 查找当天的数据
-            day_data = next((stat for stat in daily_stats if stat.date == current_date), None)
+            day_data = daily.get(current_date)
 
             trend_data.append({
                 "date": current_date.strftime('%Y-%m-%d'),
-                "order_count": day_data.order_count if day_data else 0,
-                "sales_amount": float(day_data.sales_amount or 0) if day_data else 0
+                "order_count": day_data['paid_order_count'] if day_data else 0,
+                "sales_amount": float(day_data['paid_amount']) if day_data else 0
             })
 
         return {
@@ -108,96 +108,128 @@ class DistributionService(CRUDService[Distribution]):
 
         Args:
             args: 包含查询参数的字典
+                - user_id: 根用户ID
+                - parent_id: 展开的子树根节点（可选，需为 user_id 的下级）
+                - max_level: 只返回前 N 层（可选），前端展开节点时再以该节点为 parent_id 请求
+                - ser_name: 搜索名称（可选，搜索时返回完整路径，不按层级截断）
 
         Returns:
             包含树形结构数据的字典
         """
         # 获取数据
-        user_id = args['user_id']
+        user_id = str(args['user_id'])
+        root_id = str(args.get('parent_id') or user_id)
+        if root_id != user_id and not self._repo.is_descendant(user_id, root_id):
+            return dict(code=403, message='无权查看该成员的下级', data=None)
+
+        max_level = args.get('max_level')
+        if args.get('ser_name'):
+            max_level = None
+
+        # 从数据库获取层级数据，懒加载时多取一层用于判断边界节点是否还有下级
+        query_args = dict(args, user_id=root_id)
+        if max_level:
+            query_args['max_depth'] = max_level + 1
+        sql_data = self._repo.get_summary_tree(query_args)
+
+        tree_data, statistics = self._build_member_tree(sql_data, root_id, max_level)
+        return dict(
+            code=200,
+            data=tree_data,
+            statistics=statistics
+        )
 
-        # 从数据库获取层级数据
-        sql_data = self._repo.get_summary_tree(args)
+    @staticmethod
+    def _build_member_tree(sql_data, root_id: str, max_level: Optional[int] = None):
+        """
+        一次遍历建立 父级ID -> 子节点 索引并同时统计，再从根节点迭代组装树
 
-        # 转换为树状结构数据格式 (适合前端渲染)
-        def convert_to_tree_format(data, parent_id, current_level=1):
-            """
-            递归构建树形结构
+        Args:
+            sql_data: get_summary_tree 返回的成员列表
+            root_id: 根用户ID
+            max_level: 最多组装的层级，超出的节点只计入上级的 child_count
 
-            Args:
-                data: 所有用户数据列表
-                parent_id: 父级用户ID
-                current_level: 当前层级
+        Returns:
+            (树形结构数据, 统计信息)
+        """
+        children_index: Dict[str, list] = {}
+        seen = set()
+        total_members = 0
+        active_members = 0
+        level_stats = {}
 
-            Returns:
-                树形节点列表
-            """
-            tree_nodes = []
-            # 筛选出当前父级下的直接子级
-            children = [item for item in data if str(item['user_father_id']) == str(parent_id)]
+        for item in sql_data:
+            child_user_id = str(item['user_id'])
+            if child_user_id in seen or child_user_id == root_id:
+                continue
+            seen.add(child_user_id)
+
+            # 构建节点信息，整合分销信息和用户信息
+            node = {
+                'id': child_user_id,
+                'distribution_id': item.get('distribution_id'),
+                'name': item.get('real_name') or item.get('nickname') or item.get('username', '未知用户'),
+                'real_name': item.get('real_name'),
+                'nickname': item.get('nickname'),
+                'username': item.get('username'),
+                'mobile': item.get('mobile'),
+                'avatar': item.get('avatar'),
+                'remark': item.get('remark'),
+                'status': item.get('status'),
+                'user_status': item.get('user_status'),
+                'grade_id': item.get('grade_id'),
+                'identity': item.get('identity'),
+                'level': item.get('level', 1),
+                'sn': item.get('sn'),
+                'last_login_time': item.get('last_login_time'),
+                'audit_time': item.get('audit_time'),
+                'create_time': item.get('distribution_create_time'),
+                'isLeaf': True,
+                'child_count': 0,
+                'children': []
+            }
+            children_index.setdefault(str(item['user_father_id']), []).append(node)
 
-            for child in children:
-                child_user_id = str(child['user_id'])
-
-                # 构建节点信息，整合分销信息和用户信息
-                node = {
-                    'id': child_user_id,
-                    'distribution_id': child.get('distribution_id'),
-                    'name': child.get('real_name') or child.get('nickname') or child.get('username', '未知用户'),
-                    'real_name': child.get('real_name'),
-                    'nickname': child.get('nickname'),
-                    'username': child.get('username'),
-                    'mobile': child.get('mobile'),
-                    'avatar': child.get('avatar'),
-                    'remark': child.get('remark'),
-                    'status': child.get('status'),
-                    'user_status': child.get('user_status'),
-                    'grade_id': child.get('grade_id'),
-                    'identity': child.get('identity'),
-                    'level': current_level,
-                    'sn': child.get('sn'),
-                    'last_login_time': child.get('last_login_time'),
-                    'audit_time': child.get('audit_time'),
-                    'create_time': child.get('distribution_create_time'),
-                    'isLeaf': True,  # 默认为叶子节点，后续会更新
-                    'children': convert_to_tree_format(data, child_user_id, current_level + 1)
-                }
-
-                # 如果有子节点，则不是叶子节点
-                if node['children']:
-                    node['isLeaf'] = False
-
-                tree_nodes.append(node)
-
-            return tree_nodes
+            # 统计信息（懒加载时多取的一层不计入）
+            level = item.get('level', 1)
+            if max_level and level > max_level:
+                continue
+            total_members += 1
+            if item.get('status') == 1:
+                active_members += 1
+            level_stats[level] = level_stats.get(level, 0) + 1
 
         # 构建树结构数据
         tree_data = {
-            'id': str(user_id),
+            'id': root_id,
             'name': '分销成员',
             'level': 0,
             'isLeaf': False,
-            'children': convert_to_tree_format(sql_data, user_id)
+            'children': []
         }
 
-        # 统计信息
-        total_members = len(sql_data)
-        active_members = len([item for item in sql_data if item.get('status') == 1])
-
-        # 计算各层级数量
-        level_stats = {}
-        for item in sql_data:
-            level = item.get('level', 1)
-            level_stats[level] = level_stats.get(level, 0) + 1
-
-        return dict(
-            code=200,
-            data=tree_data,
-            statistics={
-                'total_members': total_members,
-                'active_members': active_members,
-                'level_stats': level_stats
-            }
-        )
+        # 从根节点迭代组装，避免深层递归
+        stack = [tree_data]
+        while stack:
+            parent = stack.pop()
+            children = children_index.get(parent['id'], [])
+            if parent['level'] > 0:
+                parent['child_count'] = len(children)
+                parent['isLeaf'] = not children
+            if max_level and parent['level'] >= max_level:
+                # 边界节点不返回下级，前端按 child_count 决定是否可展开
+                continue
+            for child in children:
+                child['level'] = parent['level'] + 1
+                parent['children'].append(child)
+                stack.append(child)
+
+        statistics = {
+            'total_members': total_members,
+            'active_members': active_members,
+            'level_stats': level_stats
+        }
+        return tree_data, statistics
 
     def get_by_user_id(self, user_id: str) -> Optional[Any]:
         return self._repo.find(user_id=user_id)
@@ -241,7 +273,14 @@ class DistributionService(CRUDService[Distribution]):
         return dict(config_data=config_data, grade_data=grade_data, distribution_user_data=distribution_user_data)
 
     def get_user_team_data(self, args):
-        data, total = self._repo.list(**args)
+        depth = args.pop('depth', None) or 1
+        if depth > 1:
+            # 多层团队通过闭包表一次范围查询
+            data, total, _ = self._repo.list_team(
+                args['user_father_id'], depth, args.get('page', 1), args.get('size', 10)
+            )
+        else:
+            data, total = self._repo.list(**args)
         re_team = []
         for item in data:
             real_name = item.real_name
@@ -1,9 +1,13 @@
 import json
+from dataclasses import asdict
 from typing import Dict, Any, List, Optional
 from decimal import Decimal
+from flask import current_app
 from flask_jwt_extended import get_current_user
 
+from kit.repository.sqla import Record
 from kit.service.base import CRUDService
+from kit.util.local_cache import LocalCache
 from backend.mini_core.domain.member_level import MemberLevelConfig
 from backend.mini_core.repository.shop.member_level_config import MemberLevelConfigSQLARepository
 
@@ -14,6 +18,8 @@ class MemberLevelConfigService(CRUDService[MemberLevelConfig]):
     def __init__(self, repo: MemberLevelConfigSQLARepository):
         super().__init__(repo)
         self._repo = repo
+        # 下单时按等级代码读取的等级配置，进程内缓存 MEMBER_LEVEL_CACHE_TTL 秒
+        self._level_cache = LocalCache(256)
 
     @property
     def repo(self) -> MemberLevelConfigSQLARepository:
@@ -58,6 +64,17 @@ class MemberLevelConfigService(CRUDService[MemberLevelConfig]):
     def find_level_data(self,args):
         return self._repo.find(**args)
 
+    def get_level_config(self, level_code: str) -> Optional[Record]:
+        """按等级代码读取等级配置，结果在进程内缓存，本进程修改等级配置时清空"""
+        config = self._level_cache.get(level_code)
+        if config is None:
+            level = self._repo.find(level_code=level_code)
+            if not level:
+                return None
+            config = Record(asdict(level))
+            self._level_cache.set(level_code, config, float(current_app.config.get('MEMBER_LEVEL_CACHE_TTL', 60)))
+        return config
+
 
     def create_level(self, level_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -95,6 +112,7 @@ class MemberLevelConfigService(CRUDService[MemberLevelConfig]):
 
         level = MemberLevelConfig(**level_data)
         result = self._repo.create(level)
+        self._level_cache.clear()
         return dict(data=result, code=200, message="等级配置创建成功")
 
     def update_level(self, level_id: int, level_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -135,6 +153,7 @@ class MemberLevelConfigService(CRUDService[MemberLevelConfig]):
 
         level = MemberLevelConfig(**level_data)
         result = self._repo.update(level_id, level)
+        self._level_cache.clear()
         return dict(data=result, code=200, message="等级配置更新成功")
 
     def delete_level(self, level_id: int) -> Dict[str, Any]:
@@ -155,6 +174,7 @@ class MemberLevelConfigService(CRUDService[MemberLevelConfig]):
         # 这里可以添加业务逻辑检查
 
         self._repo.delete(level_id)
+        self._level_cache.clear()
         return dict(code=200, message="等级配置删除成功")
 
 
@@ -1,4 +1,3 @@
-import uuid
 import datetime as dt
 from typing import Dict, Any, List, Optional
 from flask import current_app
@@ -7,6 +6,8 @@ from flask_jwt_extended import get_current_user
 from kit.service.base import CRUDService
 from backend.mini_core.domain.order.order import ShopOrder
 from backend.mini_core.repository.order.order_sqla import ShopOrderSQLARepository
+from backend.mini_core.utils.id_generator import id_generator
+from backend.mini_core.utils.redis_utils.stock_reservation import StockReservation
 
 __all__ = ['ShopOrderService']
 
@@ -43,7 +44,10 @@ class ShopOrderService(CRUDService[ShopOrder]):
         if not "ordering" in args:
             args['ordering'] = ['-update_time']
         data, total = self._repo.list(**args)
-        return dict(data=data, code=200, total=total)
+        result = dict(data=data, code=200, total=total)
+        if hasattr(data, 'next_cursor'):
+            result['next_cursor'] = data.next_cursor
+        return result
 
     def get_order_by_id(self, order_id: int) -> Dict[str, Any]:
         """通过ID获取订单"""
@@ -83,25 +87,26 @@ class ShopOrderService(CRUDService[ShopOrder]):
         import json
         from decimal import Decimal
         import datetime as dt
-        import uuid
         from backend.mini_core.repository import  shop_product_sqla_repo
-        from backend.mini_core.service import member_level_config_service
+        from backend.mini_core.service import member_level_config_service, shop_user_service
+        from backend.mini_core.utils.redis_utils.catalog_cache import catalog_cache
 
         # 生成订单编号和订单号
         now = dt.datetime.now()
-        order_no = f"ORD{now.strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4().int)[:6]}"
-        order_sn = f"SN{now.strftime('%Y%m%d')}{str(uuid.uuid4().int)[:8]}"
+        order_no = id_generator.next_no('ORD')
+        order_sn = id_generator.next_no('SN')
         final_amount = Decimal(order_data['final_amount'])
         points_used = order_data.get("points_used",0)
         points_deduct_amount = order_data.get("points_deduct_amount",0)
         # 解析用户信息
         user_detail = json.loads(order_data.get('userDetail', '{}'))
-        user = get_current_user()
+        # 当前用户可能来自认证缓存，积分和会员等级以数据库为准
+        user = shop_user_service.find(id=get_current_user().id)
         user_int_id = user.id
         user_id = str(user.user_id)
         user_points = user.points
         member_level = user.member_level
-        member_level_config = member_level_config_service.find_level_data({"level_code": member_level})
+        member_level_config = member_level_config_service.get_level_config(member_level)
         if not user_points:
             user_points = 0
         remaining_points = user_points - points_used
@@ -119,6 +124,13 @@ class ShopOrderService(CRUDService[ShopOrder]):
         if not goods_detail:
             return dict(data=None, code=400, message="商品信息不完整")
 
+        # 一次查询购物车中的全部商品，优先读取商品目录缓存
+        for item in goods_detail:
+            item['product_id'] = int(item.get('product_id') or 0)
+        product_ids = list(dict.fromkeys(item['product_id'] for item in goods_detail))
+        products = {product.id: product
+                    for product in catalog_cache.get_rows(product_ids, shop_product_sqla_repo.list_rows_by_ids)}
+
         # 验证购物车数据和商品信息
         cart_items = []
         product_amount = Decimal('0')
@@ -126,14 +138,13 @@ class ShopOrderService(CRUDService[ShopOrder]):
         bac_amount = 0
         product_name=""
         for item in goods_detail:
-            product_id = item.get('product_id')
+            product_id = item['product_id']
             cart_id = item.get('cart_id')
             number = item.get('number', 0)
             price = item.get('price')
 
-            # 1. 验证购物车项是否存在
-            product = shop_product_sqla_repo.find(**{'id': product_id})
-            # 2. 验证商品是否存在并检查价格
+            # 验证商品是否存在并检查价格
+            product = products.get(product_id)
             if not product:
                 return dict(data=None, code=400, message=f"商品不存在: {product_id}")
             # 验证价格是否一致（允许少量误差）
@@ -141,8 +152,8 @@ class ShopOrderService(CRUDService[ShopOrder]):
                 return dict(data=None, code=400, message=f"商品价格不一致: {product.name}")
             bac_amount += product.price * number
             product_name += " \n"+product.name
-            # 验证库存是否足够
-            if product.stock < number:
+            # 验证库存是否足够，下单时再以原子扣减为准
+            if (product.stock or 0) < number:
                 return dict(data=None, code=400, message=f"商品库存不足: {product.name}，当前库存: {product.stock}")
 
             # 收集商品信息
@@ -327,7 +338,8 @@ class ShopOrderService(CRUDService[ShopOrder]):
     def cancel_order(self, args: dict) -> Dict[str, Any]:
         """取消订单"""
         order_no = args['order_no']
-        order = self._repo.find(**{"order_no":order_no})
+        # 加锁读取，避免与超时关闭同时回补库存
+        order = self._repo.find_with_lock(order_no=order_no)
         if not order:
             return dict(data=None, code=404, message="订单不存在")
 
@@ -337,6 +349,7 @@ class ShopOrderService(CRUDService[ShopOrder]):
         order.status = '已取消'
         order.close_time = dt.datetime.now()
         order_id = order.id
+        self._repo.restore_stock([order_no])
         self.refund_order_points(order, order_no, "用户主动取消订单")
         self._repo.update(order_id, order)
         return dict(data=order, code=200)
@@ -369,6 +382,7 @@ class ShopOrderService(CRUDService[ShopOrder]):
         order.payment_time = dt.datetime.now()
         data = self.create_distribution_income(order)
         self.repo.session.commit()
+        StockReservation.confirm(order.order_no)
         print("data",data)
         return dict(data=order, code=200, message="订单已成功变更为已支付状态")
 
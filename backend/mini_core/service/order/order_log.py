@@ -58,6 +58,19 @@ class OrderLogService(CRUDService[OrderLog]):
 
     def create_log(self, log_data: Dict[str, Any]) -> Dict[str, Any]:
         """创建操作日志"""
+        log = OrderLog(**self._prepare_log_data(log_data))
+        result = self.create(log)
+        return dict(data=result, code=200)
+
+    def batch_create_logs(self, logs_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """批量创建操作日志（单条批量 INSERT）"""
+        log_objects = [OrderLog(**self._prepare_log_data(log_data)) for log_data in logs_data]
+
+        self._repo.bulk_create(log_objects)
+        return dict(code=200, message=f"成功创建{len(log_objects)}个操作日志")
+
+    def _prepare_log_data(self, log_data: Dict[str, Any]) -> Dict[str, Any]:
+        """补全操作时间、IP、更新人，并序列化修改前后值"""
         # 如果未提供操作时间，则使用当前时间
         if 'operation_time' not in log_data or not log_data['operation_time']:
             log_data['operation_time'] = dt.datetime.now()
@@ -77,40 +90,7 @@ class OrderLogService(CRUDService[OrderLog]):
 
         if 'new_value' in log_data and isinstance(log_data['new_value'], dict):
             log_data['new_value'] = json.dumps(log_data['new_value'])
-
-        log = OrderLog(**log_data)
-        result = self.create(log)
-        return dict(data=result, code=200)
-
-    def batch_create_logs(self, logs_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """批量创建操作日志"""
-        log_objects = []
-
-        for log_data in logs_data:
-            # 如果未提供操作时间，则使用当前时间
-            if 'operation_time' not in log_data or not log_data['operation_time']:
-                log_data['operation_time'] = dt.datetime.now()
-
-            # 如果未提供操作IP，尝试从请求中获取
-            if 'operation_ip' not in log_data or not log_data['operation_ip']:
-                log_data['operation_ip'] = self._get_client_ip()
-
-            # 如果未提供更新人，尝试从g对象中获取
-            if 'updater' not in log_data or not log_data['updater']:
-                if hasattr(g, 'creator'):
-                    log_data['updater'] = g.creator
-
-            # 将old_value和new_value转换为JSON字符串(如果是字典)
-            if 'old_value' in log_data and isinstance(log_data['old_value'], dict):
-                log_data['old_value'] = json.dumps(log_data['old_value'])
-
-            if 'new_value' in log_data and isinstance(log_data['new_value'], dict):
-                log_data['new_value'] = json.dumps(log_data['new_value'])
-
-            log_objects.append(OrderLog(**log_data))
-
-        self._repo.create_many(log_objects)
-        return dict(code=200, message=f"成功创建{len(log_objects)}个操作日志")
+        return log_data
 
     def _get_client_ip(self) -> str:
         """获取客户端IP地址"""
@@ -1,6 +1,6 @@
-import uuid
 import json
 import datetime as dt
+from dataclasses import fields
 from typing import Dict, Any, List, Optional
 from flask import request, g
 from flask_jwt_extended import get_current_user
@@ -13,6 +13,7 @@ from backend.mini_core.domain.order.order_return import OrderReturn, OrderReturn
 from backend.mini_core.repository.order.order_return_sql import OrderReturnSQLARepository, \
     OrderReturnDetailSQLARepository, OrderReturnLogSQLARepository
 from backend.mini_core.service.order.order_detail import OrderDetailService
+from backend.mini_core.utils.id_generator import id_generator
 
 __all__ = ['OrderReturnService', 'OrderReturnDetailService', 'OrderReturnLogService']
 
@@ -76,7 +77,10 @@ class OrderReturnService(CRUDService[OrderReturn]):
             args['return_amount'] = [args.pop('min_amount'), args.pop('max_amount')]
 
         data, total = self._repo.list(**args)
-        return dict(data=data, code=200, total=total)
+        result = dict(data=data, code=200, total=total)
+        if hasattr(data, 'next_cursor'):
+            result['next_cursor'] = data.next_cursor
+        return result
 
     def get_return_by_order_no(self, order_no: str) -> Dict[str, Any]:
         """通过ID获取退货单详情信息"""
@@ -161,7 +165,7 @@ class OrderReturnService(CRUDService[OrderReturn]):
 
         # 生成退货单号
         now = dt.datetime.now()
-        return_no = f"RT{now.strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4().int)[:6]}"
+        return_no = id_generator.next_no('RT')
 
         # 获取当前用户
         current_user = get_current_user()
@@ -593,3 +597,18 @@ class OrderReturnLogService(CRUDService[OrderReturnLog]):
             log_data['operation_time'] = dt.datetime.now()
         log = OrderReturnLog(**log_data)
         return self.create(log)
+
+    def batch_create_logs(self, logs_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量创建退货单操作日志（单条批量 INSERT）
+
+        队列中的日志可能带有表中不存在的字段（如 return_id、updater），这里会忽略
+        """
+        log_fields = {f.name for f in fields(OrderReturnLog) if f.init}
+        log_objects = []
+        for log_data in logs_data:
+            if not log_data.get('operation_time'):
+                log_data['operation_time'] = dt.datetime.now()
+            log_objects.append(OrderReturnLog(**{k: v for k, v in log_data.items() if k in log_fields}))
+        self._repo.bulk_create(log_objects)
+        return dict(code=200, message=f"成功创建{len(log_objects)}个退货操作日志")
@@ -0,0 +1,142 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from loguru import logger
+
+from backend.mini_core.repository.shop.shop_sqla import ShopProductSQLARepository
+from backend.mini_core.repository.store.store_sqla import ShopStoreSQLARepository
+from backend.mini_core.utils.redis_utils.catalog_cache import catalog_cache
+from backend.mini_core.utils.redis_utils.search_changelog import SearchChangeLog
+from backend.mini_core.utils.search_index import InvertedIndex
+
+__all__ = ['SearchService']
+
+# 字段权重
+PRODUCT_FIELD_WEIGHTS = {'name': 3.0, 'alias': 2.0, 'keywords': 2.0, 'features': 1.0}
+STORE_FIELD_WEIGHTS = {'name': 3.0, 'business_scope': 1.5, 'features': 1.0, 'description': 1.0, 'address': 1.0}
+
+
+class SearchService:
+    """
+    商品、商店搜索
+
+    索引在进程内首次检索时全量构建，之后检索前按 SearchChangeLog 增量同步，
+    同步间隔为 SEARCH_SYNC_INTERVAL 秒，不依赖外部搜索服务
+    """
+
+    def __init__(self, product_repo: ShopProductSQLARepository, store_repo: ShopStoreSQLARepository):
+        self._product_repo = product_repo
+        self._store_repo = store_repo
+        self._products: Optional[InvertedIndex] = None
+        self._stores: Optional[InvertedIndex] = None
+        self._seq = 0
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def search_products(self, args: dict) -> Dict[str, Any]:
+        """检索上架商品，支持分类和价格过滤"""
+        self._ensure_fresh()
+        category_id = args.get('category_id')
+        price_min = args.get('price_min')
+        price_max = args.get('price_max')
+
+        def predicate(meta: dict) -> bool:
+            if meta['status'] != '上架':
+                return False
+            if category_id and meta['category_id'] != category_id:
+                return False
+            if price_min is not None and (meta['price'] is None or meta['price'] < price_min):
+                return False
+            if price_max is not None and (meta['price'] is None or meta['price'] > price_max):
+                return False
+            return True
+
+        ids, total = self._products.search(args['keyword'], predicate, args.get('page') or 1, args.get('size') or 10)
+        data = catalog_cache.get_rows(ids, self._product_repo.list_rows_by_ids)
+        return dict(data=data, total=total, code=200)
+
+    def suggest_products(self, args: dict) -> Dict[str, Any]:
+        """按商品名称前缀补全"""
+        self._ensure_fresh()
+        data = self._products.suggest(args['keyword'], args.get('size') or 10,
+                                      lambda meta: meta['status'] == '上架')
+        return dict(data=data, code=200)
+
+    def search_stores(self, keyword: str, page: int = 1, size: Optional[int] = None) -> List[Any]:
+        """检索正常营业的商店，不传 size 时返回全部命中结果"""
+        self._ensure_fresh()
+        ids, total = self._stores.search(keyword, lambda meta: meta['status'] == '正常', page, size or len(self._stores))
+        stores = {store.id: store for store in self._store_repo.find_by_ids(ids)} if ids else {}
+        return [stores[store_id] for store_id in ids if store_id in stores]
+
+    def rebuild(self) -> Dict[str, int]:
+        """全量重建索引"""
+        seq = SearchChangeLog.current_seq()
+        products = InvertedIndex(PRODUCT_FIELD_WEIGHTS, suggest_field='name')
+        products.rebuild(self._product_document(row) for row in self._product_repo.search_documents())
+        stores = InvertedIndex(STORE_FIELD_WEIGHTS, suggest_field='name')
+        stores.rebuild(self._store_document(row) for row in self._store_repo.search_documents())
+        self._products, self._stores, self._seq = products, stores, seq
+        logger.info(f"搜索索引重建完成: 商品 {len(products)}, 商店 {len(stores)}")
+        return dict(products=len(products), stores=len(stores))
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        if self._products is not None and now < self._next_sync:
+            return
+        with self._lock:
+            if self._products is not None and now < self._next_sync:
+                return
+            try:
+                if self._products is None:
+                    self.rebuild()
+                else:
+                    self._sync()
+            except Exception as e:
+                # Redis 不可用时继续使用已有索引
+                if self._products is None:
+                    raise
+                logger.warning(f"同步搜索索引失败: {str(e)}")
+            self._next_sync = time.monotonic() + float(current_app.config.get('SEARCH_SYNC_INTERVAL', 1))
+
+    def _sync(self) -> None:
+        members, latest, complete = SearchChangeLog.changes_since(self._seq)
+        if not complete:
+            self.rebuild()
+            return
+        ids: Dict[str, List[int]] = {'product': [], 'store': []}
+        for member in members:
+            kind, _, doc_id = member.partition(':')
+            if kind in ids:
+                ids[kind].append(int(doc_id))
+
+        if ids['product']:
+            rows = {row.id: row for row in self._product_repo.search_documents(ids['product'])}
+            for product_id in ids['product']:
+                if product_id in rows:
+                    self._products.add(*self._product_document(rows[product_id]))
+                else:
+                    self._products.remove(product_id)
+        if ids['store']:
+            rows = {row.id: row for row in self._store_repo.search_documents(ids['store'])}
+            for store_id in ids['store']:
+                if store_id in rows:
+                    self._stores.add(*self._store_document(rows[store_id]))
+                else:
+                    self._stores.remove(store_id)
+        self._seq = latest
+
+    @staticmethod
+    def _product_document(row) -> tuple:
+        fields = {field: getattr(row, field) for field in PRODUCT_FIELD_WEIGHTS}
+        meta = dict(category_id=row.category_id, status=row.status,
+                    price=float(row.price) if row.price is not None else None)
+        return row.id, fields, meta
+
+    @staticmethod
+    def _store_document(row) -> tuple:
+        fields = {field: getattr(row, field) for field in STORE_FIELD_WEIGHTS}
+        meta = dict(store_category=row.store_category, status=row.status)
+        return row.id, fields, meta
@@ -3,8 +3,10 @@ import base64
 import json
 import logging
 import os
+import threading
 import time
 import uuid
+from functools import lru_cache
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from flask import current_app
@@ -14,6 +16,26 @@ from loguru import logger
 from kit.wechatpayv3 import WeChatPay, WeChatPayType
 
 
+# 参与构建客户端的配置项, 任一变化(含证书内容)都会重建客户端
+_CLIENT_CONFIG_KEYS = ('MCHID', 'PRIVATE_KEY', 'PUBLIC_KEY', 'CERT_SERIAL_NO', 'APIV3_KEY',
+                       'APPID', 'NOTIFY_URL', 'CERT_DIR', 'MULTIPLATFORM_PAY')
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _read_key_file(path, mtime):
+    """按 (路径, 修改时间) 缓存证书内容, 文件更新后自动重新读取"""
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
 # 配置获取方式改为从Flask current_app中获取
 def get_config():
     """从Flask应用配置中获取微信支付相关配置"""
@@ -38,33 +60,30 @@ def get_config():
     }
 
     # 读取私钥
-    try:
-        with open(config['PRIVATE_KEY_PATH'], 'r') as f:
-            config['PRIVATE_KEY'] = f.read()
-    except FileNotFoundError:
+    private_key_mtime = _file_mtime(config['PRIVATE_KEY_PATH'])
+    if private_key_mtime is None:
         current_app.logger.error(f"找不到私钥文件：{config['PRIVATE_KEY_PATH']}")
         config['PRIVATE_KEY'] = None
-    with open(config['PUBLIC_KEY_PATH'], 'r') as f:
-        config['PUBLIC_KEY'] = f.read()
+    else:
+        config['PRIVATE_KEY'] = _read_key_file(config['PRIVATE_KEY_PATH'], private_key_mtime)
+    config['PUBLIC_KEY'] = _read_key_file(config['PUBLIC_KEY_PATH'], _file_mtime(config['PUBLIC_KEY_PATH']))
 
     return config
 
 
-def init_wechat_pay():
-    """初始化微信支付客户端"""
-    config = get_config()
+def _get_wechatpay_logger():
+    """微信支付SDK日志, 只在首次使用时挂载文件处理器"""
+    wechatpay_logger = logging.getLogger("wechatpay")
+    if not wechatpay_logger.handlers:
+        handler = logging.FileHandler(os.path.join(os.getcwd(), 'wechatpay.log'), mode='a')
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(process)s - %(levelname)s: %(message)s'))
+        wechatpay_logger.addHandler(handler)
+        wechatpay_logger.setLevel(logging.DEBUG)
+    return wechatpay_logger
 
-    # 日志配置
-    logging.basicConfig(
-        filename=os.path.join(os.getcwd(), 'wechatpay.log'),
-        level=logging.DEBUG,
-        filemode='a',
-        format='%(asctime)s - %(process)s - %(levelname)s: %(message)s'
-    )
-    logger = logging.getLogger("wechatpay")
-    # 初始化微信支付客户端
-    print("config",config)
-    wxpay = WeChatPay(
+
+def _build_wechat_pay(config):
+    return WeChatPay(
         wechatpay_type=WeChatPayType.MINIPROG,  # 默认为JSAPI，可在调用时覆盖
         mchid=config['MCHID'],
         private_key=config['PRIVATE_KEY'],
@@ -75,12 +94,32 @@ def init_wechat_pay():
         cert_dir=config['CERT_DIR'],
         public_key=config["PUBLIC_KEY"],
         public_key_id = config["MULTIPLATFORM_PAY"],
-        logger=logger,
+        logger=_get_wechatpay_logger(),
         partner_mode=False,  # 直连商户模式
-        timeout=(10, 30)  # 连接超时和读取超时
+        timeout=(10, 30),  # 连接超时和读取超时
+        pool_maxsize=current_app.config.get('WECHAT_PAY_POOL_MAXSIZE', 20),
     )
 
-    return wxpay
+
+def init_wechat_pay():
+    """
+    获取微信支付客户端
+
+    客户端按应用缓存在 app.extensions 中, 每个 worker 只创建一次并复用其连接池,
+    配置或证书文件变化时自动重建
+    """
+    config = get_config()
+    fingerprint = tuple(config.get(key) for key in _CLIENT_CONFIG_KEYS)
+    state = current_app.extensions.setdefault('wechatpay', {})
+    if state.get('client') is not None and state.get('fingerprint') == fingerprint:
+        return state['client']
+
+    with _client_lock:
+        if state.get('client') is None or state.get('fingerprint') != fingerprint:
+            logger.info("初始化微信支付客户端")
+            state['client'] = _build_wechat_pay(config)
+            state['fingerprint'] = fingerprint
+        return state['client']
 
 
 class WechatPayService:
@@ -2,6 +2,8 @@ from typing import List, Dict, Any
 
 from backend.mini_core.domain.shop import ShopProduct, ShopProductCategory
 from backend.mini_core.repository.shop.shop_sqla import ShopProductSQLARepository, ShopProductCategorySQLARepository
+from backend.mini_core.utils.redis_utils.catalog_cache import catalog_cache
+from backend.mini_core.utils.redis_utils.search_changelog import SearchChangeLog
 from kit.service.base import CRUDService
 
 __all__ = ['ShopProductService', 'ShopProductCategoryService']
@@ -22,35 +24,50 @@ class ShopProductService(CRUDService[ShopProduct]):
         if product_id:
             data = self._repo.get(product_id)
             return dict(data=data, code=200)
-        data, total = self._repo.list(**args)
-        return dict(data=data, total=total, code=200)
+        if args.get('only_fields'):
+            data, total = self._repo.list(**args)
+            return dict(data=data, total=total, code=200)
+
+        args['defer_fields'] = self._repo.LIST_DEFER_FIELDS
+        data, total, next_cursor = catalog_cache.get_list(
+            dict(args, view='list'), lambda: self._repo.list(**args), self._repo.list_rows_by_ids
+        )
+        result = dict(data=data, total=total, code=200)
+        if next_cursor:
+            result['next_cursor'] = next_cursor
+        return result
 
     def list_by_category(self, category_id: int) -> Dict[str, Any]:
         """获取指定分类下的所有商品"""
-        data = self._repo.find(category_id=category_id)
+        data, _, _ = catalog_cache.get_list(
+            dict(view='category', category_id=category_id),
+            lambda: (self._repo.find_all(category_id=category_id, defer_fields=self._repo.LIST_DEFER_FIELDS), None),
+            self._repo.list_rows_by_ids,
+        )
         return dict(data=data, code=200)
 
     def get_recommended(self) -> Dict[str, Any]:
         """获取推荐商品"""
-        data = self._repo.find(is_recommended=True, status="上架")
+        data, _, _ = catalog_cache.get_list(
+            dict(view='recommended'),
+            lambda: (self._repo.find_all(is_recommended=True, status="上架",
+                                         defer_fields=self._repo.LIST_DEFER_FIELDS), None),
+            self._repo.list_rows_by_ids,
+        )
         return dict(data=data, code=200)
 
     def update_stock(self, product_id: int, quantity: int) -> Dict[str, Any]:
         """更新商品库存"""
-        product = self._repo.get(product_id)
-        if not product:
+        # 在数据库中原子地增减，并发调整不会互相覆盖；库存不小于0
+        result = self._repo.adjust_stock(product_id, quantity)
+        if not result:
             return dict(data=None, code=404, message="商品不存在")
 
-        # 确保库存不小于0
-        new_stock = max(0, product.stock + quantity)
-        product.stock = new_stock
-
         # 检查是否低于库存预警值
         stock_warning = False
-        if product.stock_alert and product.stock <= product.stock_alert:
+        if result.stock_alert and result.stock <= result.stock_alert:
             stock_warning = True
 
-        result = self._repo.update(product_id, product)
         return dict(data=result, stock_warning=stock_warning, code=200)
 
     def update_pro(self, product_id: int, product: Dict) -> Dict[str, Any]:
@@ -64,9 +81,16 @@ class ShopProductService(CRUDService[ShopProduct]):
         result = super().create(product)
         return dict(data=result, code=200)
 
+    def delete(self, entity_id: int) -> Dict[str, Any]:
+        result = super().delete(entity_id)
+        # 按 ID 批量删除不会触发实体事件，需要手动失效目录缓存和搜索索引
+        catalog_cache.invalidate([entity_id], lists=True)
+        SearchChangeLog.record([f"product:{entity_id}"])
+        return result
+
     def delete_pro(self, product_id: int) -> Dict[str, Any]:
         """删除商品"""
-        result = super().delete(product_id)
+        result = self.delete(product_id)
         return dict(data=result, code=200)
 
     def change_status(self, product_id: int, status: str) -> Dict[str, Any]:
@@ -119,8 +143,11 @@ class ShopProductCategoryService(CRUDService[ShopProductCategory]):
 
     def get_tree(self) -> Dict[str, Any]:
         """获取分类树结构"""
+        return dict(data=catalog_cache.get_category_tree(self._build_tree), code=200)
+
+    def _build_tree(self) -> List[Dict[str, Any]]:
         # 先获取所有分类
-        all_categories = self._repo.find()
+        all_categories = self._repo.find_all()
 
         # 构建树结构
         root_categories = []
@@ -145,7 +172,7 @@ class ShopProductCategoryService(CRUDService[ShopProductCategory]):
                 if category.parent_id in category_map:
                     category_map[category.parent_id]["children"].append(category_map[category.id])
 
-        return dict(data=root_categories, code=200)
+        return root_categories
 
     def update(self, category_id: int, category: ShopProductCategory) -> Dict[str, Any]:
         """更新分类信息"""
@@ -160,6 +187,7 @@ class ShopProductCategoryService(CRUDService[ShopProductCategory]):
     def delete(self, category_id: int) -> Dict[str, Any]:
         """删除分类"""
         result = super().delete(category_id)
+        catalog_cache.invalidate(tree=True)
         return dict(data=result, code=200)
 
     def delete_batch(self, category_ids: List[int]) -> Dict[str, Any]:
@@ -1,9 +1,8 @@
 import datetime as dt
-import random
-import time
-from typing import Optional, Dict, Any, Union, Type
+from typing import Optional, Dict, Any, List, Union, Type
 
 from flask import g
+from loguru import logger
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
@@ -15,6 +14,9 @@ from werkzeug.security import check_password_hash, generate_password_hash
 from backend.mini_core.domain.t_user import ShopUser, ShopUserAddress
 from backend.mini_core.message.shop_user import ShopUserMessage
 from backend.mini_core.repository.shop.shop_user_sqla import ShopUserSQLARepository, ShopUserAddressSQLARepository
+from backend.mini_core.utils.id_generator import id_generator
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
+from backend.mini_core.utils.redis_utils.invite_code_pool import invite_code_pool
 from kit.domain.entity import Entity, EntityInt
 from kit.exceptions import ServiceBadRequest
 from kit.service.base import CRUDService
@@ -24,62 +26,52 @@ __all__ = ['ShopUserService', 'ShopUserAddressService']
 
 def _generate_user_id() -> str:
     """生成商城用户编号"""
-    # 基于时间戳生成唯一编号 (格式: U + 时间戳 + 3位随机数)
-    timestamp = int(time.time())
-    random_num = random.randint(100, 999)
-    return f"U{timestamp}{random_num}"
-
-
-import random
-from typing import List, Optional
+    return id_generator.next_no('U')
 
 
 class InviteCodeGenerator:
-    """邀请码生成器"""
+    """邀请码生成器，从预先生成的邀请码池中分配"""
 
-    # 邀请码字符集 - 包含所有字符
-    CHARSET = 'ABCDEFGHJKMNPQRSTUVWXYZabcdefghjkmnpqrstuvwxyz23456789'
-    CODE_LENGTH = 6  # 邀请码长度
+    # 邀请码池不可用时的降级生成参数
     BATCH_SIZE = 10  # 批量生成数量
     MAX_RETRY = 10  # 最大重试次数
 
     @classmethod
     def generate_invite_code(cls, openid: str = None) -> Optional[str]:
         """
-        生成唯一邀请码（批量验证优化版）
+        分配唯一邀请码
+
+        正常从邀请码池取出，不查询数据库；Redis 不可用或池为空且尚未初始化时
+        降级为随机生成并批量查询数据库判重
 
         Args:
-            openid: 用户openid，用于增加随机性
+            openid: 用户openid，保留参数
 
         Returns:
-            str: 6位唯一邀请码，如果生成失败返回None
+            str: 5-7位唯一邀请码，如果生成失败返回None
         """
-        for attempt in range(cls.MAX_RETRY):
-            # 批量生成邀请码
-            batch_codes = cls._generate_batch_codes()
-
-            # 批量检查数据库中是否已存在
-            existing_codes = cls._check_codes_exist(batch_codes)
+        try:
+            invite_code = invite_code_pool.take(cls._schedule_refill)
+            if invite_code:
+                return invite_code
+        except Exception as e:
+            logger.warning(f"从邀请码池分配邀请码失败: {str(e)}")
 
-            # 找出不存在的邀请码
+        for attempt in range(cls.MAX_RETRY):
+            batch_codes = list({invite_code_pool.random_code() for _ in range(cls.BATCH_SIZE)})
+            existing_codes = set(cls._check_codes_exist(batch_codes))
             available_codes = [code for code in batch_codes if code not in existing_codes]
-
-            # 如果有可用的邀请码，返回第一个
             if available_codes:
+                invite_code_pool.record_assigned(available_codes[0])
                 return available_codes[0]
 
         return None
 
-    @classmethod
-    def _generate_batch_codes(cls) -> List[str]:
-        """批量生成邀请码（5-7位随机长度）"""
-        codes = []
-        for _ in range(cls.BATCH_SIZE):
-            # 随机生成5-7位长度
-            code_length = random.randint(5, 7)
-            invite_code = ''.join(random.choices(cls.CHARSET, k=code_length))
-            codes.append(invite_code)
-        return codes
+    @staticmethod
+    def _schedule_refill() -> None:
+        # 在方法内部导入，避免服务模块依赖 celery 任务模块
+        from task.invite_code import refill_invite_code_pool
+        refill_invite_code_pool.delay()
 
     @classmethod
     def _check_codes_exist(cls, invite_code_list: List[str]) -> List[str]:
@@ -101,7 +93,7 @@ class InviteCodeGenerator:
             existing_codes = shop_user_service.repo.find_by_invite_codes(invite_code_list)
             return existing_codes
         except Exception as e:
-            print(f"检查邀请码存在性时出错: {str(e)}")
+            logger.error(f"检查邀请码存在性时出错: {str(e)}")
             # 如果查询失败，为安全起见返回全部（表示都存在，需要重新生成）
             return invite_code_list
 
@@ -178,8 +170,10 @@ class ShopUserService(CRUDService[ShopUser]):
         if not user:
             raise ServiceBadRequest(ShopUserMessage.USER_NOT_EXIST)
 
-        # 调用父类方法执行删除
-        return super().delete(entity_id)
+        # 调用父类方法执行删除，批量删除不会触发实体事件，需要手动清除认证缓存
+        result = super().delete(entity_id)
+        auth_cache.invalidate([auth_cache.user_key(auth_cache.SHOP_USER, user.openid)])
+        return result
 
     def update_status(self, user_id: int, status: int) -> ShopUser:
         """更新商城用户状态"""
@@ -1,7 +1,13 @@
-from typing import Dict, Any
+from dataclasses import asdict
+from typing import Dict, Any, Optional
+
+from loguru import logger
 
 from backend.mini_core.domain.store import ShopStore
 from backend.mini_core.repository.store.store_sqla import ShopStoreSQLARepository
+from backend.mini_core.utils.geo import is_open
+from backend.mini_core.utils.redis_utils.search_changelog import SearchChangeLog
+from backend.mini_core.utils.redis_utils.store_geo import store_geo_index
 from kit.service.base import CRUDService
 
 __all__ = ['ShopStoreService']
@@ -38,13 +44,43 @@ class ShopStoreService(CRUDService[ShopStore]):
 
     def search(self, keyword: str) -> Dict[str, Any]:
         """搜索商店"""
-        data = self._repo.search_stores(keyword)
+        from backend.mini_core.service import search_service
+        data = search_service.search_stores(keyword)
         return dict(data=data, code=200)
 
-    def get_nearby(self, latitude: float, longitude: float, distance: float = 5.0) -> Dict[str, Any]:
-        """获取附近的商店"""
-        data = self._repo.get_nearby_stores(latitude, longitude, distance)
-        return dict(data=data, code=200)
+    def get_nearby(self, latitude: float, longitude: float, distance: float = 5.0, page: int = 1,
+                   size: Optional[int] = None, open_now: bool = False) -> Dict[str, Any]:
+        """
+        获取附近的商店，按距离升序
+
+        Args:
+            latitude: 纬度
+            longitude: 经度
+            distance: 距离范围（公里）
+            page: 页码
+            size: 每页数量，不传时返回全部
+            open_now: 是否只返回当前营业中的商店
+        """
+        try:
+            candidates = store_geo_index.nearby(latitude, longitude, distance, open_now, self._repo.geo_documents)
+        except Exception as e:
+            # Redis 不可用时按经纬度范围查询数据库
+            logger.warning(f"查询商店地理位置索引失败: {str(e)}")
+            candidates = self._repo.get_nearby_stores(latitude, longitude, distance)
+
+        if open_now:
+            candidates = [candidate for candidate in candidates if is_open(candidate[2])]
+        total = len(candidates)
+        if size:
+            start = (max(page, 1) - 1) * size
+            candidates = candidates[start:start + size]
+
+        stores = {store.id: store for store in self._repo.find_by_ids([c[0] for c in candidates])} if candidates else {}
+        data = []
+        for store_id, store_distance, _ in candidates:
+            if store_id in stores:
+                data.append(dict(asdict(stores[store_id]), distance=round(store_distance, 3)))
+        return dict(data=data, total=total, code=200)
 
     def get_stats(self) -> Dict[str, Any]:
         """获取商店统计信息"""
@@ -64,9 +100,14 @@ class ShopStoreService(CRUDService[ShopStore]):
     def delete_store(self, store_id: int) -> Dict[str, Any]:
         """删除商店"""
         result = super().delete(store_id)
+        # 按 ID 批量删除不会触发实体事件
+        SearchChangeLog.record([f"store:{store_id}"])
+        store_geo_index.remove([store_id])
         return dict(data=result, code=200)
     def store_batch_delete(self,ids):
         self._repo.batch_delete(ids)
+        SearchChangeLog.record([f"store:{store_id}" for store_id in ids])
+        store_geo_index.remove(ids)
         return dict(data={}, code=200)
 
     def update_status(self, store_id: int, status: str) -> Dict[str, Any]:
@@ -0,0 +1,62 @@
+# backend/mini_core/utils/geo.py
+
+import datetime as dt
+import math
+import re
+from typing import Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+# 每度纬度对应的公里数
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# 营业时间段，如 09:00-22:00、9:00~21:30
+_HOURS_PATTERN = re.compile(r'(\d{1,2})[:：](\d{2})\s*[-~～至到]\s*(\d{1,2})[:：](\d{2})')
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """两点间的球面距离（公里）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude: float, longitude: float, distance: float) -> Tuple[float, float, float, float]:
+    """
+    以某点为中心、distance 公里为半径的外接经纬度矩形
+
+    Returns:
+        Tuple: (最小纬度, 最大纬度, 最小经度, 最大经度)
+    """
+    d_lat = distance / KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    # 靠近极点时经度范围覆盖全部
+    d_lng = 180.0 if cos_lat < 1e-6 else min(distance / (KM_PER_DEGREE * cos_lat), 180.0)
+    return latitude - d_lat, latitude + d_lat, longitude - d_lng, longitude + d_lng
+
+
+def is_open(opening_hours: Optional[str], now: Optional[dt.datetime] = None) -> bool:
+    """
+    判断当前是否在营业时间内
+
+    支持多个时间段（如 09:00-14:00,17:00-22:00）和跨零点（如 18:00-02:00），
+    未设置或无法解析的营业时间视为全天营业
+    """
+    if not opening_hours:
+        return True
+    periods = _HOURS_PATTERN.findall(opening_hours)
+    if not periods:
+        return True
+    now = now or dt.datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start_h, start_m, end_h, end_m in periods:
+        start = int(start_h) * 60 + int(start_m)
+        end = int(end_h) * 60 + int(end_m)
+        if start == end:
+            return True
+        if start < end and start <= minute < end:
+            return True
+        if start > end and (minute >= start or minute < end):
+            return True
+    return False
@@ -0,0 +1,171 @@
+# backend/mini_core/utils/id_generator.py
+
+import atexit
+import datetime as dt
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Optional
+
+from loguru import logger
+
+# 2024-01-01 00:00:00 UTC，毫秒
+EPOCH_MS = 1704067200000
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# 仍由自己持有时续租
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 仍由自己持有时释放
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SnowflakeIdGenerator:
+    """
+    雪花算法编号生成器
+
+    编号由毫秒时间戳、机器号（0-1023）和毫秒内序号（0-4095）组成，单调递增、不需要访问数据库。
+    机器号从 Redis 租用（id_worker:{机器号}），使用期间每隔租期的三分之一续租，续租失败时重新租用；
+    fork 出的子进程会重新租用，不与父进程共用机器号。
+    时钟回拨时沿用上一次的时间戳继续递增，保证本进程生成的编号不重复且递增
+    """
+
+    LEASE_KEY_PREFIX = "id_worker:"
+    LEASE_SECONDS = 60
+
+    def __init__(self, worker_id: Optional[int] = None):
+        """
+        Args:
+            worker_id: 固定机器号，不传时从 Redis 租用
+        """
+        self._fixed_worker_id = worker_id
+        self._worker_id = worker_id
+        self._token = uuid.uuid4().hex
+        self._pid = os.getpid()
+        self._renewed_at = 0.0
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._renew = None
+        self._release = None
+        self._registered = False
+
+    @property
+    def worker_id(self) -> int:
+        with self._lock:
+            self._ensure_worker()
+            return self._worker_id
+
+    def next_id(self) -> int:
+        """生成 63 位整数编号"""
+        with self._lock:
+            self._ensure_worker()
+            timestamp, sequence = self._next()
+            return (timestamp << (WORKER_BITS + SEQUENCE_BITS)) | (self._worker_id << SEQUENCE_BITS) | sequence
+
+    def next_no(self, prefix: str = '') -> str:
+        """
+        生成业务编号：前缀 + 年月日时分秒毫秒 + 4 位机器号 + 4 位序号，如 ORD20250101120000123000100007
+
+        同一前缀的编号按字符串排序即按生成时间排序
+        """
+        with self._lock:
+            self._ensure_worker()
+            timestamp, sequence = self._next()
+            worker_id = self._worker_id
+        moment = dt.datetime.fromtimestamp((timestamp + EPOCH_MS) / 1000)
+        return f"{prefix}{moment.strftime('%Y%m%d%H%M%S')}{moment.microsecond // 1000:03d}{worker_id:04d}{sequence:04d}"
+
+    def _next(self):
+        now = int(time.time() * 1000) - EPOCH_MS
+        if now > self._last_ms:
+            self._last_ms = now
+            self._sequence = 0
+        else:
+            # 同一毫秒内或时钟回拨：沿用上一次的时间戳，序号用完时借用下一毫秒
+            self._sequence += 1
+            if self._sequence > MAX_SEQUENCE:
+                self._last_ms += 1
+                self._sequence = 0
+        return self._last_ms, self._sequence
+
+    def _ensure_worker(self) -> None:
+        if self._fixed_worker_id is not None:
+            return
+        if os.getpid() != self._pid:
+            # fork 后的子进程重新租用机器号，序号从头开始
+            self._pid = os.getpid()
+            self._token = uuid.uuid4().hex
+            self._worker_id = None
+            self._last_ms = -1
+        if self._worker_id is not None and time.monotonic() - self._renewed_at < self.LEASE_SECONDS / 3:
+            return
+        try:
+            if self._worker_id is None or not self._renew_lease():
+                self._acquire_lease()
+        except Exception as e:
+            # Redis 不可用时继续使用当前机器号（没有时临时使用随机机器号），间隔一段时间后再租用
+            self._renewed_at = time.monotonic()
+            if self._worker_id is None:
+                self._worker_id = random.randint(0, MAX_WORKER_ID)
+            logger.warning(f"租用编号机器号失败，暂时使用 {self._worker_id}: {str(e)}")
+
+    def _lease_key(self, worker_id: int) -> str:
+        return f"{self.LEASE_KEY_PREFIX}{worker_id}"
+
+    def _acquire_lease(self) -> None:
+        from backend.extensions import redis
+
+        start = random.randint(0, MAX_WORKER_ID)
+        for offset in range(MAX_WORKER_ID + 1):
+            worker_id = (start + offset) % (MAX_WORKER_ID + 1)
+            if redis.client.set(self._lease_key(worker_id), self._token, nx=True, ex=self.LEASE_SECONDS):
+                if not self._registered:
+                    atexit.register(self._release_lease)
+                    self._registered = True
+                self._worker_id = worker_id
+                self._renewed_at = time.monotonic()
+                logger.info(f"编号生成器租用机器号 {worker_id}")
+                return
+        raise RuntimeError("没有可用的编号机器号")
+
+    def _renew_lease(self) -> bool:
+        from backend.extensions import redis
+
+        if self._renew is None:
+            self._renew = redis.client.register_script(RENEW_LEASE_SCRIPT)
+        if self._renew(keys=[self._lease_key(self._worker_id)], args=[self._token, self.LEASE_SECONDS]):
+            self._renewed_at = time.monotonic()
+            return True
+        return False
+
+    def _release_lease(self) -> None:
+        """进程退出时释放租约；fork 出的子进程没有重新租用时不释放父进程的租约"""
+        from backend.extensions import redis
+
+        if os.getpid() != self._pid or self._worker_id is None:
+            return
+        try:
+            if self._release is None:
+                self._release = redis.client.register_script(RELEASE_LEASE_SCRIPT)
+            self._release(keys=[self._lease_key(self._worker_id)], args=[self._token])
+        except Exception:
+            pass
+
+
+id_generator = SnowflakeIdGenerator()
@@ -0,0 +1,195 @@
+# backend/mini_core/utils/redis_utils/auth_cache.py
+
+import json
+from typing import Any, Callable, Dict, Iterable, Optional, Type
+
+from flask import current_app
+from loguru import logger
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from backend.extensions import redis
+from kit.repository.sqla import _decode_value, _encode_value
+from kit.util.local_cache import LocalCache
+
+
+class AuthCache:
+    """
+    JWT 认证用户及角色数据范围的两级缓存
+
+    每个带 token 的请求都要按 openid / 用户 ID 加载用户，后台请求还要按角色编码
+    查询数据范围，这两个结果在 token 有效期内几乎不变：
+    - 进程内 LRU：容量 LOCAL_MAX_SIZE，有效期 AUTH_CACHE_LOCAL_TTL，无法跨进程失效，所以要短
+    - Redis：有效期 AUTH_CACHE_TTL，用户、角色、部门变更提交后删除对应的键
+
+    按 subject（微信用户 openid / 后台用户 ID）而不是 jti 缓存，同一用户的多个 token
+    共用一份数据，变更时只需删除一个键。
+    缓存中保存的是字段值，每次读取都重建一个游离（detached）的实体，请求内修改不会相互影响；
+    积分、余额等需要强一致的字段在写入前应重新从数据库读取
+    """
+
+    USER_KEY_PREFIX = "auth:user"
+    SCOPE_KEY_PREFIX = "auth:scope"
+    LOCAL_MAX_SIZE = 2048
+    # Session.info 中待提交后删除的缓存键
+    PENDING_KEY = "auth_cache_pending"
+
+    # 用户类型
+    SHOP_USER = "shop"
+    ADMIN_USER = "admin"
+
+    def __init__(self):
+        self._local = LocalCache(self.LOCAL_MAX_SIZE)
+
+    @property
+    def ttl(self) -> int:
+        return int(current_app.config.get('AUTH_CACHE_TTL', 60))
+
+    @property
+    def local_ttl(self) -> float:
+        return min(float(current_app.config.get('AUTH_CACHE_LOCAL_TTL', 5)), self.ttl)
+
+    def get_user(self, kind: str, subject: Any, model: Type, loader: Callable[[], Any]) -> Any:
+        """
+        获取 token 对应的用户
+
+        Args:
+            kind: 用户类型 SHOP_USER / ADMIN_USER
+            subject: openid 或用户 ID
+            model: 用户实体类
+            loader: 未命中时从数据库加载用户
+        """
+        if self.ttl <= 0 or not subject:
+            return loader()
+        key = self.user_key(kind, subject)
+        values = self._get(key)
+        if values is not None:
+            return self._build(model, values)
+
+        user = loader()
+        if user is not None:
+            self._set(key, self._dump(user))
+        return user
+
+    def get_role_scope(self, role_number: Optional[str], loader: Callable[[], Any]) -> Dict[str, Any]:
+        """
+        获取角色的数据范围
+
+        Returns:
+            Dict: {'areas', 'access_level', 'allowed_department_ids'}，角色不存在时为空字典
+        """
+        if self.ttl <= 0 or not role_number:
+            return self._role_scope(loader())
+        key = self.scope_key(role_number)
+        scope = self._get(key)
+        if scope is None:
+            scope = self._role_scope(loader())
+            self._set(key, scope)
+        return scope
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        keys = [key for key in set(keys) if key]
+        if not keys:
+            return
+        self._local.delete(*keys)
+        try:
+            redis.client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"删除认证缓存失败: {str(e)}")
+
+    def invalidate_scopes(self) -> None:
+        """删除所有角色数据范围缓存，部门变更时使用"""
+        prefix = f"{self.SCOPE_KEY_PREFIX}:"
+        self._local.delete_prefix(prefix)
+        try:
+            keys = list(redis.client.scan_iter(match=f"{prefix}*", count=500))
+            if keys:
+                redis.client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"删除角色数据范围缓存失败: {str(e)}")
+
+    def invalidate_on_commit(self, target: Any, keys: Iterable[str]) -> None:
+        """
+        在 target 所在事务提交后删除缓存键
+
+        在 flush 中直接删除的话，提交前到达的请求会把旧数据重新写入缓存；
+        事务回滚时不清除待删除的键，多删一次只会多一次回源
+        """
+        session = object_session(target)
+        if session is None:
+            self.invalidate(keys)
+            return
+        session.info.setdefault(self.PENDING_KEY, set()).update(key for key in keys if key)
+
+    @staticmethod
+    def attribute_values(target: Any, key: str) -> set:
+        """实体某个字段的当前值及本次 flush 前的旧值，字段被修改时新旧键都要失效"""
+        history = inspect(target).attrs[key].history
+        values = {getattr(target, key)}
+        values.update(history.deleted or ())
+        return {value for value in values if value}
+
+    def user_key(self, kind: str, subject: Any) -> str:
+        return f"{self.USER_KEY_PREFIX}:{kind}:{subject}"
+
+    def scope_key(self, role_number: str) -> str:
+        return f"{self.SCOPE_KEY_PREFIX}:{role_number}"
+
+    def _get(self, key: str) -> Optional[Any]:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = redis.client.get(key)
+        except Exception as e:
+            logger.warning(f"读取认证缓存失败: {str(e)}")
+            return None
+        if value is None:
+            return None
+        value = json.loads(value)
+        self._local.set(key, value, self.local_ttl)
+        return value
+
+    def _set(self, key: str, value: Any) -> None:
+        self._local.set(key, value, self.local_ttl)
+        try:
+            redis.client.set(key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"写入认证缓存失败: {str(e)}")
+
+    @staticmethod
+    def _dump(entity: Any) -> Dict[str, Any]:
+        return {
+            attr.key: _encode_value(getattr(entity, attr.key))
+            for attr in inspect(type(entity)).column_attrs
+        }
+
+    @staticmethod
+    def _build(model: Type, values: Dict[str, Any]) -> Any:
+        """按缓存的字段值重建实体，标记为游离状态，和查询后关闭会话得到的实体一致"""
+        entity = inspect(model).class_manager.new_instance()
+        for key, value in values.items():
+            setattr(entity, key, _decode_value(value))
+        make_transient_to_detached(entity)
+        return entity
+
+    @staticmethod
+    def _role_scope(role: Any) -> Dict[str, Any]:
+        if not role:
+            return {}
+        return {
+            'areas': list(role.areas or []),
+            'access_level': getattr(role.access_level, 'value', role.access_level),
+            'allowed_department_ids': list(role.allowed_department_ids or []),
+        }
+
+
+auth_cache = AuthCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def auth_cache_after_commit(session: Session):
+    keys = session.info.pop(AuthCache.PENDING_KEY, None)
+    if keys:
+        auth_cache.invalidate(keys)
+
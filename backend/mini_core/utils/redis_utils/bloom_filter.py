@@ -0,0 +1,83 @@
+# backend/mini_core/utils/redis_utils/bloom_filter.py
+
+import hashlib
+import math
+from typing import Iterable, List
+
+from backend.extensions import redis
+
+# 逐个检查元素的位，全部已置位视为已存在；否则置位并计数。
+# ARGV[1] 为每个元素的位数，之后依次是每个元素的位偏移
+ADD_SCRIPT = """
+local k = tonumber(ARGV[1])
+local added = {}
+for i = 0, (#ARGV - 1) / k - 1 do
+    local exists = 1
+    for j = 1, k do
+        if redis.call('GETBIT', KEYS[1], ARGV[1 + i * k + j]) == 0 then
+            exists = 0
+            break
+        end
+    end
+    if exists == 0 then
+        for j = 1, k do
+            redis.call('SETBIT', KEYS[1], ARGV[1 + i * k + j], 1)
+        end
+    end
+    added[#added + 1] = 1 - exists
+end
+return added
+"""
+
+
+class RedisBloomFilter:
+    """
+    基于 Redis 位图的布隆过滤器
+
+    按预计容量和误判率计算位数 m 与哈希数 k，元素的 k 个位由两个 64 位哈希组合得出。
+    位数和哈希数写在键名中，调整容量后使用新的位图，由调用方重新写入
+    """
+
+    def __init__(self, key_prefix: str, capacity: int, error_rate: float):
+        capacity = max(int(capacity), 1)
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.key = f"{key_prefix}:{self.size}:{self.hashes}"
+        self._add_script = None
+
+    def offsets(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add_new(self, items: List[str]) -> List[str]:
+        """原子地写入元素，返回之前不存在的元素"""
+        if not items:
+            return []
+        if self._add_script is None:
+            self._add_script = redis.client.register_script(ADD_SCRIPT)
+        args = [self.hashes]
+        for item in items:
+            args.extend(self.offsets(item))
+        added = self._add_script(keys=[self.key], args=args)
+        return [item for item, flag in zip(items, added) if int(flag)]
+
+    def add_many(self, items: Iterable[str], chunk_size: int = 1000) -> int:
+        """批量写入元素，不检查是否已存在"""
+        count = 0
+        pipe = redis.client.pipeline(transaction=False)
+        for item in items:
+            for offset in self.offsets(item):
+                pipe.setbit(self.key, offset, 1)
+            count += 1
+            if count % chunk_size == 0:
+                pipe.execute()
+        pipe.execute()
+        return count
+
+    def contains(self, item: str) -> bool:
+        pipe = redis.client.pipeline(transaction=False)
+        for offset in self.offsets(item):
+            pipe.getbit(self.key, offset)
+        return all(pipe.execute())
@@ -0,0 +1,233 @@
+# backend/mini_core/utils/redis_utils/catalog_cache.py
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import current_app
+from loguru import logger
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from backend.extensions import redis
+from kit.repository.sqla import Record, _decode_value, _encode_value
+from kit.util.local_cache import LocalCache
+
+
+class CatalogCache:
+    """
+    商品目录缓存
+
+    - 商品行 catalog:product:{id}：列表字段（不含详情、JSON 大字段），按商品单独失效，
+      库存变化只删除对应商品的行
+    - 列表 catalog:list:{version}:{查询摘要}：只保存商品 ID、总数和游标，读取时再批量取商品行。
+      上下架、分类、推荐等影响列表结果的变更递增 catalog:version，旧版本的列表键不再被读取，等待过期
+    - 分类树 catalog:category_tree：分类变更时删除
+
+    缓存在读取时写入，有效期 CATALOG_CACHE_TTL；CATALOG_LOCAL_CACHE_TTL 大于 0 时在 Redis 前增加进程内缓存，
+    热门商品和列表不需要访问 Redis，其他进程的变更最多延迟该时间可见
+    """
+
+    KEY_PREFIX = "catalog"
+    VERSION_KEY = "catalog:version"
+    TREE_KEY = "catalog:category_tree"
+    LOCAL_MAX_SIZE = 4096
+    # Session.info 中待提交后执行的失效操作
+    PENDING_KEY = "catalog_cache_pending"
+    # 只修改这些字段时不影响列表结果，只需要删除商品行
+    ROW_ONLY_FIELDS = frozenset({'stock', 'update_time', 'updater'})
+
+    def __init__(self):
+        self._local = LocalCache(self.LOCAL_MAX_SIZE)
+
+    @property
+    def ttl(self) -> int:
+        return int(current_app.config.get('CATALOG_CACHE_TTL', 300))
+
+    @property
+    def local_ttl(self) -> float:
+        return min(float(current_app.config.get('CATALOG_LOCAL_CACHE_TTL', 0)), self.ttl)
+
+    def product_key(self, product_id: int) -> str:
+        return f"{self.KEY_PREFIX}:product:{product_id}"
+
+    def list_key(self, version: int, query: Dict[str, Any]) -> str:
+        digest = hashlib.md5(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{self.KEY_PREFIX}:list:{version}:{digest}"
+
+    def get_list(self, query: Dict[str, Any], loader: Callable[[], Tuple[List[Any], Optional[int]]],
+                 row_loader: Callable[[List[int]], List[Any]]) -> Tuple[List[Record], Optional[int], Optional[str]]:
+        """
+        读取商品列表
+
+        Args:
+            query: 查询条件，作为缓存键的一部分
+            loader: 未命中时查询数据库，返回 (商品行, 总数)，商品行需包含 id
+            row_loader: 按 ID 批量查询缓存中缺失的商品行
+
+        Returns:
+            Tuple: (商品行, 总数, 下一页游标)
+        """
+        if self.ttl <= 0:
+            rows, total = loader()
+            return rows, total, getattr(rows, 'next_cursor', None)
+
+        key = self.list_key(self._version(), query)
+        page = self._get(key)
+        if page is not None:
+            rows = self.get_rows(page['ids'], row_loader)
+            # 列表缓存期间商品被删除时回源，保证总数与数据一致
+            if len(rows) == len(page['ids']):
+                return rows, page['total'], page['next_cursor']
+
+        rows, total = loader()
+        next_cursor = getattr(rows, 'next_cursor', None)
+        self._set_many({self.product_key(row.id): self._dump(row) for row in rows})
+        self._set(key, dict(ids=[row.id for row in rows], total=total, next_cursor=next_cursor))
+        return list(rows), total, next_cursor
+
+    def get_rows(self, ids: Sequence[int], row_loader: Callable[[List[int]], List[Any]]) -> List[Record]:
+        """按 ID 顺序读取商品行，依次查进程内缓存、Redis、数据库"""
+        found: Dict[int, Dict[str, Any]] = {}
+        missing = []
+        for product_id in ids:
+            values = self._local.get(self.product_key(product_id))
+            if values is not None:
+                found[product_id] = values
+            else:
+                missing.append(product_id)
+
+        if missing:
+            try:
+                cached = redis.client.mget([self.product_key(product_id) for product_id in missing])
+            except Exception as e:
+                logger.warning(f"读取商品缓存失败: {str(e)}")
+                cached = [None] * len(missing)
+            not_cached = []
+            for product_id, value in zip(missing, cached):
+                if value is None:
+                    not_cached.append(product_id)
+                    continue
+                found[product_id] = json.loads(value)
+                self._local.set(self.product_key(product_id), found[product_id], self.local_ttl)
+
+            if not_cached:
+                loaded = {self.product_key(row.id): self._dump(row) for row in row_loader(not_cached)}
+                self._set_many(loaded)
+                for product_id in not_cached:
+                    if (values := loaded.get(self.product_key(product_id))) is not None:
+                        found[product_id] = values
+
+        return [self._build(found[product_id]) for product_id in ids if product_id in found]
+
+    def get_category_tree(self, loader: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        if self.ttl <= 0:
+            return loader()
+        tree = self._get(self.TREE_KEY)
+        if tree is None:
+            tree = loader()
+            self._set(self.TREE_KEY, tree)
+        return tree
+
+    def invalidate(self, product_ids: Iterable[int] = (), lists: bool = False, tree: bool = False) -> None:
+        """
+        立即失效
+
+        Args:
+            product_ids: 需要删除的商品行
+            lists: 是否递增列表版本
+            tree: 是否删除分类树
+        """
+        keys = [self.product_key(product_id) for product_id in set(product_ids)]
+        if tree:
+            keys.append(self.TREE_KEY)
+        self._local.delete(*keys)
+        if lists:
+            self._local.delete(self.VERSION_KEY)
+            self._local.delete_prefix(f"{self.KEY_PREFIX}:list:")
+        try:
+            pipe = redis.client.pipeline(transaction=False)
+            if keys:
+                pipe.delete(*keys)
+            if lists:
+                pipe.incr(self.VERSION_KEY)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"删除商品目录缓存失败: {str(e)}")
+
+    def invalidate_on_commit(self, session: Session, product_ids: Iterable[int] = (), lists: bool = False,
+                             tree: bool = False) -> None:
+        """在 session 的事务提交后失效，避免提交前的并发读取把旧数据重新写入缓存"""
+        pending = session.info.setdefault(self.PENDING_KEY, dict(product_ids=set(), lists=False, tree=False))
+        pending['product_ids'].update(product_id for product_id in product_ids if product_id)
+        pending['lists'] = pending['lists'] or lists
+        pending['tree'] = pending['tree'] or tree
+
+    def _version(self) -> int:
+        version = self._local.get(self.VERSION_KEY)
+        if version is not None:
+            return version
+        try:
+            version = int(redis.client.get(self.VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"读取商品目录版本失败: {str(e)}")
+            return 0
+        self._local.set(self.VERSION_KEY, version, self.local_ttl)
+        return version
+
+    def _get(self, key: str) -> Optional[Any]:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        try:
+            value = redis.client.get(key)
+        except Exception as e:
+            logger.warning(f"读取商品目录缓存失败: {str(e)}")
+            return None
+        if value is None:
+            return None
+        value = json.loads(value)
+        self._local.set(key, value, self.local_ttl)
+        return value
+
+    def _set(self, key: str, value: Any) -> None:
+        self._set_many({key: value})
+
+    def _set_many(self, values: Dict[str, Any]) -> None:
+        if not values:
+            return
+        for key, value in values.items():
+            self._local.set(key, value, self.local_ttl)
+        try:
+            pipe = redis.client.pipeline(transaction=False)
+            for key, value in values.items():
+                pipe.set(key, json.dumps(value, ensure_ascii=False), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入商品目录缓存失败: {str(e)}")
+
+    @staticmethod
+    def _dump(row: Any) -> Dict[str, Any]:
+        if isinstance(row, dict):
+            items = row.items()
+        else:
+            items = ((attr.key, getattr(row, attr.key)) for attr in inspect(type(row)).column_attrs)
+        return {key: _encode_value(value) for key, value in items}
+
+    @staticmethod
+    def _build(values: Dict[str, Any]) -> Record:
+        return Record({key: _decode_value(value) for key, value in values.items()})
+
+    @classmethod
+    def changed_fields(cls, target: Any) -> set:
+        return {attr.key for attr in inspect(target).attrs if attr.history.has_changes()}
+
+
+catalog_cache = CatalogCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def catalog_cache_after_commit(session: Session):
+    pending = session.info.pop(CatalogCache.PENDING_KEY, None)
+    if pending:
+        catalog_cache.invalidate(**pending)
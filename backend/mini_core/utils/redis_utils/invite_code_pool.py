@@ -0,0 +1,167 @@
+# backend/mini_core/utils/redis_utils/invite_code_pool.py
+
+import random
+from typing import Callable, Iterable, Optional, Set
+
+from flask import current_app
+from loguru import logger
+
+from backend.extensions import redis
+from backend.mini_core.utils.redis_utils.bloom_filter import RedisBloomFilter
+
+
+class InviteCodePool:
+    """
+    邀请码池
+
+    预先生成的邀请码保存在 Redis 集合 invite_code:pool 中，注册时 SPOP 取出一个，不再查询数据库判重。
+    已分配和已入池的邀请码都写入布隆过滤器，生成新邀请码时只保留过滤器中不存在的，
+    误判只会丢弃个别候选码，不会产生重复。
+    池中数量低于低水位时触发后台任务补充；过滤器不存在时（首次使用、Redis 清空）由补充任务
+    从数据库全量重建后再生成
+    """
+
+    POOL_KEY = "invite_code:pool"
+    BLOOM_KEY_PREFIX = "invite_code:bloom"
+    # 已触发补充任务的标记，避免低水位期间每次注册都投递任务
+    REFILL_PENDING_KEY = "invite_code:refill_pending"
+    LOCK_NAME = "invite_code_bloom_rebuild"
+    # 邀请码字符集，去掉了易混淆的 0O1lIiLo
+    CHARSET = 'ABCDEFGHJKMNPQRSTUVWXYZabcdefghjkmnpqrstuvwxyz23456789'
+    MIN_LENGTH = 5
+    MAX_LENGTH = 7
+    # 每次写入布隆过滤器的候选码数量
+    FILL_BATCH = 500
+
+    def __init__(self):
+        self._bloom: Optional[RedisBloomFilter] = None
+        # 降级生成、尚未写入过滤器的邀请码
+        self._unrecorded: Set[str] = set()
+
+    @property
+    def bloom(self) -> RedisBloomFilter:
+        if self._bloom is None:
+            self._bloom = RedisBloomFilter(
+                self.BLOOM_KEY_PREFIX,
+                current_app.config.get('INVITE_CODE_BLOOM_CAPACITY', 1000000),
+                current_app.config.get('INVITE_CODE_BLOOM_ERROR_RATE', 0.001),
+            )
+        return self._bloom
+
+    @property
+    def ready_key(self) -> str:
+        return f"{self.bloom.key}:ready"
+
+    def take(self, schedule_refill: Callable[[], None]) -> Optional[str]:
+        """
+        取出一个邀请码
+
+        Args:
+            schedule_refill: 池中数量低于低水位时调用，投递补充任务
+
+        Returns:
+            Optional[str]: 邀请码，池为空且过滤器未就绪时返回 None
+        """
+        self._flush_unrecorded()
+        pipe = redis.client.pipeline(transaction=True)
+        pipe.spop(self.POOL_KEY)
+        pipe.scard(self.POOL_KEY)
+        code, remaining = pipe.execute()
+
+        low_watermark = current_app.config.get('INVITE_CODE_POOL_LOW_WATERMARK', 2000)
+        if remaining < low_watermark and redis.client.set(self.REFILL_PENDING_KEY, 1, nx=True, ex=60):
+            try:
+                schedule_refill()
+            except Exception as e:
+                redis.client.delete(self.REFILL_PENDING_KEY)
+                logger.warning(f"投递邀请码补充任务失败: {str(e)}")
+        if code:
+            return code
+
+        # 池已取空：过滤器就绪时直接生成一批，不等待后台任务
+        if not redis.client.exists(self.ready_key):
+            return None
+        self.fill(self.FILL_BATCH)
+        return redis.client.spop(self.POOL_KEY)
+
+    def refill(self, loader: Callable[[], Iterable[str]]) -> int:
+        """
+        把邀请码池补充到目标数量
+
+        Args:
+            loader: 过滤器不存在时遍历数据库中全部已分配的邀请码
+
+        Returns:
+            int: 新增的邀请码数量
+        """
+        try:
+            self.ensure_bloom(loader)
+            target = current_app.config.get('INVITE_CODE_POOL_SIZE', 10000)
+            added = 0
+            # 过滤器接近容量时误判增多，限制尝试次数，剩余部分由下一次补充完成
+            for _ in range(max(target // self.FILL_BATCH, 1) * 3):
+                missing = target - redis.client.scard(self.POOL_KEY)
+                if missing <= 0:
+                    break
+                added += self.fill(min(missing, self.FILL_BATCH))
+            return added
+        finally:
+            redis.client.delete(self.REFILL_PENDING_KEY)
+
+    def fill(self, count: int) -> int:
+        """生成 count 个候选码，过滤器中不存在的写入邀请码池"""
+        candidates = list({self.random_code() for _ in range(count)})
+        codes = self.bloom.add_new(candidates)
+        if codes:
+            redis.client.sadd(self.POOL_KEY, *codes)
+        return len(codes)
+
+    def record_assigned(self, code: str) -> None:
+        """
+        记录不经过邀请码池分配（降级生成）的邀请码：写入过滤器并从池中移除，之后不会再分配
+
+        Redis 不可用时先记在进程内，下次取邀请码时补写；写入失败时删除就绪标记，
+        下次补充从数据库全量重建过滤器
+        """
+        self._unrecorded.add(code)
+        self._flush_unrecorded()
+
+    def _flush_unrecorded(self) -> None:
+        if not self._unrecorded:
+            return
+        codes = list(self._unrecorded)
+        try:
+            self.bloom.add_many(codes)
+            redis.client.srem(self.POOL_KEY, *codes)
+            self._unrecorded.difference_update(codes)
+        except Exception as e:
+            logger.warning(f"邀请码写入布隆过滤器失败，标记重建: {codes}, {str(e)}")
+            try:
+                redis.client.delete(self.ready_key)
+                self._unrecorded.difference_update(codes)
+            except Exception:
+                pass
+
+    def ensure_bloom(self, loader: Callable[[], Iterable[str]]) -> None:
+        """过滤器不存在时从数据库和邀请码池全量重建，多个进程同时发现时只由一个进程重建"""
+        if redis.client.exists(self.ready_key):
+            return
+        identifier = redis.acquire_lock(self.LOCK_NAME, acquire_time=30, time_out=600)
+        if not identifier:
+            raise RuntimeError("等待邀请码过滤器重建超时")
+        try:
+            if redis.client.exists(self.ready_key):
+                return
+            redis.client.delete(self.bloom.key)
+            count = self.bloom.add_many(loader())
+            count += self.bloom.add_many(redis.client.sscan_iter(self.POOL_KEY, count=1000))
+            redis.client.set(self.ready_key, 1)
+            logger.info(f"邀请码布隆过滤器重建完成: {count} 个邀请码")
+        finally:
+            redis.release_lock(self.LOCK_NAME, identifier)
+
+    def random_code(self) -> str:
+        return ''.join(random.choices(self.CHARSET, k=random.randint(self.MIN_LENGTH, self.MAX_LENGTH)))
+
+
+invite_code_pool = InviteCodePool()
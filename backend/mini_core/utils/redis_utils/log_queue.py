@@ -2,17 +2,69 @@
 
 import json
 import datetime as dt
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from flask import request
 
 from backend.extensions import redis
 
+# 从队列尾部最多移动 ARGV[1] 条消息到处理中列表
+CLAIM_BATCH_SCRIPT = """
+local out = {}
+for i = 1, tonumber(ARGV[1]) do
+    local v = redis.call('RPOPLPUSH', KEYS[1], KEYS[2])
+    if not v then
+        break
+    end
+    out[#out + 1] = v
+end
+return out
+"""
+
+# 将处理中列表的消息全部放回队列尾部（下一个被消费），保持原有先后顺序
+RECLAIM_SCRIPT = """
+local n = 0
+while true do
+    local v = redis.call('LPOP', KEYS[1])
+    if not v then
+        break
+    end
+    redis.call('RPUSH', KEYS[2], v)
+    n = n + 1
+end
+return n
+"""
+
+# 从死信队列取出最多 ARGV[1] 条, 还原原始消息后重新入队
+REPLAY_SCRIPT = """
+local n = 0
+for i = 1, tonumber(ARGV[1]) do
+    local v = redis.call('RPOP', KEYS[1])
+    if not v then
+        break
+    end
+    local entry = cjson.decode(v)
+    redis.call('LPUSH', KEYS[2], entry['message'])
+    n = n + 1
+end
+return n
+"""
+
 
 class LogQueue:
     """用户操作日志队列处理类"""
 
     LOG_QUEUE_KEY = "user_operation_logs"
 
+    # 可靠队列模式：消费者先把消息移动到自己的处理中列表，批量写库成功后再确认删除
+    PROCESSING_KEY_SUFFIX = "processing"
+    CONSUMERS_KEY_SUFFIX = "consumers"
+    HEARTBEAT_KEY_SUFFIX = "heartbeat"
+    DEAD_LETTER_KEY_SUFFIX = "dead"
+    # 消费者心跳有效期（秒），超时未续期的消费者视为已崩溃，其消息会被回收
+    HEARTBEAT_SECONDS = 60
+
+    _scripts: Dict[str, Any] = {}
+
     @classmethod
     def push_log_dict(cls, log_dict: Dict[str, Any]) -> bool:
         """
@@ -41,6 +93,160 @@ class LogQueue:
             print(f"推送日志到队列失败: {str(e)}")
             return False
 
+    @classmethod
+    def push_log_dicts(cls, log_dicts: List[Dict[str, Any]]) -> bool:
+        """
+        批量推送日志字典到队列 (单次 LPUSH)
+
+        Args:
+            log_dicts: 日志字典列表, 每项包含 op_type 和 data 字段
+
+        Returns:
+            bool: 是否成功推送
+        """
+        prepared = []
+        for log_dict in log_dicts:
+            if 'op_type' not in log_dict or 'data' not in log_dict:
+                print("日志结构错误: 缺少 op_type 或 data 字段")
+                continue
+            prepared.append(cls._prepare_data_for_json(log_dict))
+        if not prepared:
+            return False
+
+        try:
+            redis.push_data_batch(cls.LOG_QUEUE_KEY, prepared)
+            return True
+        except Exception as e:
+            print(f"批量推送日志到队列失败: {str(e)}")
+            return False
+
+    @classmethod
+    def _script(cls, name: str, source: str):
+        if name not in cls._scripts:
+            cls._scripts[name] = redis.client.register_script(source)
+        return cls._scripts[name]
+
+    @classmethod
+    def processing_key(cls, consumer_id: str, queue_key: str = LOG_QUEUE_KEY) -> str:
+        return f"{queue_key}:{cls.PROCESSING_KEY_SUFFIX}:{consumer_id}"
+
+    @classmethod
+    def dead_letter_key(cls, queue_key: str = LOG_QUEUE_KEY) -> str:
+        return f"{queue_key}:{cls.DEAD_LETTER_KEY_SUFFIX}"
+
+    @classmethod
+    def _consumers_key(cls, queue_key: str) -> str:
+        return f"{queue_key}:{cls.CONSUMERS_KEY_SUFFIX}"
+
+    @classmethod
+    def _heartbeat_key(cls, consumer_id: str, queue_key: str) -> str:
+        return f"{queue_key}:{cls.HEARTBEAT_KEY_SUFFIX}:{consumer_id}"
+
+    @classmethod
+    def heartbeat(cls, consumer_id: str, queue_key: str = LOG_QUEUE_KEY) -> None:
+        """登记消费者并续期心跳"""
+        pipe = redis.client.pipeline(transaction=False)
+        pipe.sadd(cls._consumers_key(queue_key), consumer_id)
+        pipe.setex(cls._heartbeat_key(consumer_id, queue_key), cls.HEARTBEAT_SECONDS, 1)
+        pipe.execute()
+
+    @classmethod
+    def clear_heartbeat(cls, consumer_id: str, queue_key: str = LOG_QUEUE_KEY) -> None:
+        """删除消费者心跳，之后 reclaim_stale 会回收其处理中消息"""
+        redis.client.delete(cls._heartbeat_key(consumer_id, queue_key))
+
+    @classmethod
+    def claim_batch(cls, consumer_id: str, max_count: int, timeout: int = 0,
+                    queue_key: str = LOG_QUEUE_KEY) -> List[str]:
+        """
+        将消息移动到消费者的处理中列表并返回
+
+        Args:
+            consumer_id: 消费者ID
+            max_count: 最多领取条数
+            timeout: 大于0时，队列为空则用 BRPOPLPUSH 阻塞等待第一条消息（秒）
+            queue_key: 队列键名
+
+        Returns:
+            List[str]: 按入队先后排序的原始消息
+        """
+        if max_count <= 0:
+            return []
+        processing_key = cls.processing_key(consumer_id, queue_key)
+        messages = []
+        if timeout > 0:
+            first = redis.blocking_client.brpoplpush(queue_key, processing_key, timeout)
+            if first is None:
+                return []
+            messages.append(first)
+        messages.extend(cls._script('claim', CLAIM_BATCH_SCRIPT)(
+            keys=[queue_key, processing_key], args=[max_count - len(messages)]
+        ))
+        return messages
+
+    @classmethod
+    def ack(cls, consumer_id: str, dead_letters: Optional[List[Dict[str, Any]]] = None,
+            queue_key: str = LOG_QUEUE_KEY, keep: Optional[List[str]] = None) -> None:
+        """
+        确认处理中列表的消息，无法处理的消息转入死信队列
+
+        Args:
+            consumer_id: 消费者ID
+            dead_letters: [{'message': 原始消息, 'error': 错误信息}, ...]
+            queue_key: 队列键名
+            keep: 暂时无法写入（如数据库不可用）、稍后重试的消息，留在处理中列表
+        """
+        pipe = redis.client.pipeline(transaction=True)
+        if dead_letters:
+            failed_at = dt.datetime.now().isoformat()
+            pipe.lpush(cls.dead_letter_key(queue_key), *[
+                json.dumps(dict(entry, failed_at=failed_at), ensure_ascii=False)
+                for entry in dead_letters
+            ])
+        pipe.delete(cls.processing_key(consumer_id, queue_key))
+        if keep:
+            pipe.lpush(cls.processing_key(consumer_id, queue_key), *keep)
+        pipe.execute()
+
+    @classmethod
+    def reclaim_stale(cls, exclude: Optional[str] = None, queue_key: str = LOG_QUEUE_KEY) -> int:
+        """
+        回收心跳已过期的消费者的处理中消息，放回队列重新消费
+
+        Args:
+            exclude: 不回收的消费者ID（通常为当前消费者）
+            queue_key: 队列键名
+
+        Returns:
+            int: 回收的消息数
+        """
+        reclaimed = 0
+        consumers_key = cls._consumers_key(queue_key)
+        for consumer_id in redis.client.smembers(consumers_key):
+            if consumer_id == exclude or redis.client.exists(cls._heartbeat_key(consumer_id, queue_key)):
+                continue
+            reclaimed += cls._script('reclaim', RECLAIM_SCRIPT)(
+                keys=[cls.processing_key(consumer_id, queue_key), queue_key]
+            )
+            redis.client.srem(consumers_key, consumer_id)
+        return reclaimed
+
+    @classmethod
+    def replay_dead_letters(cls, limit: int = 1000, queue_key: str = LOG_QUEUE_KEY) -> int:
+        """
+        将死信队列中的消息重新放回日志队列
+
+        Args:
+            limit: 最多重放条数
+            queue_key: 队列键名
+
+        Returns:
+            int: 重放的消息数
+        """
+        return cls._script('replay', REPLAY_SCRIPT)(
+            keys=[cls.dead_letter_key(queue_key), queue_key], args=[limit]
+        )
+
     @classmethod
     def add_order_log(cls,
                       order_no: str,
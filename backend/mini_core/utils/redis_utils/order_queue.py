@@ -1,24 +1,69 @@
 import json
 import time
-from typing import Dict, List, Optional, Any
+import zlib
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
+from flask import current_app
+from loguru import logger
+
 from backend.extensions import redis
 
+# 原子地取出一批已到期的订单: ZRANGEBYSCORE + ZREM + SREM 在一个脚本中完成,
+# 多个清理进程并发执行时同一订单只会被其中一个领取
+CLAIM_EXPIRED_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+if #members == 0 then
+    return members
+end
+local order_nos = {}
+for i = 1, #members, 2 do
+    order_nos[#order_nos + 1] = members[i]
+end
+redis.call('ZREM', KEYS[1], unpack(order_nos))
+redis.call('SREM', KEYS[2], unpack(order_nos))
+return members
+"""
+
 
 class RedisOrderQueue:
     """
     基于Redis的待支付订单队列管理
     """
 
+    # 过期清理每批领取的订单数
+    CLEANUP_CHUNK_SIZE = 500
+
+    _claim_script = None
+
     # Redis键前缀
     PENDING_ORDERS_KEY = "pending_orders"
     ORDER_DATA_KEY_PREFIX = "order_data:"
     ORDER_EXPIRY_INDEX = "order_expiry_index"
+    # 过期索引有新订单写入时的唤醒信号，供过期处理 worker 阻塞等待
+    ORDER_EXPIRY_WAKEUP = "order_expiry_wakeup"
 
     # 默认过期时间（30分钟）
     DEFAULT_EXPIRY_SECONDS = 30 * 60
 
+    @classmethod
+    def shard_count(cls) -> int:
+        """过期索引分片数（ORDER_EXPIRY_SHARDS），只应增加不应减少"""
+        return max(int(current_app.config.get('ORDER_EXPIRY_SHARDS', 1)), 1)
+
+    @classmethod
+    def shard_of(cls, order_no: str) -> int:
+        return zlib.crc32(order_no.encode()) % cls.shard_count()
+
+    @classmethod
+    def expiry_index_key(cls, shard: int = 0) -> str:
+        # 0 号分片沿用原有 key，保证从单分片扩容时已有数据不丢失
+        return cls.ORDER_EXPIRY_INDEX if shard == 0 else f"{cls.ORDER_EXPIRY_INDEX}:{shard}"
+
+    @classmethod
+    def wakeup_key(cls, shard: int = 0) -> str:
+        return cls.ORDER_EXPIRY_WAKEUP if shard == 0 else f"{cls.ORDER_EXPIRY_WAKEUP}:{shard}"
+
     @classmethod
     def add_pending_order(cls, order_no: str, order_data: Dict[str, Any],
                           expire_seconds: int = DEFAULT_EXPIRY_SECONDS) -> bool:
@@ -40,10 +85,6 @@ class RedisOrderQueue:
         返回:
             bool: 是否添加成功
         """
-        from backend.extensions import redis
-        import json
-        import time
-
         try:
             # 验证必要的订单字段
             required_fields = [ 'user_id', 'actual_amount', 'product_amount',
@@ -54,6 +95,9 @@ class RedisOrderQueue:
                     print(f"订单数据缺少必要字段: {field}")
                     return False
 
+            # 计算过期时间戳
+            expiry_time = int(time.time()) + expire_seconds
+
             # 确保只存储必要的数据（减少Redis空间使用）
             order_storage_data = {
                 'user_id': order_data['user_id'],
@@ -64,23 +108,21 @@ class RedisOrderQueue:
                 'status': order_data['status'],
                 'payment_status': order_data['payment_status'],
                 'create_time': order_data.get('create_time', int(time.time())),
-                'expire_time': int(time.time()) + expire_seconds
+                'expire_time': expiry_time
             }
 
-            # 计算过期时间戳
-            expiry_time = int(time.time()) + expire_seconds
-
-            # 存储订单数据（带过期时间）
             order_data_key = f"{cls.ORDER_DATA_KEY_PREFIX}{order_no}"
-
-            # 使用 RedisHook 的 set_key_with_expiration 方法替代 setex
-            redis.set_key_with_expiration(order_data_key, json.dumps(order_storage_data), expire_seconds)
-
-            # 添加到待支付订单集合
-            redis.client.sadd(cls.PENDING_ORDERS_KEY, order_no)
-
-            # 添加到过期时间有序集合（用于快速查找即将过期的订单）
-            redis.client.zadd(cls.ORDER_EXPIRY_INDEX, {order_no: expiry_time})
+            shard = cls.shard_of(order_no)
+
+            # 订单数据、待支付集合、过期索引在一个 MULTI/EXEC 中写入, 一次往返且原子
+            pipe = redis.client.pipeline(transaction=True)
+            pipe.setex(order_data_key, expire_seconds, json.dumps(order_storage_data, default=str))
+            pipe.sadd(cls.PENDING_ORDERS_KEY, order_no)
+            pipe.zadd(cls.expiry_index_key(shard), {order_no: expiry_time})
+            # 唤醒信号只保留一个元素，避免无人消费时无限增长
+            pipe.lpush(cls.wakeup_key(shard), 1)
+            pipe.ltrim(cls.wakeup_key(shard), 0, 0)
+            pipe.execute()
 
             return True
         except Exception as e:
@@ -98,18 +140,15 @@ class RedisOrderQueue:
         返回:
             bool: 是否移除成功
         """
-        from backend.extensions import redis
-
         try:
+            pipe = redis.client.pipeline(transaction=True)
             # 从待支付订单集合中移除
-            redis.client.srem(cls.PENDING_ORDERS_KEY, order_no)
-
+            pipe.srem(cls.PENDING_ORDERS_KEY, order_no)
             # 从过期时间索引中移除
-            redis.client.zrem(cls.ORDER_EXPIRY_INDEX, order_no)
-
+            pipe.zrem(cls.expiry_index_key(cls.shard_of(order_no)), order_no)
             # 删除订单数据
-            order_data_key = f"{cls.ORDER_DATA_KEY_PREFIX}{order_no}"
-            redis.client.delete(order_data_key)
+            pipe.delete(f"{cls.ORDER_DATA_KEY_PREFIX}{order_no}")
+            pipe.execute()
 
             return True
         except Exception as e:
@@ -161,11 +200,13 @@ class RedisOrderQueue:
             max_time = current_time + within_seconds
 
             # 获取即将过期的订单
-            expiring_orders = redis.client.zrangebyscore(
-                cls.ORDER_EXPIRY_INDEX,
-                current_time,
-                max_time
-            )
+            expiring_orders = []
+            for shard in range(cls.shard_count()):
+                expiring_orders.extend(redis.client.zrangebyscore(
+                    cls.expiry_index_key(shard),
+                    current_time,
+                    max_time
+                ))
 
             # RedisHook 已设置 decode_responses=True，所以不需要再解码
             return expiring_orders
@@ -182,7 +223,7 @@ class RedisOrderQueue:
             List[str]: 所有待支付订单号列表
         """
         try:
-            pending_orders = redis.smembers(cls.PENDING_ORDERS_KEY)
+            pending_orders = redis.client.smembers(cls.PENDING_ORDERS_KEY)
 
             # 如果返回的是字节类型，转换为字符串
             return [order.decode() if isinstance(order, bytes) else order
@@ -192,73 +233,132 @@ class RedisOrderQueue:
             return []
 
     @classmethod
-    def cleanup_expired_orders(cls) -> int:
+    def _get_claim_script(cls):
+        if cls._claim_script is None:
+            cls._claim_script = redis.client.register_script(CLAIM_EXPIRED_SCRIPT)
+        return cls._claim_script
+
+    @classmethod
+    def next_expiry_time(cls, shard: int = 0) -> Optional[float]:
+        """获取分片中最早到期订单的过期时间戳，没有订单时返回None"""
+        head = redis.client.zrange(cls.expiry_index_key(shard), 0, 0, withscores=True)
+        return head[0][1] if head else None
+
+    @classmethod
+    def claim_expired_orders(cls, limit: int = CLEANUP_CHUNK_SIZE,
+                             now: Optional[float] = None, shard: int = 0) -> List[Tuple[str, float]]:
         """
-        清理过期订单
+        原子地领取一批已过期订单并从过期索引和待支付集合中移除
+
+        参数:
+            limit: 本批最多领取数量
+            now: 截止时间戳，默认当前时间
+            shard: 过期索引分片
 
         返回:
-            int: 清理的订单数量
+            List[Tuple[str, float]]: (订单号, 过期时间戳) 列表
         """
-        try:
-            current_time = int(time.time())
+        now = time.time() if now is None else now
+        members = cls._get_claim_script()(
+            keys=[cls.expiry_index_key(shard), cls.PENDING_ORDERS_KEY],
+            args=[now, limit],
+        )
+        return [(members[i], float(members[i + 1])) for i in range(0, len(members), 2)]
 
-            # 获取已过期订单
-            expired_orders = redis.zrangebyscore(
-                cls.ORDER_EXPIRY_INDEX,
-                0,
-                current_time
-            )
+    @classmethod
+    def requeue_orders(cls, claimed: List[Tuple[str, float]], shard: int = 0) -> None:
+        """将领取后处理失败的订单放回队列，等待下一次清理"""
+        if not claimed:
+            return
+        pipe = redis.client.pipeline(transaction=True)
+        pipe.zadd(cls.expiry_index_key(shard), dict(claimed))
+        pipe.sadd(cls.PENDING_ORDERS_KEY, *[order_no for order_no, _ in claimed])
+        pipe.execute()
 
-            # 如果返回的是字节类型，转换为字符串
-            expired_order_nos = [order.decode() if isinstance(order, bytes) else order
-                                 for order in expired_orders]
+    @classmethod
+    def cleanup_expired_orders(cls, chunk_size: int = CLEANUP_CHUNK_SIZE,
+                               shards: Optional[List[int]] = None) -> int:
+        """
+        清理过期订单
 
-            cleaned_count = 0
-            for order_no in expired_order_nos:
-                # 处理过期订单（更新数据库中的状态）
-                cls._handle_expired_order(order_no)
+        按批领取已过期订单，每批用一次批量 UPDATE 关闭数据库中仍待支付的订单、
+        回补库存，并一次性推送审计日志
 
-                # 从Redis中移除
-                cls.remove_pending_order(order_no)
-                cleaned_count += 1
+        参数:
+            chunk_size: 每批处理的订单数
+            shards: 要清理的分片，默认全部分片
 
-            return cleaned_count
-        except Exception as e:
-            print(f"清理过期订单出错: {str(e)}")
-            return 0
+        返回:
+            int: 清理的订单数量
+        """
+        if shards is None:
+            shards = range(cls.shard_count())
+        return sum(cls._cleanup_shard(shard, chunk_size) for shard in shards)
+
+    @classmethod
+    def _cleanup_shard(cls, shard: int, chunk_size: int) -> int:
+        cleaned_count = 0
+        now = time.time()
+        while True:
+            try:
+                claimed = cls.claim_expired_orders(chunk_size, now, shard)
+            except Exception as e:
+                print(f"清理过期订单出错: {str(e)}")
+                break
+            if not claimed:
+                break
+
+            try:
+                cls._handle_expired_orders([order_no for order_no, _ in claimed])
+            except Exception as e:
+                logger.error(f"批量关闭过期订单出错: {str(e)}")
+                cls.requeue_orders(claimed, shard)
+                break
+
+            cleaned_count += len(claimed)
+            if len(claimed) < chunk_size:
+                break
+
+        return cleaned_count
 
     @classmethod
-    def _handle_expired_order(cls, order_no: str) -> None:
+    def _handle_expired_orders(cls, order_nos: List[str]) -> List[str]:
         """
-        处理过期订单（例如在数据库中取消）
+        批量处理过期订单（在数据库中关闭、回补库存并记录日志）
 
         参数:
-            order_no: 过期的订单号
+            order_nos: 过期的订单号列表
+
+        返回:
+            List[str]: 实际关闭的订单号
         """
+        # 导入仓储（避免循环导入）
+        from backend.mini_core.repository import shop_order_sqla_repo
+        from backend.mini_core.utils.redis_utils.log_queue import LogQueue
+
         try:
-            # 导入服务（避免循环导入）
-            from backend.mini_core.service import shop_order_service
-
-            # 根据订单号获取订单
-            order_result = shop_order_service.get_order_by_order_no(order_no)
-
-            if order_result and order_result.get('code') == 200 and order_result.get('data'):
-                order = order_result['data']
-
-                # 如果订单仍处于"待支付"状态，则关闭它
-                if order.status == '待支付' and order.payment_status == '待支付':
-                    shop_order_service.close_order(order.id)
-
-                    # 记录自动关闭日志
-                    from backend.mini_core.service import order_log_service
-                    order_log_service.create_log({
-                        'order_no': order_no,
-                        'operation_type': '系统自动关闭',
-                        'operation_desc': '订单支付超时，系统自动关闭',
-                        'operator': 'system',
-                    })
-        except Exception as e:
-            print(f"处理过期订单 {order_no} 出错: {str(e)}")
+            closed_order_nos = shop_order_sqla_repo.close_expired_orders(order_nos)
+        except Exception:
+            shop_order_sqla_repo.session.rollback()
+            raise
+
+        # 订单数据 key 带有过期时间，这里顺带删除以尽快释放空间
+        redis.client.delete(*[f"{cls.ORDER_DATA_KEY_PREFIX}{order_no}" for order_no in order_nos])
+
+        if closed_order_nos:
+            operation_time = datetime.now()
+            LogQueue.push_log_dicts([{
+                'op_type': 'order',
+                'data': {
+                    'order_no': order_no,
+                    'operation_type': '系统自动关闭',
+                    'operation_desc': '订单支付超时，系统自动关闭',
+                    'operator': 'system',
+                    'updater': 'system',
+                    'operation_time': operation_time,
+                }
+            } for order_no in closed_order_nos])
+        return closed_order_nos
 
     @classmethod
     def get_remaining_seconds(cls, order_no: str) -> Optional[int]:
@@ -273,7 +373,7 @@ class RedisOrderQueue:
         """
         try:
             # 从过期时间索引中获取过期时间
-            expiry_time = redis.zscore(cls.ORDER_EXPIRY_INDEX, order_no)
+            expiry_time = redis.client.zscore(cls.expiry_index_key(cls.shard_of(order_no)), order_no)
 
             if expiry_time is None:
                 return None
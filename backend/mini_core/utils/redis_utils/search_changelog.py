@@ -0,0 +1,89 @@
+# backend/mini_core/utils/redis_utils/search_changelog.py
+
+from typing import Iterable, List, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.extensions import redis
+
+# 为每个变更分配递增序号写入有序集合，同一文档只保留最新序号；超出上限时裁掉最旧的部分并记录裁剪位置
+RECORD_SCRIPT = """
+local seq = 0
+for i = 2, #ARGV do
+    seq = redis.call('INCR', KEYS[2])
+    redis.call('ZADD', KEYS[1], seq, ARGV[i])
+end
+local overflow = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[1])
+if overflow > 0 then
+    local trimmed = redis.call('ZRANGE', KEYS[1], overflow - 1, overflow - 1, 'WITHSCORES')
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, overflow - 1)
+    redis.call('SET', KEYS[3], trimmed[2])
+end
+return seq
+"""
+
+
+class SearchChangeLog:
+    """
+    搜索索引变更日志
+
+    搜索索引保存在每个进程内，写操作提交后把变更的文档（如 product:1）记入 Redis，
+    各进程检索前按自己已同步到的序号拉取之后的变更，增量更新本地索引。
+    进程落后太多、需要的变更已被裁掉时返回 complete=False，由调用方整体重建
+    """
+
+    LOG_KEY = "search:changelog"
+    SEQ_KEY = "search:seq"
+    FLOOR_KEY = "search:changelog_floor"
+    MAX_ENTRIES = 10000
+    # Session.info 中待提交后记录的变更
+    PENDING_KEY = "search_changelog_pending"
+
+    _record_script = None
+
+    @classmethod
+    def record(cls, members: Iterable[str]) -> None:
+        members = list(dict.fromkeys(members))
+        if not members:
+            return
+        if cls._record_script is None:
+            cls._record_script = redis.client.register_script(RECORD_SCRIPT)
+        try:
+            cls._record_script(keys=[cls.LOG_KEY, cls.SEQ_KEY, cls.FLOOR_KEY], args=[cls.MAX_ENTRIES, *members])
+        except Exception as e:
+            logger.warning(f"记录搜索索引变更失败: {str(e)}")
+
+    @classmethod
+    def record_on_commit(cls, session: Session, members: Iterable[str]) -> None:
+        """在 session 的事务提交后记录变更，保证其他进程拉取到变更时能读到新数据"""
+        session.info.setdefault(cls.PENDING_KEY, []).extend(members)
+
+    @classmethod
+    def current_seq(cls) -> int:
+        return int(redis.client.get(cls.SEQ_KEY) or 0)
+
+    @classmethod
+    def changes_since(cls, seq: int) -> Tuple[List[str], int, bool]:
+        """
+        拉取序号 seq 之后的变更
+
+        Returns:
+            Tuple: (变更的文档, 最新序号, 变更是否完整)
+        """
+        pipe = redis.client.pipeline(transaction=False)
+        pipe.get(cls.FLOOR_KEY)
+        pipe.zrangebyscore(cls.LOG_KEY, f"({seq}", '+inf', withscores=True)
+        floor, changes = pipe.execute()
+        if floor is not None and int(float(floor)) > seq:
+            return [], seq, False
+        latest = max([int(score) for _, score in changes], default=seq)
+        return [member for member, _ in changes], latest, True
+
+
+@event.listens_for(Session, 'after_commit')
+def search_changelog_after_commit(session: Session):
+    members = session.info.pop(SearchChangeLog.PENDING_KEY, None)
+    if members:
+        SearchChangeLog.record(members)
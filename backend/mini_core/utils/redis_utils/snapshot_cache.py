@@ -0,0 +1,167 @@
+# backend/mini_core/utils/redis_utils/snapshot_cache.py
+
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app
+from loguru import logger
+
+from backend.extensions import redis
+
+
+class SnapshotCache:
+    """
+    统计快照缓存
+
+    计算结果以 {'data': ..., 'refreshed_at': ...} 的 JSON 保存在 Redis 中：
+    - 未超过 TTL 直接返回（hit）
+    - 超过 TTL 但仍在保留期内返回旧数据（stale），同时由抢到锁的请求刷新，
+      其余请求继续返回旧数据，不会同时重算
+    - 没有快照时（miss）只有一个请求计算，其余请求等待锁后读取它写入的结果
+    正常情况下由 Celery 定时任务在过期前刷新，请求基本只会命中缓存
+    """
+
+    KEY_PREFIX = "snapshot"
+    STATS_KEY = "snapshot:stats"
+    # 快照在 Redis 中的保留时间为 TTL 的倍数，超过 TTL 的部分用于返回旧数据
+    STALE_FACTOR = 10
+    # miss 时等待其他请求计算完成的最长时间（秒）
+    LOCK_WAIT_SECONDS = 5
+    # 计算锁超时时间（秒），防止计算进程崩溃后锁一直存在
+    LOCK_TIMEOUT_SECONDS = 30
+
+    _registry: Dict[str, 'SnapshotCache'] = {}
+
+    def __init__(self, name: str, loader: Callable[[], Any], ttl_config_key: str = 'SNAPSHOT_CACHE_TTL',
+                 default_ttl: int = 60):
+        self.name = name
+        self.loader = loader
+        self.ttl_config_key = ttl_config_key
+        self.default_ttl = default_ttl
+        self._registry[name] = self
+
+    @property
+    def key(self) -> str:
+        return f"{self.KEY_PREFIX}:{self.name}"
+
+    @property
+    def lock_name(self) -> str:
+        return f"{self.KEY_PREFIX}:{self.name}"
+
+    @property
+    def ttl(self) -> int:
+        return int(current_app.config.get(self.ttl_config_key, self.default_ttl))
+
+    def get(self) -> Any:
+        """获取快照数据"""
+        snapshot = self._read()
+        if snapshot is not None:
+            if time.time() - snapshot['refreshed_at'] < self.ttl:
+                self._count('hit')
+                return snapshot['data']
+            self._count('stale')
+            # 只有抢到锁的请求负责刷新，其他请求直接返回旧数据
+            identifier = redis.acquire_lock(self.lock_name, acquire_time=0.01, time_out=self.LOCK_TIMEOUT_SECONDS)
+            if not identifier:
+                return snapshot['data']
+            try:
+                return self._load_and_store()
+            except Exception as e:
+                logger.error(f"刷新快照 {self.name} 失败，返回旧数据: {str(e)}")
+                return snapshot['data']
+            finally:
+                redis.release_lock(self.lock_name, identifier)
+
+        self._count('miss')
+        identifier = redis.acquire_lock(self.lock_name, acquire_time=self.LOCK_WAIT_SECONDS,
+                                        time_out=self.LOCK_TIMEOUT_SECONDS)
+        try:
+            # 等待锁期间其他请求可能已经写入快照
+            if identifier and (snapshot := self._read()) is not None:
+                return snapshot['data']
+            return self._load_and_store()
+        finally:
+            if identifier:
+                redis.release_lock(self.lock_name, identifier)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        重新计算快照，供后台任务调用
+
+        Args:
+            force: 为 False 时如果已有其他进程正在刷新则跳过
+
+        Returns:
+            bool: 是否执行了刷新
+        """
+        identifier = redis.acquire_lock(self.lock_name, acquire_time=self.LOCK_WAIT_SECONDS if force else 0.01,
+                                        time_out=self.LOCK_TIMEOUT_SECONDS)
+        if not identifier and not force:
+            return False
+        try:
+            self._load_and_store()
+            return True
+        finally:
+            if identifier:
+                redis.release_lock(self.lock_name, identifier)
+
+    def invalidate(self) -> None:
+        redis.client.delete(self.key)
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        try:
+            value = redis.client.get(self.key)
+        except Exception as e:
+            logger.warning(f"读取快照 {self.name} 失败: {str(e)}")
+            return None
+        return json.loads(value) if value else None
+
+    def _load_and_store(self) -> Any:
+        data = self.loader()
+        self._count('refresh')
+        try:
+            redis.client.set(
+                self.key,
+                json.dumps({'data': data, 'refreshed_at': time.time()}, ensure_ascii=False),
+                ex=self.ttl * self.STALE_FACTOR,
+            )
+        except Exception as e:
+            logger.warning(f"写入快照 {self.name} 失败: {str(e)}")
+        return data
+
+    def _count(self, event: str) -> None:
+        try:
+            redis.client.hincrby(self.STATS_KEY, f"{self.name}:{event}", 1)
+        except Exception:
+            pass
+
+    @classmethod
+    def refresh_all(cls) -> Dict[str, bool]:
+        """刷新所有已注册的快照"""
+        result = {}
+        for name, cache in cls._registry.items():
+            try:
+                result[name] = cache.refresh()
+            except Exception as e:
+                logger.error(f"刷新快照 {name} 失败: {str(e)}")
+                result[name] = False
+        return result
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Dict[str, int]]:
+        """
+        各快照的命中统计
+
+        Returns:
+            Dict: {快照名: {'hit', 'stale', 'miss', 'refresh', 'hit_rate'}}
+        """
+        raw = redis.client.hgetall(cls.STATS_KEY) or {}
+        stats = {name: {'hit': 0, 'stale': 0, 'miss': 0, 'refresh': 0} for name in cls._registry}
+        for field, value in raw.items():
+            name, _, event = field.rpartition(':')
+            stats.setdefault(name, {'hit': 0, 'stale': 0, 'miss': 0, 'refresh': 0})[event] = int(value)
+        for item in stats.values():
+            requests = item['hit'] + item['stale'] + item['miss']
+            item['hit_rate'] = round((item['hit'] + item['stale']) / requests, 4) if requests else 0.0
+        return stats
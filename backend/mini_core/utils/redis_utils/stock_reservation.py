@@ -0,0 +1,288 @@
+# backend/mini_core/utils/redis_utils/stock_reservation.py
+
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import current_app
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.extensions import redis
+
+# 检查全部商品库存后一次性扣减，并记录预占和待同步到数据库的库存变化；
+# 同一订单重复预占时直接返回成功
+RESERVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {1}
+end
+local n = #KEYS - 2
+for i = 1, n do
+    local stock = redis.call('GET', KEYS[i + 2])
+    if not stock then
+        return {-1, ARGV[2 * i]}
+    end
+    if tonumber(stock) < tonumber(ARGV[2 * i + 1]) then
+        return {0, ARGV[2 * i], stock}
+    end
+end
+for i = 1, n do
+    local quantity = tonumber(ARGV[2 * i + 1])
+    redis.call('DECRBY', KEYS[i + 2], quantity)
+    redis.call('HINCRBY', KEYS[2], ARGV[2 * i], -quantity)
+    redis.call('HINCRBY', KEYS[1], ARGV[2 * i], quantity)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {1}
+"""
+
+# 释放预占: 归还库存计数并记录待同步的变化；库存计数不存在时只记录变化，
+# 之后按数据库库存加上待同步变化重新初始化
+RELEASE_SCRIPT = """
+local items = redis.call('HGETALL', KEYS[1])
+for i = 1, #items, 2 do
+    local key = ARGV[1] .. items[i]
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('INCRBY', key, items[i + 1])
+    end
+    redis.call('HINCRBY', KEYS[2], items[i], items[i + 1])
+end
+redis.call('DEL', KEYS[1])
+return items
+"""
+
+# 库存计数不存在时按数据库库存加上尚未同步的变化初始化
+INIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    local delta = tonumber(redis.call('HGET', KEYS[2], ARGV[2]) or 0)
+    redis.call('SET', KEYS[1], tonumber(ARGV[1]) + delta)
+end
+return redis.call('GET', KEYS[1])
+"""
+
+# 取出全部待同步的变化
+TAKE_DELTAS_SCRIPT = """
+local deltas = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return deltas
+"""
+
+
+class StockLockTimeout(RuntimeError):
+    """等待库存同步锁超时，Redis 正常但库存计数暂时无法初始化"""
+
+
+class StockReservation:
+    """
+    商品库存预占
+
+    下单时在 Redis 库存计数 stock:available:{商品ID} 上用 Lua 原子地检查并扣减，
+    扣减数量记入预占 stock:reservation:{订单号}，有效期与待支付订单队列一致；
+    订单超时关闭或取消时释放预占，归还库存计数。
+
+    库存计数 = 数据库库存 + stock:delta 中尚未同步的变化，定时任务 sync_stock_reservations 把 stock:delta
+    批量写回数据库，下单不再逐行更新热点商品。直接修改数据库库存（后台调整、未预占订单的回补等）
+    时在提交后删除对应的库存计数，下次预占时重新初始化。
+    初始化和写回使用同一把锁，保证初始化时读到的数据库库存与 stock:delta 一致
+    """
+
+    COUNTER_KEY_PREFIX = "stock:available:"
+    RESERVATION_KEY_PREFIX = "stock:reservation:"
+    DELTA_KEY = "stock:delta"
+    LOCK_NAME = "stock_reconcile"
+    # 预占在订单过期后额外保留的时间（秒），供过期处理延迟时仍能释放
+    RESERVATION_GRACE_SECONDS = 24 * 60 * 60
+    # Session.info 中待提交后执行的操作
+    PENDING_KEY = "stock_reservation_pending"
+
+    _scripts: Dict[str, Callable] = {}
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(current_app.config.get('STOCK_RESERVATION_ENABLED', True))
+
+    @classmethod
+    def counter_key(cls, product_id: int) -> str:
+        return f"{cls.COUNTER_KEY_PREFIX}{product_id}"
+
+    @classmethod
+    def reservation_key(cls, order_no: str) -> str:
+        return f"{cls.RESERVATION_KEY_PREFIX}{order_no}"
+
+    @classmethod
+    def _script(cls, name: str, source: str):
+        if name not in cls._scripts:
+            cls._scripts[name] = redis.client.register_script(source)
+        return cls._scripts[name]
+
+    @classmethod
+    def reserve(cls, order_no: str, quantities: Dict[int, int], expire_seconds: int,
+                stock_loader: Callable[[List[int]], Dict[int, int]]) -> Tuple[bool, Optional[int], Optional[int]]:
+        """
+        为订单预占库存
+
+        Args:
+            order_no: 订单号
+            quantities: 商品ID -> 数量
+            expire_seconds: 订单支付有效期（秒）
+            stock_loader: 按商品ID批量查询数据库库存，用于初始化库存计数
+
+        Returns:
+            Tuple: (是否成功, 库存不足的商品ID, 该商品当前可用库存)
+        """
+        product_ids = sorted(quantities)
+        keys = [cls.reservation_key(order_no), cls.DELTA_KEY] + [cls.counter_key(pid) for pid in product_ids]
+        args = [expire_seconds + cls.RESERVATION_GRACE_SECONDS]
+        for product_id in product_ids:
+            args.extend([product_id, int(quantities[product_id])])
+
+        script = cls._script('reserve', RESERVE_SCRIPT)
+        # 每个商品最多初始化一次库存计数
+        for _ in range(2):
+            result = script(keys=keys, args=args)
+            if int(result[0]) == 1:
+                return True, None, None
+            if int(result[0]) == 0:
+                return False, int(result[1]), int(result[2])
+            cls.init_counters(product_ids, stock_loader)
+        raise RuntimeError(f"初始化库存计数失败: {order_no}")
+
+    @classmethod
+    def connect(cls) -> None:
+        """
+        预先从连接池取出一个连接并建立连接，连接失败时抛出 ConnectionError
+
+        此时还没有发送任何命令，Redis 中不会留下预占，调用方可以确定地改为更新数据库
+        """
+        pool = redis.client.connection_pool
+        connection = pool.get_connection('EVALSHA')
+        pool.release(connection)
+
+    @classmethod
+    def is_reserved(cls, order_no: str) -> bool:
+        """订单是否已有库存预占"""
+        return bool(redis.client.exists(cls.reservation_key(order_no)))
+
+    @classmethod
+    def init_counters(cls, product_ids: List[int], stock_loader: Callable[[List[int]], Dict[int, int]]) -> None:
+        """初始化缺失的库存计数"""
+        missing = [pid for pid, exists in zip(product_ids, cls._exists([cls.counter_key(pid) for pid in product_ids]))
+                   if not exists]
+        if not missing:
+            return
+        identifier = redis.acquire_lock(cls.LOCK_NAME, acquire_time=3, time_out=30)
+        if not identifier:
+            raise StockLockTimeout("等待库存同步锁超时")
+        try:
+            stocks = stock_loader(missing)
+            script = cls._script('init', INIT_SCRIPT)
+            for product_id in missing:
+                script(keys=[cls.counter_key(product_id), cls.DELTA_KEY],
+                       args=[int(stocks.get(product_id) or 0), product_id])
+        finally:
+            redis.release_lock(cls.LOCK_NAME, identifier)
+
+    @classmethod
+    def release(cls, order_no: str) -> Dict[int, int]:
+        """释放订单的预占，返回归还的商品数量；预占不存在时返回空"""
+        items = cls._script('release', RELEASE_SCRIPT)(
+            keys=[cls.reservation_key(order_no), cls.DELTA_KEY], args=[cls.COUNTER_KEY_PREFIX]
+        )
+        return {int(items[i]): int(items[i + 1]) for i in range(0, len(items), 2)}
+
+    @classmethod
+    def confirm(cls, order_no: str) -> None:
+        """订单支付后删除预占，库存不再归还"""
+        try:
+            redis.client.delete(cls.reservation_key(order_no))
+        except Exception as e:
+            logger.warning(f"删除库存预占失败: {order_no}, {str(e)}")
+
+    @classmethod
+    def reserved_orders(cls, order_nos: List[str]) -> Set[str]:
+        """返回有库存预占的订单"""
+        exists = cls._exists([cls.reservation_key(order_no) for order_no in order_nos])
+        return {order_no for order_no, found in zip(order_nos, exists) if found}
+
+    @classmethod
+    def invalidate(cls, product_ids: Iterable[int]) -> None:
+        """删除库存计数，下次预占时按数据库库存重新初始化"""
+        keys = [cls.counter_key(pid) for pid in set(product_ids)]
+        if not keys:
+            return
+        try:
+            redis.client.delete(*keys)
+        except Exception as e:
+            logger.warning(f"删除库存计数失败: {str(e)}")
+
+    @classmethod
+    def release_on_commit(cls, session: Session, order_nos: Iterable[str]) -> None:
+        """在 session 的事务提交后释放预占，事务回滚时不释放"""
+        cls._pending(session)['release'].update(order_nos)
+
+    @classmethod
+    def invalidate_on_commit(cls, session: Session, product_ids: Iterable[int]) -> None:
+        """在 session 的事务提交后删除库存计数"""
+        cls._pending(session)['invalidate'].update(pid for pid in product_ids if pid)
+
+    @classmethod
+    def reconcile(cls, apply_deltas: Callable[[Dict[int, int]], None]) -> int:
+        """
+        把待同步的库存变化批量写回数据库
+
+        Args:
+            apply_deltas: 商品ID -> 库存变化，在一个事务中更新数据库，失败时抛出异常
+
+        Returns:
+            int: 同步的商品数
+        """
+        identifier = redis.acquire_lock(cls.LOCK_NAME, acquire_time=3, time_out=60)
+        if not identifier:
+            return 0
+        try:
+            items = cls._script('take_deltas', TAKE_DELTAS_SCRIPT)(keys=[cls.DELTA_KEY])
+            deltas = {int(items[i]): int(items[i + 1]) for i in range(0, len(items), 2)}
+            deltas = {pid: delta for pid, delta in deltas.items() if delta}
+            if not deltas:
+                return 0
+            try:
+                apply_deltas(deltas)
+            except Exception:
+                # 写回失败时放回，等待下一次同步
+                pipe = redis.client.pipeline(transaction=True)
+                for product_id, delta in deltas.items():
+                    pipe.hincrby(cls.DELTA_KEY, product_id, delta)
+                pipe.execute()
+                raise
+            return len(deltas)
+        finally:
+            redis.release_lock(cls.LOCK_NAME, identifier)
+
+    @classmethod
+    def _exists(cls, keys: List[str]) -> List[bool]:
+        pipe = redis.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(key)
+        return [bool(found) for found in pipe.execute()]
+
+    @classmethod
+    def _pending(cls, session: Session) -> dict:
+        return session.info.setdefault(cls.PENDING_KEY, dict(release=set(), invalidate=set()))
+
+
+@event.listens_for(Session, 'after_commit')
+def stock_reservation_after_commit(session: Session):
+    pending = session.info.pop(StockReservation.PENDING_KEY, None)
+    if not pending:
+        return
+    for order_no in pending['release']:
+        try:
+            StockReservation.release(order_no)
+        except Exception as e:
+            logger.error(f"释放库存预占失败: {order_no}, {str(e)}")
+    StockReservation.invalidate(pending['invalidate'])
+
+
+@event.listens_for(Session, 'after_rollback')
+def stock_reservation_after_rollback(session: Session):
+    # 关闭订单的事务回滚时订单仍待支付，不能释放预占
+    session.info.pop(StockReservation.PENDING_KEY, None)
@@ -0,0 +1,142 @@
+# backend/mini_core/utils/redis_utils/store_geo.py
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend.extensions import redis
+
+# Redis GEO 支持的纬度范围
+MAX_LATITUDE = 85.05112878
+
+
+class StoreGeoIndex:
+    """
+    商店地理位置索引
+
+    正常营业且有坐标的商店写入 Redis GEO（store:geo），营业时间写入哈希 store:geo:hours。
+    附近商店由 GEORADIUS 按距离升序返回候选，不再逐行计算距离。
+    商店新增、坐标、状态、营业时间变化后在事务提交时同步；索引不存在时（首次使用、Redis 清空）
+    从数据库全量重建，重建完成后写入 store:geo:ready 标记
+    """
+
+    GEO_KEY = "store:geo"
+    HOURS_KEY = "store:geo:hours"
+    READY_KEY = "store:geo:ready"
+    LOCK_NAME = "store_geo_rebuild"
+    # Session.info 中待提交后同步的商店
+    PENDING_KEY = "store_geo_pending"
+    # 影响索引的商店字段
+    FIELDS = frozenset({'latitude', 'longitude', 'status', 'opening_hours'})
+
+    def nearby(self, latitude: float, longitude: float, distance: float, with_hours: bool,
+               loader: Callable[[], Iterable[Any]]) -> List[Tuple[int, float, Optional[str]]]:
+        """
+        查询附近的商店
+
+        Args:
+            latitude: 纬度
+            longitude: 经度
+            distance: 距离范围（公里）
+            with_hours: 是否同时返回营业时间
+            loader: 索引不存在时查询全部商店，行需包含 id、latitude、longitude、status、opening_hours
+
+        Returns:
+            List: 按距离升序的 (商店 ID, 距离, 营业时间)
+        """
+        if not redis.client.exists(self.READY_KEY):
+            self.rebuild(loader)
+        results = redis.client.georadius(self.GEO_KEY, longitude, latitude, distance, unit='km',
+                                         withdist=True, sort='ASC')
+        ids = [int(member) for member, _ in results]
+        hours = redis.client.hmget(self.HOURS_KEY, ids) if with_hours and ids else [None] * len(ids)
+        return [(store_id, dist, opening_hours) for store_id, (_, dist), opening_hours in zip(ids, results, hours)]
+
+    def rebuild(self, loader: Callable[[], Iterable[Any]]) -> int:
+        """从数据库全量重建索引，多个进程同时发现索引缺失时只由一个进程重建"""
+        identifier = redis.acquire_lock(self.LOCK_NAME, acquire_time=10, time_out=60)
+        try:
+            if identifier and redis.client.exists(self.READY_KEY):
+                return 0
+            locations, hours = {}, {}
+            for row in loader():
+                entry = self.entry(row)
+                if entry is not None:
+                    locations[row.id] = entry[:2]
+                    if entry[2]:
+                        hours[row.id] = entry[2]
+
+            pipe = redis.client.pipeline(transaction=True)
+            pipe.delete(self.GEO_KEY, self.HOURS_KEY)
+            if locations:
+                pipe.geoadd(self.GEO_KEY, *[value for store_id, (lng, lat) in locations.items()
+                                            for value in (lng, lat, store_id)])
+            if hours:
+                pipe.hset(self.HOURS_KEY, mapping=hours)
+            pipe.set(self.READY_KEY, 1)
+            pipe.execute()
+            logger.info(f"商店地理位置索引重建完成: {len(locations)} 个商店")
+            return len(locations)
+        finally:
+            if identifier:
+                redis.release_lock(self.LOCK_NAME, identifier)
+
+    def apply(self, changes: Dict[int, Optional[Tuple[float, float, Optional[str]]]]) -> None:
+        """
+        同步变更
+
+        Args:
+            changes: 商店 ID -> (经度, 纬度, 营业时间)，为 None 时从索引移除
+        """
+        if not changes:
+            return
+        try:
+            pipe = redis.client.pipeline(transaction=True)
+            for store_id, entry in changes.items():
+                if entry is None:
+                    pipe.zrem(self.GEO_KEY, store_id)
+                    pipe.hdel(self.HOURS_KEY, store_id)
+                    continue
+                pipe.geoadd(self.GEO_KEY, entry[0], entry[1], store_id)
+                if entry[2]:
+                    pipe.hset(self.HOURS_KEY, store_id, entry[2])
+                else:
+                    pipe.hdel(self.HOURS_KEY, store_id)
+            pipe.execute()
+        except Exception as e:
+            # 同步失败时删除标记，下次查询全量重建
+            logger.warning(f"同步商店地理位置索引失败: {str(e)}")
+            try:
+                redis.client.delete(self.READY_KEY)
+            except Exception:
+                pass
+
+    def remove(self, store_ids: Iterable[int]) -> None:
+        self.apply({store_id: None for store_id in store_ids})
+
+    def sync_on_commit(self, session: Session, store: Any, deleted: bool = False) -> None:
+        """在 session 的事务提交后同步商店"""
+        pending = session.info.setdefault(self.PENDING_KEY, {})
+        pending[store.id] = None if deleted else self.entry(store)
+
+    @staticmethod
+    def entry(store: Any) -> Optional[Tuple[float, float, Optional[str]]]:
+        """商店在索引中的 (经度, 纬度, 营业时间)，停用或坐标无效的商店返回 None"""
+        if store.status != '正常' or store.latitude is None or store.longitude is None:
+            return None
+        latitude, longitude = float(store.latitude), float(store.longitude)
+        if not (-MAX_LATITUDE <= latitude <= MAX_LATITUDE and -180 <= longitude <= 180):
+            return None
+        return longitude, latitude, store.opening_hours or None
+
+
+store_geo_index = StoreGeoIndex()
+
+
+@event.listens_for(Session, 'after_commit')
+def store_geo_after_commit(session: Session):
+    pending = session.info.pop(StoreGeoIndex.PENDING_KEY, None)
+    if pending:
+        store_geo_index.apply(pending)
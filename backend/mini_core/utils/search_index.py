@@ -0,0 +1,175 @@
+# backend/mini_core/utils/search_index.py
+
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# 连续的中日韩字符，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[a-z0-9]+')
+_CJK_PATTERN = re.compile(r'[㐀-䶿一-鿿豈-﫿]')
+
+
+def tokenize(text: Optional[str], for_query: bool = False) -> List[str]:
+    """
+    中文按二元组（bigram）切分，字母数字按整词切分
+
+    建索引时中文同时保留单字，单字查询也能命中；
+    查询时两个字以上的中文只使用二元组，避免单字带来大量无关结果
+    """
+    if not text:
+        return []
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(str(text).lower()):
+        if not _CJK_PATTERN.match(run):
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        if not for_query:
+            tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class InvertedIndex:
+    """
+    进程内倒排索引
+
+    每个文档由若干带权重的文本字段和用于过滤的元数据组成，支持增量添加、删除，
+    按 TF-IDF 加权打分排序，以及按名称前缀自动补全
+    """
+
+    # 查询词命中比例低于该值的文档不返回
+    MIN_SHOULD_MATCH = 0.6
+
+    def __init__(self, field_weights: Dict[str, float], suggest_field: Optional[str] = None):
+        self.field_weights = field_weights
+        self.suggest_field = suggest_field
+        self._postings: Dict[str, Dict[Hashable, float]] = defaultdict(dict)
+        self._doc_tokens: Dict[Hashable, Tuple[str, ...]] = {}
+        self._meta: Dict[Hashable, Dict[str, Any]] = {}
+        # (规范化名称, 文档 ID) 有序列表，用于前缀补全
+        self._names: List[Tuple[str, Hashable]] = []
+        self._doc_names: Dict[Hashable, Tuple[str, str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_tokens)
+
+    def add(self, doc_id: Hashable, fields: Dict[str, Optional[str]], meta: Optional[Dict[str, Any]] = None) -> None:
+        """添加或替换文档"""
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in self.field_weights.items():
+            for token in tokenize(fields.get(field)):
+                weights[token] += weight
+
+        with self._lock:
+            self._remove(doc_id)
+            for token, weight in weights.items():
+                self._postings[token][doc_id] = weight
+            self._doc_tokens[doc_id] = tuple(weights)
+            self._meta[doc_id] = meta or {}
+            name = fields.get(self.suggest_field) if self.suggest_field else None
+            if name:
+                entry = (str(name).lower(), doc_id)
+                bisect.insort(self._names, entry)
+                self._doc_names[doc_id] = (entry[0], str(name))
+
+    def remove(self, doc_id: Hashable) -> None:
+        with self._lock:
+            self._remove(doc_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._doc_tokens.clear()
+            self._meta.clear()
+            self._names.clear()
+            self._doc_names.clear()
+
+    def _remove(self, doc_id: Hashable) -> None:
+        for token in self._doc_tokens.pop(doc_id, ()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+        self._meta.pop(doc_id, None)
+        if (name := self._doc_names.pop(doc_id, None)) is not None:
+            entry = (name[0], doc_id)
+            i = bisect.bisect_left(self._names, entry)
+            if i < len(self._names) and self._names[i] == entry:
+                del self._names[i]
+
+    def search(self, query: str, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               page: int = 1, size: int = 10) -> Tuple[List[Hashable], int]:
+        """
+        检索文档
+
+        Args:
+            query: 查询文本
+            predicate: 按元数据过滤文档
+            page: 页码，从 1 开始
+            size: 每页数量
+
+        Returns:
+            Tuple: (当前页文档 ID, 命中总数)
+        """
+        tokens = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not tokens:
+            return [], 0
+
+        with self._lock:
+            total_docs = max(len(self._doc_tokens), 1)
+            scores: Dict[Hashable, float] = defaultdict(float)
+            matched: Dict[Hashable, int] = defaultdict(int)
+            for token in tokens:
+                posting = self._postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + total_docs / len(posting))
+                for doc_id, weight in posting.items():
+                    scores[doc_id] += weight * idf
+                    matched[doc_id] += 1
+
+            required = math.ceil(len(tokens) * self.MIN_SHOULD_MATCH)
+            hits = [
+                (matched[doc_id], score, doc_id) for doc_id, score in scores.items()
+                if matched[doc_id] >= required and (predicate is None or predicate(self._meta[doc_id]))
+            ]
+
+        # 先按命中查询词数，再按得分排序
+        hits.sort(key=lambda hit: (-hit[0], -hit[1]))
+        start = (max(page, 1) - 1) * size
+        return [doc_id for _, _, doc_id in hits[start:start + size]], len(hits)
+
+    def suggest(self, prefix: str, limit: int = 10,
+                predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[str]:
+        """按名称前缀补全，返回去重后的名称"""
+        prefix = (prefix or '').strip().lower()
+        if not prefix:
+            return []
+        results: List[str] = []
+        with self._lock:
+            i = bisect.bisect_left(self._names, (prefix,))
+            while i < len(self._names) and len(results) < limit:
+                name, doc_id = self._names[i]
+                if not name.startswith(prefix):
+                    break
+                display = self._doc_names[doc_id][1]
+                if display not in results and (predicate is None or predicate(self._meta[doc_id])):
+                    results.append(display)
+                i += 1
+        return results
+
+    def rebuild(self, documents: Iterable[Tuple[Hashable, Dict[str, Optional[str]], Dict[str, Any]]]) -> int:
+        """清空后批量重建，返回文档数"""
+        with self._lock:
+            self.clear()
+            for doc_id, fields, meta in documents:
+                self.add(doc_id, fields, meta)
+            return len(self._doc_tokens)
@@ -4,6 +4,7 @@ from typing import Tuple, Type, List
 from sqlalchemy import Column, DateTime, String, Table, event
 
 from backend.extensions import db, mapper_registry
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from backend.role.domain import Role
 from backend.role.domain.role import AccessLevel
 from backend.role.message import ROLE_EXISTS
@@ -106,3 +107,12 @@ def unique_role(mapper, connection, target: Role):
     conditions = [Role.role_number == target.role_number, Role.id != target.id]
     if db.session.query(Role).filter(*conditions).first():
         raise ServiceBadRequest(ROLE_EXISTS)
+
+
+@event.listens_for(Role, 'after_update')
+@event.listens_for(Role, 'after_delete')
+def role_invalidate_auth_cache(mapper, connection, target: Role):
+    auth_cache.invalidate_on_commit(target, [
+        auth_cache.scope_key(role_number)
+        for role_number in auth_cache.attribute_values(target, 'role_number')
+    ])
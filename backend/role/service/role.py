@@ -3,6 +3,7 @@ from typing import List, Optional
 from flask_jwt_extended import current_user
 from backend.role.repository.role import role_sqla_repo
 from backend.extensions import casbin_enforcer
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from backend.role import message
 from backend.role.domain import Role
 from backend.user.service import user_service
@@ -32,6 +33,7 @@ class RoleService(CRUDService[Role]):
         if users:
             raise ServiceBadRequest(message.ROLE_IN_USE_ERROR)
         super(RoleService, self).delete(record_id)
+        auth_cache.invalidate([auth_cache.scope_key(role.role_number)])
 
 
 
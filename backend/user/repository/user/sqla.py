@@ -5,6 +5,7 @@ from sqlalchemy import BigInteger, Column, DateTime, String, Table, and_, event
 
 from backend.extensions import mapper_registry, db
 from backend.license_management.domain.li import License
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from backend.user.domain import User, Department
 from backend.user.message import UserMessage
 from backend.user.repository.user.base import UserRepository
@@ -88,3 +89,9 @@ def unique_user(mapper, connection, target: User):
     conditions = [User.username == target.username, User.id != target.id]
     if db.session.query(User).filter(*conditions).first():
         raise ServiceBadRequest(UserMessage.USER_EXISTED)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def user_invalidate_auth_cache(mapper, connection, target: User):
+    auth_cache.invalidate_on_commit(target, [auth_cache.user_key(auth_cache.ADMIN_USER, target.id)])
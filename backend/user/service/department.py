@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from flask_jwt_extended import get_current_user
 
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from backend.user import message
 from backend.user.domain import Department
 from backend.user.message import UserMessage
@@ -48,13 +49,18 @@ class DepartmentService(CRUDService[Department]):
         for department_id in department_ids:
             self.repo.delete_by({'id': department_id}, commit=False)
         self.repo.commit()
+        # 批量删除不会触发实体事件，需要手动清除认证缓存
+        auth_cache.invalidate([auth_cache.user_key(auth_cache.ADMIN_USER, user_id) for user_id in user_ids])
+        auth_cache.invalidate_scopes()
 
     def update(self, department_id: int, department: Department) -> Optional[Department]:
         if department.parent_id == 0:
             department.level = 0
         else:
             department.level = self.get(department.parent_id).level + 1
-        return super().update(department_id, department)
+        result = super().update(department_id, department)
+        auth_cache.invalidate_scopes()
+        return result
 
     def summary(self) -> list:
         departments = self.repo.find_all()
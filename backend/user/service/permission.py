@@ -122,7 +122,7 @@ class PermissionService(CRUDService[Permission]):
             return all_menus
 
         # 获取用户角色的所有权限
-        casbin_enforcer.e.load_policy()
+        casbin_enforcer.sync_policy()
         roles = casbin_enforcer.e.get_roles_for_user(username)
 
         user_permissions = set()
@@ -191,7 +191,7 @@ class PermissionService(CRUDService[Permission]):
         """
         if permission.perms:
             # 加载策略
-            casbin_enforcer.e.load_policy()
+            casbin_enforcer.sync_policy()
 
             # 注册资源和资源角色的对应关系
             casbin_enforcer.e.add_named_policy("g2", permission.perms, permission.number)
@@ -205,7 +205,7 @@ class PermissionService(CRUDService[Permission]):
         """
         if permission.perms:
             # 加载策略
-            casbin_enforcer.e.load_policy()
+            casbin_enforcer.sync_policy()
 
             # 移除资源和资源角色的对应关系
             casbin_enforcer.e.remove_named_policy("g2", permission.perms, permission.number)
@@ -222,7 +222,7 @@ class PermissionService(CRUDService[Permission]):
         """
         if permission.perms:
             # 加载策略
-            casbin_enforcer.e.load_policy()
+            casbin_enforcer.sync_policy()
 
             # 检查是否有角色使用该权限
             policies = casbin_enforcer.e.get_policy()
@@ -13,6 +13,7 @@ from werkzeug.security import check_password_hash, generate_password_hash
 from backend.extensions import casbin_enforcer, db
 from backend.license_management.create_parsing_li.create_license import GetMacAddress
 from backend.license_management.create_parsing_li.get_license import li_content, get_date
+from backend.mini_core.utils.redis_utils.auth_cache import auth_cache
 from backend.user import message
 from backend.user.domain import User
 from backend.user.message import UserMessage
@@ -44,7 +45,7 @@ class UserService(CRUDService[User]):
 
     def get_user_center(self, user_id: int) -> Optional[User]:
         from backend.role.service import role_service
-        casbin_enforcer.e.load_policy()
+        casbin_enforcer.sync_policy()
         user = self._get_user_detail(self.get(user_id))
         if user and user.role_numbers:
             role = role_service.repo.find(role_number=user.role_numbers)
@@ -84,7 +85,9 @@ class UserService(CRUDService[User]):
         username = user.username
         if username == message.ADMIN_DEFAULT_USERNAME:
             raise ServiceBadRequest(UserMessage.ADMIN_DELETE_ERROR)
-        return super().delete(entity_id)
+        result = super().delete(entity_id)
+        auth_cache.invalidate([auth_cache.user_key(auth_cache.ADMIN_USER, entity_id)])
+        return result
 
     def login(self, args: dict):
         username = args['username']
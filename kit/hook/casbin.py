@@ -2,11 +2,12 @@
 import uuid
 import json
 import logging
-from typing import Optional
-from threading import Thread, Lock, Event
+from typing import Optional, Sequence
+from threading import Thread, Lock, RLock, Event
 
 from casbin import Enforcer
 from casbin.model import Model
+from casbin.model.policy_op import PolicyOp
 from casbin.persist.adapter import Adapter
 from casbin_sqlalchemy_adapter import Adapter as SQLAdapter
 from flask import Flask, current_app
@@ -73,7 +74,7 @@ class RedisWatcher:
     def update_for_add_policy(self, sec: str, ptype: str, *params: str):
         def func():
             with self.mutex:
-                msg = MSG('UpdateForAddPolicy', self.options.local_ID, sec, ptype, params)
+                msg = MSG('UpdateForAddPolicy', self.options.local_ID, sec, ptype, *_flatten_rule(params))
                 return self.pub_client.publish(self.options.channel, msg.marshal_binary())
 
         return self.log_record(func)
@@ -81,7 +82,23 @@ class RedisWatcher:
     def update_for_remove_policy(self, sec: str, ptype: str, *params: str):
         def func():
             with self.mutex:
-                msg = MSG('UpdateForRemovePolicy', self.options.local_ID, sec, ptype, params)
+                msg = MSG('UpdateForRemovePolicy', self.options.local_ID, sec, ptype, *_flatten_rule(params))
+                return self.pub_client.publish(self.options.channel, msg.marshal_binary())
+
+        return self.log_record(func)
+
+    def update_for_add_policies(self, sec: str, ptype: str, rules: Sequence[Sequence[str]]):
+        def func():
+            with self.mutex:
+                msg = MSG('UpdateForAddPolicies', self.options.local_ID, sec, ptype, *[list(r) for r in rules])
+                return self.pub_client.publish(self.options.channel, msg.marshal_binary())
+
+        return self.log_record(func)
+
+    def update_for_remove_policies(self, sec: str, ptype: str, rules: Sequence[Sequence[str]]):
+        def func():
+            with self.mutex:
+                msg = MSG('UpdateForRemovePolicies', self.options.local_ID, sec, ptype, *[list(r) for r in rules])
                 return self.pub_client.publish(self.options.channel, msg.marshal_binary())
 
         return self.log_record(func)
@@ -94,7 +111,8 @@ class RedisWatcher:
                     self.options.local_ID,
                     sec,
                     ptype,
-                    f"{field_index} {' '.join(params)}",
+                    int(field_index),
+                    *params,
                 )
                 return self.pub_client.publish(self.options.channel, msg.marshal_binary())
 
@@ -138,7 +156,7 @@ class RedisWatcher:
                 self.subscribe_event.set()
             if item is not None and item['type'] == 'message':
                 with self.mutex:
-                    self.callback(str(item))
+                    self.callback(item['data'])
 
 
 class MSG:
@@ -155,7 +173,14 @@ class MSG:
     @staticmethod
     def unmarshal_binary(data: bytes) -> 'MSG':
         loaded = json.loads(data)
-        return MSG(**loaded)
+        return MSG(loaded['method'], loaded['id_'], loaded['sec'], loaded['ptype'], *loaded.get('params', ()))
+
+
+def _flatten_rule(params: tuple) -> list:
+    """casbin 以单个列表传入规则，也兼容逐个传入规则字段"""
+    if len(params) == 1 and isinstance(params[0], (list, tuple)):
+        return list(params[0])
+    return list(params)
 
 
 def new_watcher(redis_cli: Redis, option: WatcherOptions):
@@ -190,6 +215,13 @@ def callback_function(event) -> None:
 
 
 class CasbinEnforcer:
+    """
+    Casbin 扩展
+
+    开启 ENABLE_WATCHER 后通过 Redis 发布订阅同步其他进程的策略变更，
+    收到的增量消息直接应用到内存模型，只有无法增量处理的消息才整体重新加载策略
+    """
+
     def __init__(
         self, app: Optional[Flask] = None, adapter: Optional[Adapter] = None
     ) -> None:
@@ -197,23 +229,102 @@ class CasbinEnforcer:
         self._e: Optional[Enforcer] = None
         self._a: Optional[Adapter] = adapter
         self._watcher: Optional[RedisWatcher] = None
+        # 保护内存模型，订阅线程修改策略时不与读取并发执行
+        self._policy_lock = RLock()
 
     def init_app(self, app: Flask) -> None:
         self.app = app
         assert self.app is not None
 
+        if model_path := self.app.config.get('CASBIN_MODEL'):
+            self._e = Enforcer(model_path, self._a or self._default_adapter())
+
         if self.app.config.get('ENABLE_WATCHER'):
             from backend.extensions import redis
             options = WatcherOptions()
             options.optional_update_callback = self.update_callback
-            w = new_watcher(redis.client, options)
+            # 订阅连接会一直阻塞读取，不能使用带读超时的连接
+            self._watcher = new_watcher(redis.blocking_client, options)
+            if self._e is not None:
+                # set_watcher 会把回调替换为整体 load_policy，这里改回增量处理
+                self._e.set_watcher(self._watcher)
+                self._watcher.set_update_callback(self.update_callback)
 
     @property
     def e(self) -> Enforcer:
         return self._e
 
+    def sync_policy(self) -> None:
+        """
+        读取策略前确保内存模型是最新的
+
+        开启 watcher 时其他进程的变更已经增量同步，不需要整体重新加载
+        """
+        if self._watcher is None:
+            self.load_policy()
+
+    def load_policy(self) -> None:
+        with self._policy_lock:
+            self._e.load_policy()
+
     def update_callback(self, message: str):
-        logger.info(f'Policies has been changed: {message}')
+        """处理 watcher 消息，自己发出的变更已经应用过，直接忽略"""
+        try:
+            msg = MSG.unmarshal_binary(message)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f'Casbin watcher message parse error: {e}, message: {message}')
+            msg = None
+
+        if msg is not None and self._watcher is not None and msg.id_ == self._watcher.options.local_ID:
+            return
+        if self._e is None:
+            return
+
+        try:
+            if msg is None or not self._apply_message(msg):
+                self.load_policy()
+                return
+        except Exception as e:
+            logger.warning(f'Casbin incremental update failed, reload policy: {e}')
+            self.load_policy()
+            return
+        logger.debug(f'Policies has been changed: {msg.method} {msg.sec} {msg.ptype}')
+
+    def _apply_message(self, msg: MSG) -> bool:
+        """
+        把增量消息应用到内存模型
+
+        Returns:
+            bool: 是否已处理，False 表示需要整体重新加载
+        """
+        model = self._e.get_model()
+        params = list(msg.params)
+        with self._policy_lock:
+            if msg.method == 'UpdateForAddPolicy':
+                rules = [params]
+                model.add_policy(msg.sec, msg.ptype, params)
+            elif msg.method == 'UpdateForRemovePolicy':
+                rules = [params]
+                model.remove_policy(msg.sec, msg.ptype, params)
+            elif msg.method == 'UpdateForAddPolicies':
+                rules = params
+                model.add_policies(msg.sec, msg.ptype, rules)
+            elif msg.method == 'UpdateForRemovePolicies':
+                rules = params
+                model.remove_policies(msg.sec, msg.ptype, rules)
+            elif msg.method == 'UpdateForRemoveFilteredPolicy':
+                model.remove_filtered_policy(msg.sec, msg.ptype, int(params[0]), *params[1:])
+                if msg.sec == 'g':
+                    self._e.build_role_links()
+                return True
+            else:
+                # Update / UpdateForSavePolicy
+                return False
+
+            if msg.sec == 'g':
+                op = PolicyOp.Policy_add if msg.method.startswith('UpdateForAdd') else PolicyOp.Policy_remove
+                self._e.build_incremental_role_links(op, msg.ptype, rules)
+        return True
 
     def _default_adapter(self) -> Adapter:
         return self._sqlalchemy_adapter
@@ -20,6 +20,8 @@ class RedisHook(BaseHook):
         self.app: Optional[Flask] = app
         self.client = None
         self.raw_client = None
+        # 阻塞命令 (BLPOP/BRPOP/BLMOVE 等) 专用连接, 不设置读超时
+        self.blocking_client = None
 
         if app is not None:
             self.init_app(app)
@@ -39,6 +41,10 @@ class RedisHook(BaseHook):
                 redis_url = redis_url.replace('redis://', f'redis://:{password}@')
         self.client = StrictRedis.from_url(redis_url, decode_responses=True, **connection_kwargs)
         self.raw_client = StrictRedis.from_url(redis_url, **connection_kwargs)
+        self.blocking_client = StrictRedis.from_url(
+            redis_url, decode_responses=True,
+            **dict(connection_kwargs, socket_timeout=None, retry_on_timeout=False)
+        )
         logger.info(f'Initializing redis hook for conn_name {redis_conn_name}')
         self._detect_connectivity()
     @staticmethod
@@ -108,5 +114,14 @@ class RedisHook(BaseHook):
         from backend.mini_core.utils.base import datetime_handler
         return self.client.lpush(queue_name, json.dumps(msg, default=datetime_handler))
 
+    def push_data_batch(self, queue_name: str, msgs: List[dict]):
+        """一次 LPUSH 推送多条消息"""
+        if not msgs:
+            return 0
+        from backend.mini_core.utils.base import datetime_handler
+        return self.client.lpush(
+            queue_name, *[json.dumps(msg, default=datetime_handler) for msg in msgs]
+        )
+
     def pop_data(self, queue_name):
         return self.client.rpop(queue_name)
@@ -1,8 +1,12 @@
+import base64
+import datetime as dt
+import decimal
+import json
 from abc import abstractmethod
 from dataclasses import asdict
-from typing import Any, Dict, List, NoReturn, Optional, Sequence, Tuple, Type,Union
+from typing import Any, Dict, Iterable, List, NamedTuple, NoReturn, Optional, Sequence, Tuple, Type,Union
 from flask import g
-from sqlalchemy import asc, desc, or_
+from sqlalchemy import and_, asc, desc, inspect, or_
 from sqlalchemy.orm import Session
 
 from kit.domain.entity import Entity,EntityInt
@@ -10,7 +14,82 @@ from kit.exceptions import ServiceBadRequest
 from kit.message import GlobalMessage
 from kit.repository.generic import GenericRepository
 
-__all__ = ['SQLARepository']
+__all__ = ['SQLARepository', 'KeysetPage', 'Record', 'Relation', 'encode_cursor', 'decode_cursor']
+
+
+class Record(dict):
+    """投影查询返回的轻量行对象，可以像实体一样按属性访问，也可以直接序列化"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class Relation(NamedTuple):
+    """
+    仓储声明的关联关系，用于 prefetch 批量预加载
+
+    model: 关联实体
+    local_key: 当前实体上的关联字段
+    remote_key: 关联实体上的字段
+    many: 是否一对多，为 False 时只取第一条
+    """
+    model: Type[Entity]
+    local_key: str
+    remote_key: str
+    many: bool = True
+
+
+class KeysetPage(list):
+    """游标分页结果，next_cursor 为 None 表示没有下一页"""
+
+    def __init__(self, items, next_cursor: Optional[str] = None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def _encode_value(value):
+    if isinstance(value, dt.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, dt.date):
+        return {'d': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return dt.datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return dt.date.fromisoformat(value['d'])
+        if 'dec' in value:
+            return decimal.Decimal(value['dec'])
+    return value
+
+
+def encode_cursor(ordering: List[str], values: Sequence[Any]) -> str:
+    """把排序字段和最后一行的排序值编码为不透明的游标字符串"""
+    payload = json.dumps({'o': ordering, 'v': [_encode_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, ordering: List[str]) -> List[Any]:
+    """解析游标，排序字段与本次请求不一致时视为无效游标"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        values = [_decode_value(v) for v in payload['v']]
+    except (ValueError, KeyError, TypeError):
+        raise ServiceBadRequest('无效的分页游标')
+    if payload.get('o') != ordering or len(values) != len(ordering):
+        raise ServiceBadRequest('分页游标与排序条件不匹配')
+    return values
 
 
 class SQLARepository(GenericRepository[Entity]):
@@ -38,6 +117,14 @@ class SQLARepository(GenericRepository[Entity]):
     def range_query_params(self) -> Tuple:
         return tuple()
 
+    @property
+    def relations(self) -> Dict[str, Relation]:
+        """可通过 prefetch 参数预加载的关联关系"""
+        return dict()
+
+    # IN 查询每批的最大数量
+    PREFETCH_CHUNK_SIZE = 1000
+
     def get_fields_by_names(self, field_names: List[str] = None) -> List[dict]:
         """
         根据传入的字段名列表，返回对应的数据库查询结果字典列表
@@ -84,13 +171,77 @@ class SQLARepository(GenericRepository[Entity]):
         return result_dicts
 
     def list(self, **kwargs) -> Tuple[List[Entity], int]:
+        """
+        分页查询
+
+        除查询条件外支持:
+            only_fields: 只查询这些字段，返回 Record
+            defer_fields: 不查询这些字段（如大文本、JSON 列），返回 Record
+            prefetch: 需要批量预加载的关联关系名称，见 relations
+        """
+        if kwargs.get('cursor') is not None:
+            return self.keyset_list(**kwargs)
         query = self.get_queryset(**kwargs)
         total = query.count() if kwargs.get('need_total_count') else 0
 
         if kwargs.get('page') and kwargs.get('size'):
             query = self.and_pagination(query, kwargs['page'], kwargs['size'])
 
-        return query.all(), total
+        return self._load(query, **kwargs), total
+    def keyset_list(self, **kwargs) -> Tuple[KeysetPage, int]:
+        """
+        游标分页：按 ordering（末尾自动补 id）定位，用 WHERE 条件跳过已读数据，不使用 OFFSET
+
+        cursor 为空字符串时返回第一页，之后传入上一页结果的 next_cursor；
+        只有 need_total_count 为真时才统计总数；extra_conditions 为调用方追加的过滤条件
+        """
+        ordering = self._keyset_ordering(kwargs.get('ordering'))
+        conditions = self._get_conditions(**kwargs) + list(kwargs.get('extra_conditions') or [])
+        query = self.session.query(self.model).filter(*conditions)
+        total = query.count() if kwargs.get('need_total_count') else 0
+
+        if kwargs.get('cursor'):
+            values = decode_cursor(kwargs['cursor'], ordering)
+            query = query.filter(self._keyset_condition(ordering, values))
+        sort_conditions = list()
+        self._update_ordering(self.model, ordering, sort_conditions)
+
+        size = kwargs.get('size') or 10
+        # 生成游标需要排序字段，投影时补充查询
+        columns = self._projection_columns(**kwargs)
+        if columns is not None:
+            names = {column.key for column in columns}
+            columns += [getattr(self.model, field.lstrip('-')) for field in ordering
+                        if field.lstrip('-') not in names]
+            query = query.with_entities(*columns)
+        rows = self._load(query.order_by(*sort_conditions).limit(size + 1), **kwargs)
+        next_cursor = None
+        if len(rows) > size:
+            rows = rows[:size]
+            last = rows[-1]
+            next_cursor = encode_cursor(ordering, [getattr(last, field.lstrip('-')) for field in ordering])
+        return KeysetPage(rows, next_cursor), total
+
+    def _keyset_ordering(self, ordering: Optional[List[str]]) -> List[str]:
+        """过滤无效排序字段，并以 id 作为最后的排序字段保证顺序唯一"""
+        fields = [field for field in ordering or [] if hasattr(self.model, field.lstrip('-'))]
+        if not any(field.lstrip('-') == 'id' for field in fields):
+            fields.append('-id' if not fields or fields[-1].startswith('-') else 'id')
+        return fields
+
+    def _keyset_condition(self, ordering: List[str], values: List[Any]):
+        """
+        生成 (k1, k2, ..., id) 位于游标之后的条件，支持各字段升降序混合：
+        k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+        """
+        clauses = []
+        for i, field in enumerate(ordering):
+            column = getattr(self.model, field.lstrip('-'))
+            seek = column < values[i] if field.startswith('-') else column > values[i]
+            equals = [getattr(self.model, f.lstrip('-')) == v for f, v in zip(ordering[:i], values[:i])]
+            clauses.append(and_(*equals, seek))
+        return or_(*clauses)
+
     @property
     def get_base_queryset(self):
         queryset = self.session.query(self.model)
@@ -99,11 +250,58 @@ class SQLARepository(GenericRepository[Entity]):
     def get_queryset(self, **kwargs):
         conditions = self._get_conditions(**kwargs)
         sort_conditions = self._get_sort_conditions(**kwargs)
-        return self.session.query(self.model).filter(*conditions).order_by(*sort_conditions)
+        columns = self._projection_columns(**kwargs)
+        query = self.session.query(*columns) if columns is not None else self.session.query(self.model)
+        return query.filter(*conditions).order_by(*sort_conditions)
 
     def get_all(self, **kwargs) -> List[Entity]:
         query = self.get_queryset(**kwargs)
-        return query.all()
+        return self._load(query, **kwargs)
+
+    def _projection_columns(self, only_fields: Optional[Iterable[str]] = None,
+                            defer_fields: Optional[Iterable[str]] = None, **kwargs) -> Optional[list]:
+        """根据 only_fields / defer_fields 计算需要查询的列，没有投影时返回 None"""
+        if not only_fields and not defer_fields:
+            return None
+        names = [attr.key for attr in inspect(self.model).column_attrs]
+        if only_fields:
+            wanted = set(only_fields) | {'id'}
+            names = [name for name in names if name in wanted]
+        if defer_fields:
+            names = [name for name in names if name not in set(defer_fields)]
+        return [getattr(self.model, name) for name in names]
+
+    def _load(self, query, prefetch: Optional[Iterable[str]] = None, **kwargs) -> list:
+        """执行查询，投影结果转换为 Record，并批量预加载关联关系"""
+        if self._projection_columns(**kwargs) is not None:
+            items = [Record(row._asdict()) for row in query.all()]
+        else:
+            items = query.all()
+        if prefetch:
+            self.prefetch(items, prefetch)
+        return items
+
+    def prefetch(self, items: list, names: Iterable[str]) -> list:
+        """
+        为已加载的实体或 Record 批量加载关联数据，每个关联按 IN 查询一次（避免 N+1）
+
+        加载结果以关联名称作为属性挂到每个对象上
+        """
+        for name in names:
+            relation = self.relations.get(name)
+            if relation is None:
+                raise ServiceBadRequest(f'不支持预加载的关联: {name}')
+            keys = list({getattr(item, relation.local_key) for item in items} - {None})
+            remote_column = getattr(relation.model, relation.remote_key)
+            grouped: Dict[Any, list] = {}
+            for i in range(0, len(keys), self.PREFETCH_CHUNK_SIZE):
+                chunk = keys[i:i + self.PREFETCH_CHUNK_SIZE]
+                for related in self.session.query(relation.model).filter(remote_column.in_(chunk)):
+                    grouped.setdefault(getattr(related, relation.remote_key), []).append(related)
+            for item in items:
+                related = grouped.get(getattr(item, relation.local_key), [])
+                setattr(item, name, related if relation.many else (related[0] if related else None))
+        return items
 
     def get_by_id(self, entity_id: int) -> Optional[Entity]:
         if entity_id is None:
@@ -129,6 +327,21 @@ class SQLARepository(GenericRepository[Entity]):
         if commit:
             self.session.commit()
 
+    def bulk_create(self, entities: List[Entity], commit: bool = True) -> int:
+        """
+        批量插入实体 (executemany), 不回填主键, 适用于日志等只写数据
+
+        :param entities: 实体列表
+        :param commit: 是否立即提交事务，默认为True
+        :return: 插入的记录数
+        """
+        if not entities:
+            return 0
+        self.session.bulk_save_objects(entities)
+        if commit:
+            self.session.commit()
+        return len(entities)
+
     def update(
         self,
         entity_id: int,
@@ -206,9 +419,13 @@ class SQLARepository(GenericRepository[Entity]):
         query = self.session.query(self.model).filter(self.model.id.in_(ids))
         return query.all()
 
-    def find_all(self, **kwargs) -> List[Entity]:
+    def find_all(self, only_fields: Optional[Iterable[str]] = None, defer_fields: Optional[Iterable[str]] = None,
+                 prefetch: Optional[Iterable[str]] = None, **kwargs) -> List[Entity]:
         query = self.session.query(self.model).filter_by(**kwargs)
-        return query.all()
+        columns = self._projection_columns(only_fields=only_fields, defer_fields=defer_fields)
+        if columns is not None:
+            query = query.with_entities(*columns)
+        return self._load(query, prefetch=prefetch, only_fields=only_fields, defer_fields=defer_fields)
 
     def flush(self) -> None:
         self.session.flush()
@@ -62,6 +62,8 @@ class ListQueryArgSchema(ArgSchema):
     size = fields.Int(description='每页个数')
     need_total_count = fields.Bool(missing=False, description='是否需要统计计数')
     ordering = fields.DelimitedList(fields.Str(), description='排序字段')
+    cursor = fields.Str(description='游标分页: 首页传空字符串, 之后传上一页返回的 next_cursor')
+    only_fields = fields.DelimitedList(fields.Str(), description='只返回这些字段, 以逗号分割')
 
 
 class MassArgSchema(ArgSchema):
@@ -76,6 +78,7 @@ class RespSchema(Schema):
 
 class ListResultSchema(BaseSchema):
     total = fields.Int(description='总数')
+    next_cursor = fields.Str(allow_none=True, description='游标分页的下一页游标, 为空表示没有更多数据')
 
 
 class UploadArgSchema(ArgSchema):
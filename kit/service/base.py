@@ -25,7 +25,10 @@ class CRUDService(Generic[T], metaclass=ABCMeta):
         if hasattr(g, 'creator'):
             args['creator'] = g.creator
         items, total = self.repo.list(**args)
-        return dict(items=items, total=total)
+        result = dict(items=items, total=total)
+        if hasattr(items, 'next_cursor'):
+            result['next_cursor'] = items.next_cursor
+        return result
 
     def role_list(self, ) -> dict:
         items= self.repo.find_all()
@@ -72,9 +72,41 @@ class Config:
     REDIS_CLUSTER_NODES = env.list('REDIS_CLUSTER_NODES', list())
     REDIS_PASSWORD = env.str('REDIS_PASSWORD', None)
     AREAS = env.list('AREAS', list())
+    # 仪表盘、订单统计快照缓存有效期（秒），超过后返回旧数据并在后台刷新
+    DASHBOARD_CACHE_TTL = env.int('DASHBOARD_CACHE_TTL', 60)
+    # JWT 认证用户及角色数据范围缓存有效期（秒），0 表示不缓存；进程内缓存无法跨进程失效，有效期要短
+    AUTH_CACHE_TTL = env.int('AUTH_CACHE_TTL', 60)
+    AUTH_CACHE_LOCAL_TTL = env.int('AUTH_CACHE_LOCAL_TTL', 5)
+    # 商品目录缓存有效期（秒），0 表示不缓存；进程内缓存有效期，0 表示只使用 Redis
+    CATALOG_CACHE_TTL = env.int('CATALOG_CACHE_TTL', 300)
+    CATALOG_LOCAL_CACHE_TTL = env.int('CATALOG_LOCAL_CACHE_TTL', 0)
+    # 进程内搜索索引拉取增量变更的最小间隔（秒）
+    SEARCH_SYNC_INTERVAL = env.float('SEARCH_SYNC_INTERVAL', 1.0)
+    # 会员等级配置进程内缓存有效期（秒），其他进程修改等级配置后最多延迟该时间生效
+    MEMBER_LEVEL_CACHE_TTL = env.int('MEMBER_LEVEL_CACHE_TTL', 60)
+    # 日志队列可靠消费模式（处理中列表 + 确认 + 死信队列）
+    LOG_QUEUE_RELIABLE = env.bool('LOG_QUEUE_RELIABLE', False)
+    # 待支付订单过期索引分片数, 只能增加不能减少
+    ORDER_EXPIRY_SHARDS = env.int('ORDER_EXPIRY_SHARDS', 1)
+    # 下单时在 Redis 中预占库存，由 sync_stock_reservations 定时写回数据库；关闭时直接更新数据库库存
+    STOCK_RESERVATION_ENABLED = env.bool('STOCK_RESERVATION_ENABLED', True)
+    # 邀请码池目标数量，低于低水位时触发 refill_invite_code_pool 补充
+    INVITE_CODE_POOL_SIZE = env.int('INVITE_CODE_POOL_SIZE', 10000)
+    INVITE_CODE_POOL_LOW_WATERMARK = env.int('INVITE_CODE_POOL_LOW_WATERMARK', 2000)
+    # 邀请码布隆过滤器预计容量和误判率，调整后按新参数重建
+    INVITE_CODE_BLOOM_CAPACITY = env.int('INVITE_CODE_BLOOM_CAPACITY', 1000000)
+    INVITE_CODE_BLOOM_ERROR_RATE = env.float('INVITE_CODE_BLOOM_ERROR_RATE', 0.001)
+    # PSD 模板解析结果进程内缓存有效期（秒），模板文件修改后立即重新解析
+    PSD_TEMPLATE_CACHE_TTL = env.int('PSD_TEMPLATE_CACHE_TTL', 3600)
+    # PSD 文字蒙版进程内缓存有效期（秒）
+    PSD_TEXT_TILE_CACHE_TTL = env.int('PSD_TEXT_TILE_CACHE_TTL', 3600)
+    # 额外的字体目录，优先于系统字体目录，首次渲染时扫描一次
+    FONT_DIRS = env.list('FONT_DIRS', list())
 
     # Casbin
     ENABLE_WATCHER = env.bool('ENABLE_WATCHER', False)
+    # 模型文件路径，未配置时不创建 Enforcer
+    CASBIN_MODEL = env.str('CASBIN_MODEL', None)
 
     # JWT
     JWT_SECRET_KEY = env.str('JWT_SECRET_KEY')
@@ -113,6 +145,8 @@ class Config:
     WECHAT_MULTIPLATFORM_SERIAL = env.str("WECHAT_MULTIPLATFORM_SERIAL")
     SF_CLIENT_CODE = env.str("SF_CLIENT_CODE")
     SF_CHECK_WORD =env.str("SF_CHECK_WORD")
+    # 是否通过 Redis 在多个 worker 之间共享顺丰 AccessToken
+    SF_TOKEN_SHARED = env.bool("SF_TOKEN_SHARED", False)
     # Image_Path = env.path("LOCAL_STORAGE_PATH")
 
 
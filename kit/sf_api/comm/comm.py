@@ -15,11 +15,16 @@ import time
 from copy import copy
 import json
 
+from .token import session, token_cache
+
 URL = "https://bspgw.sf-express.com/std/service"
 HKURL = "https://sfapi-hk.sf-express.com/std/service"
 SANDBOXURL = "https://sfapi-sbox.sf-express.com/std/service"
 TOKEN_URL = "https://sfapi.sf-express.com/oauth2/accessToken"
 TOKEN_SANDBOXURL = "https://sfapi-sbox.sf-express.com/oauth2/accessToken"
+REQUEST_TIMEOUT = 15
+# OAuth2 认证失败 (AccessToken 无效或已过期)
+TOKEN_ERROR_CODES = ('A1011',)
 
 
 class Comm(object):
@@ -30,20 +35,12 @@ class Comm(object):
         self._checkword = instance.checkword
         self._sandbox = instance.sandbox
         self._language = instance.language
-        self.get_access_token()
         return self
 
     def get_access_token(self):
-        """获取AccessToken"""
-        url = f"{TOKEN_SANDBOXURL if self._sandbox else TOKEN_URL}?partnerID={self._clientcode}&secret={self._checkword}&grantType=password"
-        res = requests.post(url, headers={
-            "content-type": "application/x-www-form-urlencoded;charset=UTF-8"
-        }).json()
-        if res['apiResultCode'] == "A1000":
-            self._access_token = res['accessToken']
-        else:
-            raise Exception(
-                f"getting access token error:{res['apiResultCode'],res['apiErrorMsg']}")
+        """获取AccessToken (进程级缓存, 过期前自动刷新)"""
+        self._access_token = token_cache.get(
+            self._clientcode, self._checkword, self._sandbox)
         return self._access_token
 
     def get_public_params(self):
@@ -52,7 +49,7 @@ class Comm(object):
             "partnerID": self._clientcode,
             "requestID": str(uuid.uuid4()),
             "timestamp": int(time.time()),
-            "accessToken": self._access_token
+            "accessToken": self.get_access_token()
         }
         return data
 
@@ -63,13 +60,24 @@ class Comm(object):
         param data: 数据结构
         """
 
-        post_data = self.get_public_params()
         copy_data = copy(data)
 
         for key, value in copy_data.items():
             if value is None:
                 data.pop(key)
 
+        res = self._send(service, data)
+        if res['apiResultCode'] in TOKEN_ERROR_CODES:
+            # 缓存的 token 在到期前被顺丰判定无效, 丢弃后重新获取并重试一次
+            token_cache.invalidate(self._clientcode, self._sandbox)
+            res = self._send(service, data)
+        if res['apiResultCode'] != 'A1000':
+            raise Exception(res['apiErrorMsg'])
+        return json.loads(res['apiResultData'])
+
+    def _send(self, service, data):
+        """发送一次请求, 每次使用新的 requestID 和当前 token"""
+        post_data = self.get_public_params()
         post_data.update({
             "serviceCode": service,
             "msgData": json.dumps(data)
@@ -81,7 +89,4 @@ class Comm(object):
 
         url = SANDBOXURL if self._sandbox else URL
 
-        res = requests.post(url, data=post_data, headers=headers).json()
-        if res['apiResultCode'] != 'A1000':
-            raise Exception(res['apiErrorMsg'])
-        return json.loads(res['apiResultData'])
+        return session.post(url, data=post_data, headers=headers, timeout=REQUEST_TIMEOUT).json()
@@ -2,5 +2,143 @@
 # @Time    : 2022-12-03
 # @Author  : Kevin Kong (kfx2007@163.com)
 
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
 TOKEN_URL = "https://sfapi.sf-express.com/oauth2/accessToken"
-TOKEN_SANDBOXURL = "https://sfapi-sbox.sf-express.com/oauth2/accessToken"
\ No newline at end of file
+TOKEN_SANDBOXURL = "https://sfapi-sbox.sf-express.com/oauth2/accessToken"
+
+# 顺丰接口共用的连接池, 复用 TCP/TLS 连接, 批量查询时避免每次请求重新握手
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+
+
+class TokenCache(object):
+    """
+    进程级 AccessToken 缓存
+
+    按 (clientcode, sandbox) 缓存顺丰 OAuth2 AccessToken:
+    - 遵守接口返回的 expireIn 有效期, 在过期前 refresh_ahead 秒提前刷新
+    - 同一个 key 同时只有一个线程去刷新 (single-flight), 其余线程在旧 token
+      仍有效时直接使用旧 token, 否则等待刷新结果
+    - 绑定 RedisHook 后, token 写入 Redis 供多个 Celery worker 共享, 刷新时使用
+      RedisHook 的分布式锁保证全局只请求一次
+    """
+
+    DEFAULT_EXPIRE_SECONDS = 7200
+    REDIS_KEY_PREFIX = "sf_api:access_token"
+
+    def __init__(self, refresh_ahead=300):
+        self.refresh_ahead = refresh_ahead
+        self._tokens = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self._redis = None
+
+    def bind_redis(self, redis_hook):
+        """绑定 RedisHook, 传入 None 则取消跨进程共享"""
+        self._redis = redis_hook
+
+    def get(self, clientcode, checkword, sandbox=False):
+        """获取有效的 AccessToken, 必要时刷新"""
+        key = (clientcode, bool(sandbox))
+        cached = self._tokens.get(key)
+        now = time.time()
+        if cached and now < cached[1] - self.refresh_ahead:
+            return cached[0]
+
+        lock = self._get_lock(key)
+        # 旧 token 仍在有效期内时不阻塞, 由抢到锁的线程负责刷新
+        if not lock.acquire(blocking=not (cached and now < cached[1])):
+            return cached[0]
+        try:
+            cached = self._tokens.get(key)
+            if cached and time.time() < cached[1] - self.refresh_ahead:
+                return cached[0]
+            token, expires_at = self._refresh(key, checkword)
+            self._tokens[key] = (token, expires_at)
+            return token
+        finally:
+            lock.release()
+
+    def invalidate(self, clientcode, sandbox=False):
+        """使缓存的 token 失效 (例如接口返回 token 无效时)"""
+        key = (clientcode, bool(sandbox))
+        self._tokens.pop(key, None)
+        if self._redis is not None:
+            try:
+                self._redis.client.delete(self._redis_key(key))
+            except Exception:
+                pass
+
+    def _get_lock(self, key):
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _redis_key(self, key):
+        clientcode, sandbox = key
+        return f"{self.REDIS_KEY_PREFIX}:{'sandbox' if sandbox else 'prod'}:{clientcode}"
+
+    def _read_shared(self, key):
+        try:
+            value = self._redis.client.get(self._redis_key(key))
+        except Exception:
+            return None
+        if not value:
+            return None
+        data = json.loads(value)
+        if time.time() >= data['expires_at'] - self.refresh_ahead:
+            return None
+        return data['token'], data['expires_at']
+
+    def _refresh(self, key, checkword):
+        if self._redis is None:
+            return self.fetch(key[0], checkword, key[1])
+
+        shared = self._read_shared(key)
+        if shared:
+            return shared
+
+        lock_name = f"sf_api_token:{key[0]}:{int(key[1])}"
+        identifier = self._redis.acquire_lock(lock_name, acquire_time=10, time_out=10)
+        try:
+            # 其他 worker 可能已在我们等待锁的期间完成刷新
+            shared = self._read_shared(key)
+            if shared:
+                return shared
+            token, expires_at = self.fetch(key[0], checkword, key[1])
+            ttl = max(int(expires_at - time.time()), 1)
+            try:
+                self._redis.client.set(
+                    self._redis_key(key),
+                    json.dumps({'token': token, 'expires_at': expires_at}),
+                    ex=ttl,
+                )
+            except Exception:
+                pass
+            return token, expires_at
+        finally:
+            if identifier:
+                self._redis.release_lock(lock_name, identifier)
+
+    def fetch(self, clientcode, checkword, sandbox=False):
+        """请求顺丰 OAuth2 接口获取 AccessToken, 返回 (token, 过期时间戳)"""
+        url = f"{TOKEN_SANDBOXURL if sandbox else TOKEN_URL}?partnerID={clientcode}&secret={checkword}&grantType=password"
+        res = session.post(url, headers={
+            "content-type": "application/x-www-form-urlencoded;charset=UTF-8"
+        }).json()
+        if res['apiResultCode'] != "A1000":
+            raise Exception(
+                f"getting access token error:{res['apiResultCode'],res['apiErrorMsg']}")
+        expire_in = int(res.get('expireIn') or self.DEFAULT_EXPIRE_SECONDS)
+        return res['accessToken'], time.time() + expire_in
+
+
+token_cache = TokenCache()
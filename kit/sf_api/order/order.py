@@ -143,11 +143,11 @@ class Order(Comm):
         """
         路由查询接口接口-速运类API
 
-        param trackingNumber: 查询号: trackingType=1,则此值为顺丰运单号 如果trackingType=2,则此值为客户订单号
+        param trackingNumber: 查询号: trackingType=1,则此值为顺丰运单号 如果trackingType=2,则此值为客户订单号; 可传列表一次查询多个(最多10个)
         param trackingType: 查询号类别: 1:根据顺丰运单号查询,trackingNumber将被当作顺丰运单号处理 2:根据客户订单号查询,trackingNumber将被当作客户订单号处理
         param methodType: 路由查询类别: 1:标准路由查询 2:定制路由查询
         param referenceNumber: 参考编码(目前针对亚马逊客户,由客户传)
-        param checkPhoneNo: 校验电话号码后四位值;
+        param checkPhoneNo: 校验电话号码后四位值; 查询多个运单时该值需相同
 
         return: 包含节点信息的路由
         """
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+__all__ = ['LocalCache']
+
+
+class LocalCache:
+    """
+    进程内带过期时间的 LRU 缓存，线程安全
+
+    只能在本进程内失效，作为 Redis 前面的一级缓存时有效期要短
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._data: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """获取缓存值，不存在或已过期返回 None"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0 or value is None:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._data if isinstance(key, str) and key.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
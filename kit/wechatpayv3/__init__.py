@@ -19,6 +19,8 @@ class WeChatPay():
                  timeout=None,
                  public_key=None,
                  public_key_id=None,
+                 session=None,
+                 pool_maxsize=10,
                  ):
         """
         :param wechatpay_type: 微信支付类型，示例值:WeChatPayType.MINIPROG
@@ -35,6 +37,8 @@ class WeChatPay():
         :param timeout: 超时时间，示例值：(10, 30), 10为建立连接的最大超时时间，30为读取响应的最大超时实践
         :param public_key: 微信支付平台公钥，示例值:'MIIEvwIBADANBgkqhkiG9w0BAQE...'
         :param public_key_id: 微信支付平台公钥id，示例值：'PUB_KEY_ID_444F4864EA9B34415...'
+        :param session: 自定义的requests.Session，不传则创建带连接池的Session
+        :param pool_maxsize: 连接池最大连接数，示例值：20
         """
         from .core import Core
 
@@ -51,7 +55,9 @@ class WeChatPay():
                           proxy=proxy,
                           timeout=timeout,
                           public_key=public_key,
-                          public_key_id=public_key_id)
+                          public_key_id=public_key_id,
+                          session=session,
+                          pool_maxsize=pool_maxsize)
         self._partner_mode = partner_mode
 
     def sign(self, data, sign_type=SignType.RSA_SHA256):
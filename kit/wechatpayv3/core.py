@@ -5,6 +5,7 @@ import os
 from datetime import datetime, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from .type import RequestType, SignType
 from .utils import (aes_decrypt, build_authorization, hmac_sign, load_public_key,
@@ -13,8 +14,9 @@ from .utils import (aes_decrypt, build_authorization, hmac_sign, load_public_key
 
 
 class Core():
-    def __init__(self, mchid, cert_serial_no, private_key, apiv3_key, cert_dir=None, logger=None, proxy=None, timeout=None, public_key=None, public_key_id=None):
+    def __init__(self, mchid, cert_serial_no, private_key, apiv3_key, cert_dir=None, logger=None, proxy=None, timeout=None, public_key=None, public_key_id=None, session=None, pool_maxsize=10):
         self._proxy = proxy
+        self._session = session or self._create_session(pool_maxsize)
         self._mchid = mchid
         self._cert_serial_no = cert_serial_no
         self._private_key = load_private_key(private_key)
@@ -30,6 +32,14 @@ class Core():
         if not self._public_key:
             self._init_certificates()
 
+    @staticmethod
+    def _create_session(pool_maxsize):
+        # 长连接复用, 避免每次请求重新进行TLS握手
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        return session
+
     def _update_certificates(self):
         path = '/v3/certificates'
         self._certificates.clear()
@@ -125,7 +135,8 @@ class Core():
             return False
         return True
 
-    def request(self, path, method=RequestType.GET, data=None, skip_verify=False, sign_data=None, files=None, cipher_data=False, headers={}):
+    def request(self, path, method=RequestType.GET, data=None, skip_verify=False, sign_data=None, files=None, cipher_data=False, headers=None):
+        headers = dict(headers) if headers else {}
         if files:
             headers.update({'Content-Type': 'multipart/form-data'})
         else:
@@ -149,15 +160,15 @@ class Core():
             self._logger.debug('Request headers: %s' % headers)
             self._logger.debug('Request params: %s' % data)
         if method == RequestType.GET:
-            response = requests.get(url=self._gate_way + path, headers=headers, proxies=self._proxy, timeout=self._timeout)
+            response = self._session.get(url=self._gate_way + path, headers=headers, proxies=self._proxy, timeout=self._timeout)
         elif method == RequestType.POST:
-            response = requests.post(url=self._gate_way + path, json=None if files else data, data=data if files else None, headers=headers, files=files, proxies=self._proxy, timeout=self._timeout)
+            response = self._session.post(url=self._gate_way + path, json=None if files else data, data=data if files else None, headers=headers, files=files, proxies=self._proxy, timeout=self._timeout)
         elif method == RequestType.PATCH:
-            response = requests.patch(url=self._gate_way + path, json=data, headers=headers, proxies=self._proxy, timeout=self._timeout)
+            response = self._session.patch(url=self._gate_way + path, json=data, headers=headers, proxies=self._proxy, timeout=self._timeout)
         elif method == RequestType.PUT:
-            response = requests.put(url=self._gate_way + path, json=data, headers=headers, proxies=self._proxy, timeout=self._timeout)
+            response = self._session.put(url=self._gate_way + path, json=data, headers=headers, proxies=self._proxy, timeout=self._timeout)
         elif method == RequestType.DELETE:
-            response = requests.delete(url=self._gate_way + path, headers=headers, proxies=self._proxy, timeout=self._timeout)
+            response = self._session.delete(url=self._gate_way + path, headers=headers, proxies=self._proxy, timeout=self._timeout)
         else:
             raise Exception('wechatpayv3 does no support this request type.')
         if self._logger:
@@ -19,11 +19,17 @@ imports = (
     'task.log',
     'task.user_log_processor',
     'task.dongwen_logistics',
-    'task.order_tasks'  # 添加订单任务模块
+    'task.order_tasks',  # 添加订单任务模块
+    'task.order_expiry',
+    'task.dashboard_stats',
+    'task.distribution_tasks',
+    'task.stock_reservation',
+    'task.invite_code',
 )
 
 worker_ready_handlers = ['task.user_log_processor.start_consumer',
-                         "task.order_tasks.start_consumer"]
+                         "task.order_tasks.start_consumer",
+                         "task.order_expiry.start_order_expiry_worker"]
 
 # 添加新的定时任务到 beat_schedule
 beat_schedule = {
@@ -36,4 +42,29 @@ beat_schedule = {
         'task': 'auto_complete_delivered_orders',
         'schedule': crontab(minute=0, hour='*'),  # 每小时整点执行
     },
+    # 过期订单兜底清理（正常由 order_expiry_worker 实时处理）
+    'cleanup-expired-orders': {
+        'task': 'cleanup_expired_orders',
+        'schedule': crontab(minute='*/5'),
+    },
+    # 仪表盘订单小时汇总
+    'refresh-order-stats-rollup': {
+        'task': 'refresh_order_stats_rollup',
+        'schedule': crontab(minute='*/10'),
+    },
+    # 仪表盘、订单统计快照后台刷新
+    'refresh-dashboard-snapshots': {
+        'task': 'refresh_dashboard_snapshots',
+        'schedule': crontab(minute='*'),
+    },
+    # 库存预占变化写回商品表
+    'sync-stock-reservations': {
+        'task': 'sync_stock_reservations',
+        'schedule': 10.0,
+    },
+    # 邀请码池兜底补充（正常由注册时低水位触发）
+    'refill-invite-code-pool': {
+        'task': 'refill_invite_code_pool',
+        'schedule': crontab(minute='*/5'),
+    },
 }
@@ -0,0 +1,21 @@
+# task/dashboard_stats.py
+
+from loguru import logger
+
+from backend.mini_core.service import dashboard_service
+from backend.mini_core.utils.redis_utils.snapshot_cache import SnapshotCache
+from task import celery
+
+
+@celery.task(name='refresh_order_stats_rollup')
+def refresh_order_stats_rollup(lookback_hours=None):
+    """增量刷新仪表盘使用的订单小时汇总表"""
+    written = dashboard_service.refresh_order_stats(lookback_hours)
+    logger.info(f"订单小时汇总刷新完成, 写入 {written} 个小时")
+    return written
+
+
+@celery.task(name='refresh_dashboard_snapshots')
+def refresh_dashboard_snapshots():
+    """后台刷新仪表盘、订单统计快照，使请求基本只命中缓存"""
+    return SnapshotCache.refresh_all()
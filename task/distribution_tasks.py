@@ -0,0 +1,14 @@
+# task/distribution_tasks.py
+
+from loguru import logger
+
+from backend.mini_core.repository import distribution_sqla_repo
+from task import celery
+
+
+@celery.task(name='rebuild_distribution_closure')
+def rebuild_distribution_closure():
+    """手动触发：根据 la_distribution 全量重建分销层级闭包表（首次上线或数据修复时使用）"""
+    written = distribution_sqla_repo.rebuild_closure()
+    logger.info(f"分销闭包表重建完成, 写入 {written} 条关系")
+    return written
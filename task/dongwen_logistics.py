@@ -8,9 +8,11 @@
 """
 
 
-import datetime as dt
-import requests
-import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
 from loguru import logger
 from task import celery
 from celery.signals import worker_ready
@@ -20,10 +22,64 @@ from flask import current_app
 
 
 from kit.sf_api.api import SF
+from kit.sf_api.comm.token import token_cache
+
+class RoutePollStats:
+    """单次轨迹轮询的吞吐与延迟统计"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.total = 0
+        self.skipped = 0
+        self.requests = 0
+        self.failed_requests = 0
+        self.no_route = 0
+        self.unchanged = 0
+        self.updated = 0
+        self.latencies: List[float] = []
+
+    def add_request(self, latency: float, ok: bool = True):
+        self.requests += 1
+        self.latencies.append(latency)
+        if not ok:
+            self.failed_requests += 1
+
+    def _percentile(self, ratio: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(int(len(ordered) * ratio), len(ordered) - 1)
+        return ordered[index]
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started_at
+        polled = self.total - self.skipped
+        return {
+            'total': self.total,
+            'skipped': self.skipped,
+            'requests': self.requests,
+            'failed_requests': self.failed_requests,
+            'no_route': self.no_route,
+            'unchanged': self.unchanged,
+            'updated': self.updated,
+            'elapsed_seconds': round(elapsed, 3),
+            'waybills_per_second': round(polled / elapsed, 2) if elapsed else 0.0,
+            'latency_p50_ms': round(self._percentile(0.5) * 1000, 1),
+            'latency_p95_ms': round(self._percentile(0.95) * 1000, 1),
+            'latency_max_ms': round(max(self.latencies, default=0.0) * 1000, 1),
+        }
+
 
 class LogisticsTrackingTask:
     """物流轨迹更新定时任务"""
 
+    # 顺丰路由查询接口单次最多支持 10 个运单号
+    BATCH_SIZE = 10
+    # 同时进行的查询请求数
+    MAX_WORKERS = 8
+    # 每累计多少条变更写一次库
+    FLUSH_SIZE = 200
+
     def __init__(self):
         """初始化任务"""
         self.app = current_app
@@ -31,102 +87,164 @@ class LogisticsTrackingTask:
         # 从配置中获取顺丰API凭证
         self.sf_client_code = self.app.config.get('SF_CLIENT_CODE')
         self.sf_check_word = self.app.config.get('SF_CHECK_WORD')
+        self.batch_size = self.app.config.get('SF_ROUTE_BATCH_SIZE', self.BATCH_SIZE)
+        self.max_workers = self.app.config.get('SF_ROUTE_MAX_WORKERS', self.MAX_WORKERS)
+
+        # AccessToken 由进程级缓存维护, 开启共享后所有 worker 共用同一个 token
+        if self.app.config.get('SF_TOKEN_SHARED'):
+            from backend.extensions import redis
+            token_cache.bind_redis(redis)
 
         # 初始化顺丰API客户端
         self.sf_client = SF(self.sf_client_code,  self.sf_check_word)
 
-    def run(self):
+    @staticmethod
+    def _is_sf(logistics) -> bool:
+        company = logistics.logistics_company or ""
+        return "顺丰" in company or "SF" in company.upper()
+
+    @staticmethod
+    def _phone_last_four(logistics) -> Optional[str]:
+        # 可以从订单中获取手机号后四位提高准确性
+        receiver_info = logistics.receiver_info
+        if not isinstance(receiver_info, dict):
+            return None
+        phone = receiver_info.get("phone", "") or ""
+        return phone[-4:] if len(phone) >= 4 else None
+
+    def _make_batches(self, logistics_orders) -> List[Tuple[Optional[str], List[str]]]:
+        """
+        按手机号后四位分组并切分批次
+
+        顺丰接口要求一次查询多个运单时 checkPhoneNo 必须相同, 所以先按后四位分组,
+        再按 batch_size 切分
+        """
+        groups: Dict[Optional[str], List[str]] = defaultdict(list)
+        for logistics in logistics_orders:
+            groups[self._phone_last_four(logistics)].append(logistics.logistics_no)
+
+        batches = []
+        for phone, numbers in groups.items():
+            # 同一运单可能对应多条物流记录, 只查询一次
+            numbers = list(dict.fromkeys(numbers))
+            for i in range(0, len(numbers), self.batch_size):
+                batches.append((phone, numbers[i:i + self.batch_size]))
+        return batches
+
+    def _query_batch(self, phone: Optional[str], numbers: List[str]) -> Tuple[Dict[str, list], float, Optional[Exception]]:
+        """查询一个批次的路由, 返回 {运单号: 路由列表}, 耗时, 异常"""
+        started = time.perf_counter()
+        try:
+            order_result = self.sf_client.order.get_route_info(
+                trackingNumber=numbers,
+                checkPhoneNo=phone,)
+        except Exception as e:
+            return {}, time.perf_counter() - started, e
+
+        routes_by_no = {}
+        for resp in order_result.get("msgData", {}).get("routeResps", []) or []:
+            mail_no = resp.get("mailNo")
+            if mail_no:
+                routes_by_no[mail_no] = resp.get("routes") or []
+        return routes_by_no, time.perf_counter() - started, None
+
+    @staticmethod
+    def _build_update(logistics, routes: list) -> Optional[Dict[str, Any]]:
+        """与已保存的轨迹比较, 有变化时返回待更新的列"""
+        # 按时间排序（从新到旧）
+        routes = sorted(routes, key=lambda x: x.get("acceptTime", ""), reverse=True)
+        latest_route = routes[0]
+        current_accept_time = latest_route.get("acceptTime", "")
+
+        logistics_route_data = logistics.logistics_route
+        if logistics_route_data and len(logistics_route_data) == len(routes):
+            if logistics_route_data[0].get("time") == current_accept_time:
+                return None
+
+        # 准备新的轨迹数据以及当前状态
+        new_route_items = [{
+            "time": route.get("acceptTime", ""),
+            "status": f"{route.get('firstStatusName', '')}-{route.get('secondaryStatusName', '')}",
+            "location": route.get("acceptAddress", ""),
+            "remark": route.get("remark", "")
+        } for route in routes]
+
+        current_status = latest_route.get("firstStatusName") or "运输中"
+        mapping = {
+            'id': logistics.id,
+            'logistics_route': new_route_items,
+            'current_status': current_status,
+        }
+        current_location = latest_route.get("acceptAddress")
+        if current_location:
+            mapping['current_location'] = current_location
+        if current_status == "已签收" and current_accept_time:
+            mapping['receiving_time'] = current_accept_time
+        return mapping
+
+    def run(self) -> Dict[str, Any]:
         """运行任务"""
         logger.info("======开始执行物流轨迹更新任务======")
+        stats = RoutePollStats()
         # 获取所有需要更新的物流订单
         from backend.mini_core.repository import shop_order_logistics_sqla_repo
         data_args= {   'current_status': ['已发货','运送中'],'days': 7}
         logistics_orders = shop_order_logistics_sqla_repo.get_con_logistics(kwargs=data_args)
+        stats.total = len(logistics_orders)
         logger.info(f"找到 {len(logistics_orders)} 个需要更新的物流订单")
 
-        # 更新每个订单的物流信息
-        from backend.mini_core.service import shop_order_logistics_service
-        for logistics in logistics_orders:
-
-            # 只处理顺丰快递
-            if "顺丰" not in logistics.logistics_company and "SF" not in logistics.logistics_company.upper():
-                logger.info(
-                    f"跳过非顺丰物流订单: {logistics.order_no}, 物流公司: {logistics.logistics_company}")
-                continue
-
-            # 查询物流轨迹
-            # 可以从订单中获取手机号后四位提高准确性
-            phone_last_four = None
-            if logistics.receiver_info:
-                try:
-                    receiver_info = logistics.receiver_info
-                    phone = receiver_info.get("phone", "")
-                    if phone and len(phone) >= 4:
-                        phone_last_four = phone[-4:]
-                except:
-                    pass
-            logistics_no= logistics.logistics_no
-            order_result = self.sf_client.order.get_route_info(
-                trackingNumber=logistics_no,
-                checkPhoneNo=phone_last_four,)
-            print(self.sf_client_code,self.sf_check_word,logistics_no,phone_last_four)
-
-            routes = order_result.get("msgData", {}).get("routeResps", [{}])[0].get("routes", [])
-
-            # if not routes:
-            #     continue
-
-            # 按时间排序（从新到旧）
-            routes.sort(key=lambda x: x.get("acceptTime", ""), reverse=True)
-            if not routes:
-                continue
-            # 获取最新节点
-            latest_route = routes[0]
-
-            # 准备新的轨迹数据以及当前状态
-            new_route_items = []
-            for route in routes:
-                new_route_items.append({
-                    "time": route.get("acceptTime", ""),
-                    "status": f"{route.get('firstStatusName', '')}-{route.get('secondaryStatusName', '')}",
-                    "location": route.get("acceptAddress", ""),
-                    "remark": route.get("remark", "")
-                })
-
-            # 更新物流数据
-            current_status = latest_route.get("firstStatusName", "运输中")
-            current_location = latest_route.get("acceptAddress", "")
-            current_accept_time = latest_route.get("acceptTime", "")
-            logistics_route_data = logistics.logistics_route
-            if logistics_route_data:
-                logistics_cur_route = logistics_route_data[0]
-                lo_time =logistics_cur_route["time"]
-                if current_accept_time == lo_time:
-                    logger.info(f"物流订单 {logistics.order_no} 的轨迹信息没有更新{current_accept_time},{lo_time}")
+        # 只处理顺丰快递
+        sf_orders = [logistics for logistics in logistics_orders
+                     if logistics.logistics_no and self._is_sf(logistics)]
+        stats.skipped = stats.total - len(sf_orders)
+
+        by_no: Dict[str, list] = defaultdict(list)
+        for logistics in sf_orders:
+            by_no[logistics.logistics_no].append(logistics)
+
+        batches = self._make_batches(sf_orders)
+        pending: List[Dict[str, Any]] = []
+
+        # HTTP 查询并发执行, 数据库写入留在当前线程 (持有应用上下文与 session)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._query_batch, phone, numbers): numbers
+                       for phone, numbers in batches}
+            for future in as_completed(futures):
+                numbers = futures[future]
+                routes_by_no, latency, error = future.result()
+                stats.add_request(latency, ok=error is None)
+                if error is not None:
+                    logger.error(f"查询物流轨迹失败: {numbers}, {error}")
                     continue
-            args = dict(route_info=new_route_items, current_status=current_status,
-                        current_location=current_location, )
-            if current_status == "已签收":
-                receiving_time = latest_route.get("acceptTime", )
-                args["receiving_time"] = receiving_time
-
-            shop_order_logistics_sqla_repo.update_logistics_route(
-                logistics.id,
-                args=args)
 
-            logger.info(f"成功更新物流订单 {logistics.order_no} 的轨迹信息")
+                for logistics_no in numbers:
+                    routes = routes_by_no.get(logistics_no)
+                    for logistics in by_no[logistics_no]:
+                        if not routes:
+                            stats.no_route += 1
+                            continue
+                        mapping = self._build_update(logistics, routes)
+                        if mapping is None:
+                            stats.unchanged += 1
+                            continue
+                        pending.append(mapping)
 
+                if len(pending) >= self.FLUSH_SIZE:
+                    stats.updated += shop_order_logistics_sqla_repo.bulk_update_logistics_routes(pending)
+                    pending = []
 
+        stats.updated += shop_order_logistics_sqla_repo.bulk_update_logistics_routes(pending)
 
+        result = stats.as_dict()
+        logger.info(f"物流轨迹更新任务完成: {result}")
+        return result
 
 
 @celery.task
 def update_logistics_task():
 
     task = LogisticsTrackingTask()
-    task.run()
-    # task = LogisticsTrackingTask()
-    # task.run()
+    return task.run()
 
 
 @worker_ready.connect
@@ -0,0 +1,16 @@
+# task/invite_code.py
+
+from loguru import logger
+
+from backend.mini_core.repository import shop_user_sqla_repo
+from backend.mini_core.utils.redis_utils.invite_code_pool import invite_code_pool
+from task import celery
+
+
+@celery.task(name='refill_invite_code_pool')
+def refill_invite_code_pool():
+    """把邀请码池补充到目标数量"""
+    added = invite_code_pool.refill(shop_user_sqla_repo.iter_invite_codes)
+    if added:
+        logger.info(f"邀请码池补充完成, 新增 {added} 个邀请码")
+    return added
@@ -0,0 +1,181 @@
+# task/order_expiry.py
+"""
+待支付订单超时处理
+
+过期处理 worker 按 order_expiry_index 中最早到期的时间精确休眠，
+到期后批量关闭订单并回补库存。过期索引按订单号分片，
+多个 worker 通过 Redis 租约分配分片，同一分片同一时间只有一个 worker 处理。
+"""
+
+import math
+import os
+import socket
+import time
+import uuid
+from typing import Set
+
+from celery.signals import worker_ready
+from flask import current_app
+from loguru import logger
+
+from backend.extensions import redis
+from backend.mini_core.utils.redis_utils.order_queue import RedisOrderQueue
+from task import celery
+
+# 续租: 仍由自己持有则延长过期时间
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# 释放: 仍由自己持有才删除
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class OrderExpiryWorker:
+    """待支付订单过期处理 worker"""
+
+    LEASE_KEY_PREFIX = "order_expiry_worker:shard:"
+    WORKERS_KEY = "order_expiry_workers"
+    # 分片租约有效期（秒），worker 崩溃后其分片最多在这个时间后被接管
+    LEASE_SECONDS = 30
+    # 没有待处理订单时最长阻塞时间（秒）
+    MAX_IDLE_SECONDS = 10
+
+    def __init__(self, chunk_size: int = RedisOrderQueue.CLEANUP_CHUNK_SIZE):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.chunk_size = chunk_size
+        self.shards = RedisOrderQueue.shard_count()
+        self.owned: Set[int] = set()
+        self.next_rebalance = 0.0
+        self._renew = redis.client.register_script(RENEW_LEASE_SCRIPT)
+        self._release = redis.client.register_script(RELEASE_LEASE_SCRIPT)
+        self.stats = {"closed": 0, "rounds": 0, "errors": 0}
+
+    def _lease_key(self, shard: int) -> str:
+        return f"{self.LEASE_KEY_PREFIX}{shard}"
+
+    def rebalance(self) -> None:
+        """续租已持有的分片，并按存活 worker 数均分分片"""
+        now = time.time()
+        pipe = redis.client.pipeline(transaction=False)
+        pipe.zadd(self.WORKERS_KEY, {self.worker_id: now})
+        pipe.zremrangebyscore(self.WORKERS_KEY, '-inf', now - self.LEASE_SECONDS)
+        pipe.zcard(self.WORKERS_KEY)
+        live_workers = max(pipe.execute()[-1], 1)
+        target = math.ceil(self.shards / live_workers)
+
+        lease_ms = self.LEASE_SECONDS * 1000
+        for shard in list(self.owned):
+            if not self._renew(keys=[self._lease_key(shard)], args=[self.worker_id, lease_ms]):
+                self.owned.discard(shard)
+
+        # 新 worker 加入后释放多余的分片，由其他 worker 接管
+        while len(self.owned) > target:
+            shard = max(self.owned)
+            self._release(keys=[self._lease_key(shard)], args=[self.worker_id])
+            self.owned.discard(shard)
+
+        for shard in range(self.shards):
+            if len(self.owned) >= target:
+                break
+            if shard in self.owned:
+                continue
+            if redis.client.set(self._lease_key(shard), self.worker_id, nx=True, px=lease_ms):
+                self.owned.add(shard)
+
+        self.next_rebalance = now + self.LEASE_SECONDS / 3
+
+    def shutdown(self) -> None:
+        for shard in self.owned:
+            self._release(keys=[self._lease_key(shard)], args=[self.worker_id])
+        self.owned.clear()
+        redis.client.zrem(self.WORKERS_KEY, self.worker_id)
+
+    def run_once(self) -> float:
+        """
+        处理已持有分片中所有到期订单
+
+        Returns:
+            float: 距离下一个订单到期的秒数
+        """
+        shards = sorted(self.owned)
+        closed = RedisOrderQueue.cleanup_expired_orders(self.chunk_size, shards=shards)
+        self.stats["closed"] += closed
+        self.stats["rounds"] += 1
+        if closed:
+            logger.info(f"过期订单处理: 分片 {shards} 关闭 {closed} 个订单")
+
+        next_due = None
+        for shard in shards:
+            due = RedisOrderQueue.next_expiry_time(shard)
+            if due is not None and (next_due is None or due < next_due):
+                next_due = due
+        if next_due is None:
+            return float(self.MAX_IDLE_SECONDS)
+        return max(next_due - time.time(), 0.0)
+
+    def wait(self, timeout: float) -> None:
+        """阻塞到下一个订单到期、有新订单写入或需要续租为止"""
+        timeout = min(timeout, self.MAX_IDLE_SECONDS, max(self.next_rebalance - time.time(), 0.0))
+        if timeout <= 0:
+            return
+        if not self.owned or timeout < 1:
+            time.sleep(timeout)
+            return
+        keys = [RedisOrderQueue.wakeup_key(shard) for shard in sorted(self.owned)]
+        # BLPOP 在旧版本 Redis 上只支持整数秒
+        redis.blocking_client.blpop(keys, timeout=int(timeout))
+
+    def run_forever(self) -> None:
+        logger.info(f"订单过期处理 worker {self.worker_id} 启动, 分片总数 {self.shards}")
+        try:
+            while True:
+                if time.time() >= self.next_rebalance:
+                    self.rebalance()
+                timeout = float(self.MAX_IDLE_SECONDS)
+                if self.owned:
+                    try:
+                        timeout = self.run_once()
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        logger.error(f"过期订单处理出错: {str(e)}")
+                        timeout = 1.0
+                self.wait(timeout)
+        finally:
+            self.shutdown()
+
+
+@celery.task(bind=True)
+def order_expiry_worker(self):
+    """常驻任务: 按到期时间关闭超时未支付订单并回补库存"""
+    worker = OrderExpiryWorker(
+        chunk_size=current_app.config.get('ORDER_EXPIRY_CHUNK_SIZE', RedisOrderQueue.CLEANUP_CHUNK_SIZE)
+    )
+    try:
+        worker.run_forever()
+    except Exception as e:
+        logger.error(f"订单过期处理 worker 异常终止: {str(e)}")
+        raise self.retry(exc=e, countdown=5)
+
+
+@celery.task(name='cleanup_expired_orders')
+def cleanup_expired_orders():
+    """兜底定时任务: 清理所有分片中已过期的订单"""
+    closed = RedisOrderQueue.cleanup_expired_orders()
+    if closed:
+        logger.info(f"定时清理过期订单 {closed} 个")
+    return closed
+
+
+@worker_ready.connect
+def start_order_expiry_worker(sender, **kwargs):
+    logger.info("Worker 准备就绪，启动订单过期处理任务")
+    order_expiry_worker.delay()
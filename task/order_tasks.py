@@ -1,137 +1,136 @@
 import datetime as dt
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Optional
 from celery import current_app
 from task import celery
 from celery.signals import worker_ready
+from backend.extensions import redis
 from backend.mini_core.repository import shop_order_sqla_repo
 from backend.mini_core.service import shop_order_service
 from backend.mini_core.utils.redis_utils.log_queue import LogQueue
 from loguru import logger
 
+# 自动完成订单的进度，任务中断后重新执行时从这里继续
+AUTO_COMPLETE_CHECKPOINT_KEY = "order_auto_complete:checkpoint"
+AUTO_COMPLETE_LOCK_NAME = "order_auto_complete"
+AUTO_COMPLETE_CHUNK_SIZE = 500
+# 进度最多保留的失败订单数
+AUTO_COMPLETE_MAX_FAILED_ORDERS = 100
+
+
+def _load_checkpoint() -> Optional[Dict[str, Any]]:
+    value = redis.client.get(AUTO_COMPLETE_CHECKPOINT_KEY)
+    return json.loads(value) if value else None
+
+
+def _save_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    redis.client.set(AUTO_COMPLETE_CHECKPOINT_KEY, json.dumps(checkpoint, ensure_ascii=False),
+                     ex=7 * 24 * 60 * 60)
+
+
 @celery.task(name='auto_complete_delivered_orders')
-def auto_complete_delivered_orders():
+def auto_complete_delivered_orders(chunk_size: int = AUTO_COMPLETE_CHUNK_SIZE):
     """
     自动完成已发货订单的定时任务
     查找发货状态为"已发货"且transaction_time在最近14天内且payment_no存在的订单
     将其状态变更为"已完成"并奖励积分
+
+    按订单 ID 分批处理，每批一个事务；每批完成后记录进度（最后处理的订单 ID、成功和失败数），
+    任务中断后重新执行时沿用同一时间范围从断点继续
     """
-    try:
-        # 计算14天前的时间
-        fourteen_days_ago = dt.datetime.now() - dt.timedelta(days=14)
-
-        # 查询条件
-        query_conditions = {
-            'delivery_status': '已发货',
-            'transaction_time': [fourteen_days_ago, dt.datetime.now()],
-            'payment_no__isnull': False  # payment_no 不为空
-        }
+    identifier = redis.acquire_lock(AUTO_COMPLETE_LOCK_NAME, acquire_time=0.01, time_out=30 * 60)
+    if not identifier:
+        return {'status': 'skipped', 'message': '自动完成订单任务正在执行', 'processed_count': 0}
 
-        # 调用Repository层方法查询符合条件的订单
-        orders = shop_order_sqla_repo.get_and_complete_delivered_orders(fourteen_days_ago)
-
-        if not orders:
-            LogQueue.add_system_log(
-                operation_type='定时任务',
-                operation_desc='自动完成订单任务执行完成，未找到符合条件的订单',
-                operator='system'
-            )
-            return {
-                'status': 'success',
-                'message': '未找到符合条件的订单',
-                'processed_count': 0,
-                'total_found': 0
+    try:
+        checkpoint = _load_checkpoint()
+        if checkpoint:
+            logger.info(f"自动完成订单任务从断点继续: 订单ID > {checkpoint['last_id']}")
+        else:
+            now = dt.datetime.now()
+            checkpoint = {
+                'start_time': (now - dt.timedelta(days=14)).isoformat(),
+                'end_time': now.isoformat(),
+                'last_id': 0,
+                'success_count': 0,
+                'failed_count': 0,
+                'failed_orders': [],
             }
+        start_time = dt.datetime.fromisoformat(checkpoint['start_time'])
+        end_time = dt.datetime.fromisoformat(checkpoint['end_time'])
 
-        success_count = 0
-        failed_count = 0
-        failed_orders = []
-        total_found = len(orders)
+        while True:
+            orders = shop_order_sqla_repo.find_delivered_orders(start_time, end_time, checkpoint['last_id'],
+                                                                chunk_size)
+            if not orders:
+                break
 
-        # 批量处理订单
-        for order in orders:
             try:
-                # 准备更新数据
-                order_update_data = {
-                    'delivery_status': '已签收',
-                    'status': '已完成',
-                    'confirm_time': dt.datetime.now(),
-                    'updater': 'system'
-                }
-
-                # 计算积分奖励
-                actual_amount = order.actual_amount or 0
-                points_reward = float(actual_amount)
-
-                # 获取用户当前积分
-                from backend.mini_core.repository import shop_user_sqla_repo
-                user = shop_user_sqla_repo.find(user_id=order.user_id)
-                if not user:
-                    failed_count += 1
-                    failed_orders.append({
-                        'order_no': order.order_no,
-                        'reason': '用户不存在'
-                    })
-                    continue
-
-                original_points = user.points or 0
-                new_points = original_points + points_reward
-
-                user_update_data = {
-                    'points': new_points
-                }
-
-                # 调用Repository层方法完成订单
-                result = shop_order_sqla_repo.confirm_receipt_with_points(
-                    order.order_no, order_update_data, user_update_data
-                )
-
-                if result.get('code') == 200:
-                    success_count += 1
-
-                    # 记录成功日志
-                    LogQueue.add_order_log(
-                        order_no=order.order_no,
-                        operation_type='自动完成订单',
-                        operation_desc=f'系统自动完成订单，奖励积分 {points_reward} 分',
-                        operator='system',
-                        old_value={
-                            'order_status': '已发货',
-                            'delivery_status': '已发货',
-                            'user_points': original_points
-                        },
-                        new_value={
-                            'order_status': '已完成',
-                            'delivery_status': '已签收',
-                            'user_points': new_points
-                        },
-                        remark=f'定时任务自动处理，支付金额：{actual_amount}元'
-                    )
-                else:
-                    failed_count += 1
-                    failed_orders.append({
-                        'order_no': order.order_no,
-                        'reason': result.get('message', '未知错误')
-                    })
-
+                completed, failed = shop_order_sqla_repo.complete_delivered_orders([order.id for order in orders])
             except Exception as e:
-                failed_count += 1
-                failed_orders.append({
-                    'order_no': order.order_no,
-                    'reason': f'处理异常: {str(e)}'
-                })
-
-        # 记录任务执行结果
-
-        return None
+                logger.error(f"批量自动完成订单失败: {str(e)}")
+                completed, failed = [], [{'order_no': order.order_no, 'reason': f'处理异常: {str(e)}'}
+                                         for order in orders]
+
+            if completed:
+                _push_complete_logs(completed)
+            checkpoint['last_id'] = orders[-1].id
+            checkpoint['success_count'] += len(completed)
+            checkpoint['failed_count'] += len(failed)
+            checkpoint['failed_orders'] = (checkpoint['failed_orders'] + failed)[-AUTO_COMPLETE_MAX_FAILED_ORDERS:]
+            _save_checkpoint(checkpoint)
+
+            if len(orders) < chunk_size:
+                break
+
+        redis.client.delete(AUTO_COMPLETE_CHECKPOINT_KEY)
+        logger.info(
+            f"自动完成订单任务执行完成, 成功 {checkpoint['success_count']}, 失败 {checkpoint['failed_count']}"
+        )
+        return {
+            'status': 'success',
+            'processed_count': checkpoint['success_count'],
+            'failed_count': checkpoint['failed_count'],
+            'failed_orders': checkpoint['failed_orders'],
+        }
 
     except Exception as e:
         error_msg = f'自动完成订单任务执行失败: {str(e)}'
-
+        logger.error(error_msg)
         return {
             'status': 'error',
             'message': error_msg,
             'processed_count': 0
         }
+    finally:
+        redis.release_lock(AUTO_COMPLETE_LOCK_NAME, identifier)
+
+
+def _push_complete_logs(completed: List[Dict[str, Any]]) -> None:
+    """一次推送一批订单的自动完成日志"""
+    operation_time = dt.datetime.now()
+    LogQueue.push_log_dicts([{
+        'op_type': 'order',
+        'data': {
+            'order_no': item['order_no'],
+            'operation_type': '自动完成订单',
+            'operation_desc': f"系统自动完成订单，奖励积分 {item['points_reward']} 分",
+            'operator': 'system',
+            'updater': 'system',
+            'operation_time': operation_time,
+            'old_value': {
+                'order_status': '已发货',
+                'delivery_status': '已发货',
+                'user_points': item['old_points']
+            },
+            'new_value': {
+                'order_status': '已完成',
+                'delivery_status': '已签收',
+                'user_points': item['new_points']
+            },
+            'remark': f"定时任务自动处理，支付金额：{item['actual_amount']}元",
+        }
+    } for item in completed])
 
 @celery.task(name='manual_trigger_auto_complete_orders')
 def manual_trigger_auto_complete_orders():
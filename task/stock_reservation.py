@@ -0,0 +1,16 @@
+# task/stock_reservation.py
+
+from loguru import logger
+
+from backend.mini_core.repository import shop_product_sqla_repo
+from backend.mini_core.utils.redis_utils.stock_reservation import StockReservation
+from task import celery
+
+
+@celery.task(name='sync_stock_reservations')
+def sync_stock_reservations():
+    """把库存预占产生的变化批量写回商品表"""
+    synced = StockReservation.reconcile(shop_product_sqla_repo.apply_stock_deltas)
+    if synced:
+        logger.info(f"库存同步完成, 更新 {synced} 个商品")
+    return synced
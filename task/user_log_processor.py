@@ -1,31 +1,163 @@
 # task/order_log/user_log_processor.py
 
 import json
-import datetime as dt
+import math
+import os
+import socket
 import time
-from typing import Dict, Any, List
+import datetime as dt
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
 from loguru import logger
+from sqlalchemy.exc import DBAPIError, DataError, DisconnectionError, IntegrityError, TimeoutError as SQLATimeoutError
 
 from task import celery
-from backend.extensions import redis
+from backend.extensions import db, redis
+from backend.mini_core.utils.redis_utils.log_queue import LogQueue
 from celery.signals import worker_ready
+from flask import current_app
+
+# 数据库不可用时重试的最大间隔（秒），需小于消费者心跳有效期
+MAX_RETRY_BACKOFF = 30
+
+
+def pop_batch(queue_key: str, max_count: int) -> List[str]:
+    """
+    在一个 MULTI 中用 LRANGE + LTRIM 原子地取出队尾最多 max_count 条消息
+
+    生产者使用 LPUSH，最早的消息在队尾，返回结果按入队先后排序
+    """
+    if max_count <= 0:
+        return []
+    pipe = redis.client.pipeline(transaction=True)
+    pipe.lrange(queue_key, -max_count, -1)
+    pipe.ltrim(queue_key, 0, -max_count - 1)
+    items, _ = pipe.execute()
+    return list(reversed(items))
+
+
+def parse_log_message(raw) -> Tuple[str, Dict[str, Any]]:
+    """解析队列消息，返回 (op_type, data)"""
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+
+    log_entry = json.loads(raw)
+
+    # 从日志条目中提取操作类型和数据
+    op_type = log_entry.get('op_type', '')
+    log_data = log_entry.get('data', {})
+
+    # 处理时间字段
+    if 'operation_time' in log_data and isinstance(log_data['operation_time'], str):
+        try:
+            log_data['operation_time'] = dt.datetime.fromisoformat(log_data['operation_time'])
+        except ValueError:
+            log_data['operation_time'] = dt.datetime.now()
+    return op_type, log_data
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    是否为数据库暂时不可用一类的错误（连接断开、超时、锁等待等），稍后重试即可成功；
+    数据本身有问题（违反约束、字段值非法）或代码异常不属于此类
+    """
+    if isinstance(error, (IntegrityError, DataError)):
+        return False
+    return isinstance(error, (DBAPIError, DisconnectionError, SQLATimeoutError))
+
+
+def write_log_groups(messages: List[str], stats: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    按 op_type 分组，每组一次批量 INSERT
+
+    批量写入因数据问题失败时回滚并逐条重试，只丢弃真正有问题的日志；
+    数据库暂时不可用时不逐条重试，整组留待稍后重试
+
+    Returns:
+        Tuple: (无法处理的消息 [{'message': 原始消息, 'error': 错误信息}], 需要稍后重试的原始消息)
+    """
+    from backend.mini_core.service import order_log_service
+    from backend.mini_core.service import order_return_log_service
+
+    writers = {
+        "order": (order_log_service.batch_create_logs, "order_logs_processed"),
+        "return_order": (order_return_log_service.batch_create_logs, "return_logs_processed"),
+    }
+
+    failed: List[Dict[str, Any]] = []
+    retry: List[str] = []
+    groups: Dict[str, List[Tuple[str, Dict[str, Any]]]] = defaultdict(list)
+    for raw in messages:
+        try:
+            op_type, log_data = parse_log_message(raw)
+        except Exception as e:
+            logger.error(f"解析日志消息出错: {str(e)}")
+            stats["errors"] += 1
+            failed.append({'message': raw, 'error': f"解析失败: {str(e)}"})
+            continue
+        if op_type not in writers:
+            # 未知类型日志
+            logger.warning(f"未知日志类型: {op_type}")
+            stats["errors"] += 1
+            failed.append({'message': raw, 'error': f"未知日志类型: {op_type}"})
+            continue
+        groups[op_type].append((raw, log_data))
+
+    for op_type, items in groups.items():
+        writer, counter = writers[op_type]
+        try:
+            writer([log_data for _, log_data in items])
+            stats[counter] += len(items)
+            stats["total_processed"] += len(items)
+        except Exception as e:
+            db.session.rollback()
+            if is_transient_error(e):
+                logger.error(f"批量写入 {op_type} 日志失败，数据库暂时不可用，稍后重试: {str(e)}")
+                retry.extend(raw for raw, _ in items)
+                continue
+            logger.error(f"批量写入 {op_type} 日志失败，改为逐条写入: {str(e)}")
+            for index, (raw, log_data) in enumerate(items):
+                try:
+                    writer([log_data])
+                    stats[counter] += 1
+                    stats["total_processed"] += 1
+                except Exception as row_error:
+                    db.session.rollback()
+                    if is_transient_error(row_error):
+                        logger.error(f"逐条写入 {op_type} 日志时数据库不可用，稍后重试: {str(row_error)}")
+                        retry.extend(raw for raw, _ in items[index:])
+                        break
+                    logger.error(f"处理日志消息出错: {str(row_error)}")
+                    stats["errors"] += 1
+                    failed.append({'message': raw, 'error': str(row_error)})
+    return failed, retry
+
 
 @celery.task(bind=True)
-def redis_log_consumer(self, queue_key="user_operation_logs", wait_time=1):
+def redis_log_consumer(self, queue_key="user_operation_logs", wait_time=1, batch_size=500, reliable=None):
     """
-    持续监听 Redis 队列并消费日志消息
+    持续监听 Redis 队列并批量消费日志消息
+
+    队列为空时使用 BRPOP 阻塞等待；取到消息后用 LRANGE/LTRIM 一次取出一批，
+    累计到 batch_size 条或距第一条消息超过 wait_time 秒时按类型批量写库
+
+    可靠队列模式下消息先移动到本消费者的处理中列表，写库成功后才确认删除，
+    无法处理的消息转入死信队列；启动时及运行中定期回收已崩溃消费者的处理中消息。
+    该模式下可以同时运行多个消费者
 
     Args:
         queue_key: Redis 队列键名
-        wait_time: 队列为空时等待的秒数
+        wait_time: 刷新间隔（秒），同时也是队列为空时的阻塞时间
+        batch_size: 每次写库的最大消息数
+        reliable: 是否使用可靠队列模式，默认取配置 LOG_QUEUE_RELIABLE
 
     Returns:
         None - 这个任务会持续运行，直到被终止
     """
-    from backend.mini_core.service import order_log_service
-    from backend.mini_core.service import order_return_log_service
-
-    logger.info(f"开始监听 Redis 队列 '{queue_key}'")
+    if reliable is None:
+        reliable = current_app.config.get('LOG_QUEUE_RELIABLE', False)
+    consumer_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"开始监听 Redis 队列 '{queue_key}'" + (f", 可靠模式消费者 {consumer_id}" if reliable else ""))
 
     # 处理日志消息的统计信息
     stats = {
@@ -33,67 +165,78 @@ def redis_log_consumer(self, queue_key="user_operation_logs", wait_time=1):
         "order_logs_processed": 0,
         "return_logs_processed": 0,
         "errors": 0,
+        "flushes": 0,
+        "dead_letters": 0,
+        "reclaimed": 0,
+        "retries": 0,
         "start_time": dt.datetime.now().isoformat()
     }
 
     # 上次打印统计信息的时间
     last_stats_time = dt.datetime.now()
+    buffer: List[str] = []
+    deadline = 0.0
+    # 数据库不可用时的重试间隔（秒），写入成功后重置
+    backoff = 0
+
+    if reliable:
+        LogQueue.heartbeat(consumer_id, queue_key)
+        # 同一进程重启后会复用 consumer_id，先把自己遗留的处理中消息放回队列
+        LogQueue.clear_heartbeat(consumer_id, queue_key)
+        stats["reclaimed"] += LogQueue.reclaim_stale(queue_key=queue_key)
+        LogQueue.heartbeat(consumer_id, queue_key)
 
     try:
         # 持续监听队列
         while True:
-            # 从 Redis 队列中获取一条消息
-            log_data = redis.client.rpop(queue_key)
-            if log_data:
-                # 处理消息
-                try:
-                    if isinstance(log_data, bytes):
-                        log_data = log_data.decode('utf-8')
-
-                    log_entry = json.loads(log_data)
-
-                    # 从日志条目中提取操作类型和数据
-                    op_type = log_entry.get('op_type', '')
-                    log_data = log_entry.get('data', {})
-
-                    # 处理时间字段
-                    if 'operation_time' in log_data and isinstance(log_data['operation_time'], str):
-                        try:
-                            log_data['operation_time'] = dt.datetime.fromisoformat(log_data['operation_time'])
-                        except ValueError:
-                            log_data['operation_time'] = dt.datetime.now()
-
-                    # 根据操作类型分别处理
-                    if op_type == "return_order":
-                        # 退货日志
-                        order_return_log_service.create_log(log_data)
-                        stats["return_logs_processed"] += 1
-                        logger.info(f"已处理退货日志: {log_data.get('return_no', 'N/A')}")
-                    elif op_type == "order":
-                        # 订单日志
-                        order_log_service.create_log(log_data)
-                        stats["order_logs_processed"] += 1
-                        logger.info(f"已处理订单日志: {log_data.get('order_no', 'N/A')}")
-                    else:
-                        # 未知类型日志
-                        logger.warning(f"未知日志类型: {op_type}")
-                        stats["errors"] += 1
+            timeout = deadline - time.monotonic() if buffer else wait_time
+            if timeout > 0:
+                # BRPOP 在旧版本 Redis 上只支持整数秒
+                timeout = max(int(math.ceil(timeout)), 1)
+                if reliable:
+                    batch = LogQueue.claim_batch(consumer_id, batch_size - len(buffer), timeout, queue_key)
+                else:
+                    item = redis.blocking_client.brpop(queue_key, timeout=timeout)
+                    batch = [item[1]] + pop_batch(queue_key, batch_size - 1 - len(buffer)) if item else []
+                if batch:
+                    if not buffer:
+                        deadline = time.monotonic() + wait_time
+                    buffer.extend(batch)
 
-                    stats["total_processed"] += 1
+            if buffer and (len(buffer) >= batch_size or time.monotonic() >= deadline):
+                failed, retry = write_log_groups(buffer, stats)
+                if reliable:
+                    # 需要重试的消息留在处理中列表，消费者崩溃时仍可被回收
+                    LogQueue.ack(consumer_id, failed, queue_key, keep=retry)
+                    stats["dead_letters"] += len(failed)
+                stats["flushes"] += 1
+                buffer = retry
+                if retry:
+                    stats["retries"] += 1
+                    backoff = min(backoff * 2 or 1, MAX_RETRY_BACKOFF)
+                    logger.warning(f"{len(retry)} 条日志写入失败，{backoff} 秒后重试")
+                    if reliable:
+                        LogQueue.heartbeat(consumer_id, queue_key)
+                    time.sleep(backoff)
+                    deadline = time.monotonic()
+                else:
+                    backoff = 0
 
-                except Exception as e:
-                    logger.error(f"处理日志消息出错: {str(e)}")
-                    stats["errors"] += 1
-            else:
-                # 队列为空，等待一段时间
-                time.sleep(wait_time)
+            if reliable:
+                LogQueue.heartbeat(consumer_id, queue_key)
 
             # 每分钟打印一次统计信息
             now = dt.datetime.now()
             if (now - last_stats_time).total_seconds() > 60:
+                if reliable:
+                    stats["reclaimed"] += LogQueue.reclaim_stale(exclude=consumer_id, queue_key=queue_key)
                 logger.info(f"日志处理统计: 总计: {stats['total_processed']}, "
                             f"订单日志: {stats['order_logs_processed']}, "
                             f"退货日志: {stats['return_logs_processed']}, "
+                            f"批次: {stats['flushes']}, "
+                            f"死信: {stats['dead_letters']}, "
+                            f"回收: {stats['reclaimed']}, "
+                            f"重试: {stats['retries']}, "
                             f"错误: {stats['errors']}")
                 last_stats_time = now
 
@@ -103,6 +246,14 @@ def redis_log_consumer(self, queue_key="user_operation_logs", wait_time=1):
         raise self.retry(exc=e, countdown=5)
 
 
+@celery.task(name='replay_dead_letter_logs')
+def replay_dead_letter_logs(queue_key="user_operation_logs", limit=1000):
+    """手动触发：将死信队列中的日志消息重新放回日志队列"""
+    replayed = LogQueue.replay_dead_letters(limit, queue_key)
+    logger.info(f"已重放 {replayed} 条死信日志到队列 '{queue_key}'")
+    return replayed
+
+
 @worker_ready.connect
 def start_consumer(sender, **kwargs):
     """
@@ -0,0 +1,49 @@
+"""
+邀请码绑定后分销闭包表检查
+
+模拟 DistributionService.wx_find_update：在 session 中的分销对象上直接修改上级后调用 update，
+检查闭包表中已移动子树。全部操作在一个事务中完成并回滚，不留下数据。
+
+    python -m tests.distribution_closure_check
+"""
+import uuid
+
+
+def check_invite_binding():
+    from backend.extensions import db
+    from backend.mini_core.domain.distribution import Distribution
+    from backend.mini_core.repository import distribution_sqla_repo as repo
+    from backend.mini_core.repository.distribution.distribution_sqla import distribution_closure_table
+
+    closure = distribution_closure_table.c
+    prefix = f"T{uuid.uuid4().hex[:8]}"
+    father_id, user_id, child_id = f"{prefix}F", f"{prefix}U", f"{prefix}C"
+    try:
+        repo.create(Distribution(user_id=father_id, sn=father_id), commit=False, flush=True)
+        repo.create(Distribution(user_id=user_id, sn=user_id), commit=False, flush=True)
+        repo.create(Distribution(user_id=child_id, sn=child_id, user_father_id=user_id), commit=False, flush=True)
+
+        # 与 wx_find_update 相同：先修改 session 中的对象，再调用 update
+        dis_data = repo.find(user_id=user_id)
+        dis_data.user_father_id = father_id
+        repo.update(dis_data.id, dis_data, commit=False)
+
+        rows = set(db.session.query(closure.ancestor, closure.descendant, closure.depth).filter(
+            closure.descendant.in_([user_id, child_id])).all())
+        expected = {
+            (user_id, user_id, 0), (father_id, user_id, 1),
+            (child_id, child_id, 0), (user_id, child_id, 1), (father_id, child_id, 2),
+        }
+        assert rows == expected, f"闭包表不正确: {sorted(rows)}"
+        assert repo.is_descendant(father_id, child_id)
+        print("邀请码绑定闭包表检查通过")
+    finally:
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    from backend.app import create_app
+
+    app = create_app()
+    app.app_context().push()
+    check_invite_binding()
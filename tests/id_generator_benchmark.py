@@ -0,0 +1,59 @@
+"""
+编号生成器吞吐量测试
+
+使用固定机器号，不依赖 Redis；分别测试单线程和多线程下 next_id / next_no 的速度，
+并检查编号不重复、单线程内严格递增。
+
+    python -m tests.id_generator_benchmark [数量] [线程数]
+"""
+import sys
+import threading
+import time
+
+from backend.mini_core.utils.id_generator import SnowflakeIdGenerator
+
+
+def bench_single(generator: SnowflakeIdGenerator, count: int) -> None:
+    start = time.perf_counter()
+    ids = [generator.next_id() for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    assert len(set(ids)) == count, "next_id 出现重复"
+    assert all(a < b for a, b in zip(ids, ids[1:])), "next_id 不是递增的"
+    print(f"next_id 单线程: {count / elapsed:,.0f} 个/秒")
+
+    start = time.perf_counter()
+    nos = [generator.next_no('ORD') for _ in range(count)]
+    elapsed = time.perf_counter() - start
+    assert len(set(nos)) == count, "next_no 出现重复"
+    assert all(a < b for a, b in zip(nos, nos[1:])), "next_no 不是递增的"
+    print(f"next_no 单线程: {count / elapsed:,.0f} 个/秒, 示例 {nos[-1]}")
+
+
+def bench_threads(generator: SnowflakeIdGenerator, count: int, threads: int) -> None:
+    per_thread = count // threads
+    results = [[] for _ in range(threads)]
+
+    def worker(index: int, method) -> None:
+        results[index] = [method() for _ in range(per_thread)]
+
+    for name, method in (('next_id', generator.next_id), ('next_no', lambda: generator.next_no('ORD'))):
+        workers = [threading.Thread(target=worker, args=(i, method)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        merged = [value for result in results for value in result]
+        assert len(set(merged)) == len(merged), f"{name} 多线程出现重复"
+        # 每个线程内取到的编号仍然递增
+        assert all(all(a < b for a, b in zip(r, r[1:])) for r in results), f"{name} 线程内不是递增的"
+        print(f"{name} {threads} 线程: {len(merged) / elapsed:,.0f} 个/秒")
+
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    thread_count = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    id_generator = SnowflakeIdGenerator(worker_id=1)
+    bench_single(id_generator, total)
+    bench_threads(id_generator, total, thread_count)